@@ -1,35 +1,101 @@
 import redis.asyncio as redis
 from typing import Optional
+import asyncio
+import time
 
 from app.config.settings import get_settings
+from app.services.circuit_breaker import breakers
 
 settings = get_settings()
 
+redis_pool: Optional[redis.BlockingConnectionPool] = None
 redis_client: Optional[redis.Redis] = None
+last_connect_attempt: Optional[float] = None
+# Callers that find no client wait here instead of each building a pool
+connect_lock = asyncio.Lock()
+
+
+def _cooling_down() -> bool:
+    return (
+        last_connect_attempt is not None
+        and time.monotonic() - last_connect_attempt < settings.redis_reconnect_cooldown
+    )
+
+
+async def _connect() -> Optional[redis.Redis]:
+    """
+    Create the sized, health-checked pool and verify it with a PING.
+
+    A blocking pool waits up to redis_socket_timeout for a free connection
+    instead of raising when all redis_max_connections are in use.
+    """
+    async with connect_lock:
+        if redis_client is not None:
+            # Connected by the caller this one waited for
+            return redis_client
+        if _cooling_down():
+            # That caller's attempt just failed
+            return None
+        return await _open_pool()
+
+
+async def _open_pool() -> Optional[redis.Redis]:
+    global redis_pool, redis_client, last_connect_attempt
+
+    last_connect_attempt = time.monotonic()
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_socket_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        socket_connect_timeout=settings.redis_socket_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        encoding="utf-8",
+        decode_responses=True,
+    )
+    client = redis.Redis(connection_pool=pool)
+    try:
+        await client.ping()
+    except Exception as e:
+        breakers["redis"].record_failure()
+        print(f"Redis connection failed: {e}")
+        await pool.disconnect()
+        return None
+
+    breakers["redis"].record_success()
+    redis_pool = pool
+    redis_client = client
+    return client
+
+
+async def init_redis():
+    """Open the connection pool at startup (called from the app lifespan)"""
+    if redis_client is None:
+        await _connect()
 
 
 async def get_redis() -> Optional[redis.Redis]:
-    """Get Redis client connection"""
-    global redis_client
-    
+    """
+    Get Redis client connection.
+
+    Returns None without any I/O while the redis circuit is open, and only
+    attempts a new connection once per redis_reconnect_cooldown seconds.
+    """
+    if not breakers["redis"].allow():
+        return None
+
     if redis_client is None:
-        try:
-            redis_client = redis.from_url(
-                settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-            await redis_client.ping()
-        except Exception as e:
-            print(f"Redis connection failed: {e}")
-            return None
-    
+        return await _connect()
+
     return redis_client
 
 
 async def close_redis():
-    """Close Redis connection"""
-    global redis_client
+    """Close Redis connection pool"""
+    global redis_pool, redis_client
     if redis_client:
-        await redis_client.close()
+        await redis_client.aclose()
         redis_client = None
+    if redis_pool:
+        await redis_pool.disconnect()
+        redis_pool = None
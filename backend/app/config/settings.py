@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -10,13 +11,59 @@ class Settings(BaseSettings):
     static_assets_url: str = ""
     bucket_name: str = "angels"
 
+    # Size renditions uploaded next to each image, as "name:width,...", e.g.
+    # "thumbnail:240,card:480". Empty disables srcset URLs.
+    image_renditions: str = ""
+    image_rendition_format: str = "webp"
+
     redis_url: str = "redis://localhost:6379"
+    redis_max_connections: int = 20
+    redis_health_check_interval: int = 30
+    redis_socket_timeout: float = 1.0
+    redis_reconnect_cooldown: float = 30.0
+
+    # Dependency resilience
+    supabase_timeout: float = 10.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: float = 30.0
+    read_retry_attempts: int = 2
+    retry_budget_ratio: float = 0.1
+
+    image_service_url: str = ""
+
+    # Asset pipeline (POST /api/jobs/trigger and cron). Empty paths default to
+    # ../scraper/images and a manifest next to it.
+    asset_images_dir: str = ""
+    asset_manifest_path: str = ""
+    asset_pipeline_concurrency: int = 4
+
+    # Job queue: how often each worker looks for queued jobs it wasn't woken
+    # for, the Redis lock TTL (renewed while a job runs), how often a running
+    # job writes its progress to job_runs and publishes it to SSE watchers
+    job_poll_interval: float = 30.0
+    job_lock_ttl: float = 60.0
+    job_progress_interval: float = 2.0
+    job_event_interval: float = 0.5
+
+    health_probe_interval: float = 15.0
+    health_probe_timeout: float = 2.0
 
     node_env: str = "development"
     disable_rate_limit: bool = True
 
     port: int = 8080
 
+    # Tracing: fraction of requests traced (a sampled W3C traceparent always is)
+    trace_sample_rate: float = 0.05
+    trace_export_file: str = ""
+    trace_export_url: str = ""
+    trace_export_interval: float = 5.0
+
+    # /debug endpoints: default to on in development, off otherwise, and
+    # only served when DEBUG_TOKEN is set (sent as X-Debug-Token)
+    debug_endpoints: Optional[bool] = None
+    debug_token: str = ""
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -25,6 +72,21 @@ class Settings(BaseSettings):
     def is_development(self) -> bool:
         return self.node_env == "development"
 
+    @property
+    def debug_endpoints_enabled(self) -> bool:
+        if self.debug_endpoints is not None:
+            return self.debug_endpoints
+        return self.is_development
+
+    @property
+    def image_rendition_widths(self) -> dict[str, int]:
+        widths = {}
+        for item in self.image_renditions.split(","):
+            name, _, width = item.strip().partition(":")
+            if name and width:
+                widths[name] = int(width)
+        return widths
+
     @property
     def storage_base_url(self) -> str:
         """
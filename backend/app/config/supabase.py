@@ -1,18 +1,29 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from functools import lru_cache
 
 from app.config.settings import get_settings
+from app.middleware.tracing import instrument_postgrest
+from app.services.circuit_breaker import protect_postgrest
+
+# Breaker first so the db span covers retries as well
+protect_postgrest()
+instrument_postgrest()
+
+
+def _client_options() -> ClientOptions:
+    # postgrest-py defaults to a 120s timeout, far longer than any request should wait
+    return ClientOptions(postgrest_client_timeout=get_settings().supabase_timeout)
 
 
 @lru_cache
 def get_supabase() -> Client:
     """Get Supabase client (uses anon key, respects RLS)"""
     settings = get_settings()
-    return create_client(settings.supabase_url, settings.supabase_key)
+    return create_client(settings.supabase_url, settings.supabase_key, _client_options())
 
 
 @lru_cache
 def get_supabase_admin() -> Client:
     """Service role client for admin operations (bypasses RLS)"""
     settings = get_settings()
-    return create_client(settings.supabase_url, settings.supabase_service_key)
+    return create_client(settings.supabase_url, settings.supabase_service_key, _client_options())
@@ -1,21 +1,40 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from contextlib import asynccontextmanager
+import asyncio
 import time
 
 from app.config.settings import get_settings
-from app.routers import health, auth, angels, users, audit, export, jobs, series
+from app.routers import health, auth, angels, users, audit, export, jobs, series, debug
+from app.config.redis import init_redis, close_redis
 from app.middleware.rate_limiter import limiter
+from app.middleware import tracing
 from app.services.cron_manager import initialize_cron, shutdown_cron
+from app.services.dependency_monitor import run_dependency_monitor
+from app.services.job_queue import run_job_worker
+from app.services.job_events import run_event_relay
+from app.services.circuit_breaker import CircuitOpenError
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application startup and shutdown events"""
     initialize_cron()
+    await init_redis()
+    background_tasks = [
+        asyncio.create_task(tracing.run_trace_exporter()),
+        asyncio.create_task(run_dependency_monitor()),
+        asyncio.create_task(run_job_worker()),
+        asyncio.create_task(run_event_relay()),
+    ]
     yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await close_redis()
     shutdown_cron()
 
 
@@ -26,11 +45,22 @@ app = FastAPI(
     description="Backend API for Angel Archive - Sonny Angel collection management",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=tracing.TracedJSONResponse,
 )
 
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Fail fast while a dependency's circuit is open"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.name} is temporarily unavailable"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -42,11 +72,18 @@ app.add_middleware(
 
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
-    """Track request metrics for health monitoring"""
+    """Track request metrics for health monitoring and trace sampled requests"""
+    trace = tracing.start_trace(request)
+    token = tracing.current_trace.set(trace)
     start = time.time()
-    response = await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        tracing.current_trace.reset(token)
     duration_ms = (time.time() - start) * 1000
     health.record_request(duration_ms, response.status_code >= 400)
+    if trace:
+        tracing.finish_trace(trace, response, duration_ms)
     return response
 
 
@@ -58,6 +95,7 @@ app.include_router(audit.router)
 app.include_router(export.router)
 app.include_router(jobs.router)
 app.include_router(series.router)
+app.include_router(debug.router)
 
 
 @app.get("/")
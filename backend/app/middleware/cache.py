@@ -3,6 +3,8 @@ from typing import Optional, Callable
 from functools import wraps
 
 from app.config.redis import get_redis
+from app.services.circuit_breaker import breakers
+from app.middleware.tracing import span
 
 DEFAULT_EXPIRATION = 3600  # 1 hour
 
@@ -14,8 +16,12 @@ async def get_cached(key: str) -> Optional[str]:
         return None
     
     try:
-        return await redis_client.get(key)
+        with span("cache.get", key=key):
+            value = await redis_client.get(key)
+        breakers["redis"].record_success()
+        return value
     except Exception as e:
+        breakers["redis"].record_failure()
         print(f"Cache get error: {e}")
         return None
 
@@ -27,11 +33,63 @@ async def set_cached(key: str, value: str, expiration: int = DEFAULT_EXPIRATION)
         return
     
     try:
-        await redis_client.setex(key, expiration, value)
+        with span("cache.set", key=key):
+            await redis_client.setex(key, expiration, value)
+        breakers["redis"].record_success()
     except Exception as e:
+        breakers["redis"].record_failure()
         print(f"Cache set error: {e}")
 
 
+async def get_cached_many(keys: list[str]) -> dict[str, Optional[str]]:
+    """
+    Get several keys in one round-trip (MGET).
+
+    Use this when a request needs more than one cached value, e.g. the
+    catalog plus a user's collection, instead of awaiting get_cached per key.
+    Missing keys (or an unavailable cache) map to None.
+    """
+    results: dict[str, Optional[str]] = {key: None for key in keys}
+    if not keys:
+        return results
+
+    redis_client = await get_redis()
+    if not redis_client:
+        return results
+
+    try:
+        with span("cache.mget", keys=len(keys)):
+            values = await redis_client.mget(keys)
+        breakers["redis"].record_success()
+        results.update(zip(keys, values))
+    except Exception as e:
+        breakers["redis"].record_failure()
+        print(f"Cache mget error: {e}")
+
+    return results
+
+
+async def set_cached_many(values: dict[str, str], expiration: int = DEFAULT_EXPIRATION):
+    """Set several keys with the same expiration in one pipelined round-trip"""
+    if not values:
+        return
+
+    redis_client = await get_redis()
+    if not redis_client:
+        return
+
+    try:
+        with span("cache.mset", keys=len(values)):
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.setex(key, expiration, value)
+                await pipe.execute()
+        breakers["redis"].record_success()
+    except Exception as e:
+        breakers["redis"].record_failure()
+        print(f"Cache mset error: {e}")
+
+
 async def invalidate_cache(pattern: str):
     """Invalidate cache keys matching pattern"""
     redis_client = await get_redis()
@@ -39,11 +97,14 @@ async def invalidate_cache(pattern: str):
         return
     
     try:
-        keys = await redis_client.keys(pattern)
-        if keys:
-            await redis_client.delete(*keys)
-            print(f"Invalidated {len(keys)} cache keys matching: {pattern}")
+        with span("cache.invalidate", pattern=pattern):
+            keys = await redis_client.keys(pattern)
+            if keys:
+                await redis_client.delete(*keys)
+                print(f"Invalidated {len(keys)} cache keys matching: {pattern}")
+        breakers["redis"].record_success()
     except Exception as e:
+        breakers["redis"].record_failure()
         print(f"Cache invalidation error: {e}")
 
 
@@ -58,12 +119,15 @@ async def get_cache_stats() -> dict:
         }
     
     try:
-        info = await redis_client.info("stats")
+        with span("cache.info"):
+            info = await redis_client.info("stats")
+        breakers["redis"].record_success()
         return {
             "connected": True,
             "info": info,
         }
     except Exception as e:
+        breakers["redis"].record_failure()
         return {
             "connected": False,
             "error": str(e),
@@ -0,0 +1,249 @@
+"""
+Lightweight in-process request tracing.
+
+A sampled request gets a Trace stored in a context variable. Code paths we
+care about (PostgREST queries, cache operations, JSON rendering) open spans
+with `span()`, which is a no-op when the current request is not sampled.
+
+Finished traces are reported back to the client in a `Server-Timing` header
+and buffered for export as OTLP/JSON, either appended to a file or POSTed to
+a local collector (e.g. an OpenTelemetry Collector on :4318).
+"""
+import asyncio
+import contextvars
+import json
+import random
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+SERVICE_NAME = "angel-archive-api"
+MAX_PENDING_TRACES = 2048
+
+current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+pending_traces: deque = deque(maxlen=MAX_PENDING_TRACES)
+
+
+class Trace:
+    """Spans recorded for a single sampled request"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status_code = 0
+        self.spans: list[dict] = []
+
+    def add_span(self, name: str, start_ns: int, duration_ns: int, attributes: dict, error: bool):
+        self.spans.append({
+            "name": name,
+            "span_id": secrets.token_hex(8),
+            "start_ns": start_ns,
+            "end_ns": start_ns + duration_ns,
+            "attributes": attributes,
+            "error": error,
+        })
+
+    def server_timing(self, total_ms: float) -> str:
+        """Sum span durations per category (the name prefix before the first dot)"""
+        totals: dict[str, float] = {}
+        for s in self.spans:
+            category = s["name"].split(".", 1)[0]
+            totals[category] = totals.get(category, 0.0) + (s["end_ns"] - s["start_ns"]) / 1e6
+
+        entries = [f"{category};dur={ms:.2f}" for category, ms in totals.items()]
+        entries.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a span of the current trace (no-op if not sampled)"""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start_ns = time.time_ns()
+    start = time.perf_counter_ns()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        trace.add_span(name, start_ns, time.perf_counter_ns() - start, attributes, error)
+
+
+def _parse_traceparent(header: Optional[str]) -> tuple[Optional[str], bool]:
+    """Return (trace_id, sampled) from a W3C traceparent header"""
+    if not header:
+        return None, False
+
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32:
+        return None, False
+
+    try:
+        sampled = bool(int(parts[3], 16) & 0x01)
+    except ValueError:
+        return None, False
+
+    return parts[1], sampled
+
+
+def start_trace(request: Request) -> Optional[Trace]:
+    """Decide whether to sample this request and, if so, create its Trace"""
+    trace_id, forced = _parse_traceparent(request.headers.get("traceparent"))
+
+    if not forced and random.random() >= settings.trace_sample_rate:
+        return None
+
+    return Trace(f"{request.method} {request.url.path}", trace_id)
+
+
+def finish_trace(trace: Trace, response, duration_ms: float):
+    """Attach Server-Timing to the response and queue the trace for export"""
+    trace.end_ns = time.time_ns()
+    trace.status_code = response.status_code
+    response.headers["Server-Timing"] = trace.server_timing(duration_ms)
+    response.headers["traceparent"] = f"00-{trace.trace_id}-{trace.span_id}-01"
+
+    if settings.trace_export_file or settings.trace_export_url:
+        pending_traces.append(trace)
+
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse that records the time spent encoding the body"""
+
+    def render(self, content) -> bytes:
+        with span("serialize.json"):
+            return super().render(content)
+
+
+def _traced_execute(execute):
+    @wraps(execute)
+    def wrapper(self, *args, **kwargs):
+        request = getattr(self, "request", None)
+        method = getattr(request, "http_method", "")
+        table = str(getattr(request, "path", "")).rsplit("/", 1)[-1]
+        with span("db.execute", **{"db.operation": method, "db.table": table}):
+            return execute(self, *args, **kwargs)
+
+    wrapper._traced = True
+    return wrapper
+
+
+def instrument_postgrest():
+    """Wrap every PostgREST `.execute()` so queries show up as db spans"""
+    from postgrest._sync import request_builder
+
+    for cls in (
+        request_builder.SyncQueryRequestBuilder,
+        request_builder.SyncSingleRequestBuilder,
+        request_builder.SyncMaybeSingleRequestBuilder,
+        request_builder.SyncExplainRequestBuilder,
+    ):
+        if not getattr(cls.execute, "_traced", False):
+            cls.execute = _traced_execute(cls.execute)
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            result.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            result.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            result.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            result.append({"key": key, "value": {"stringValue": str(value)}})
+    return result
+
+
+def to_otlp(traces: list[Trace]) -> dict:
+    """Encode traces as an OTLP/JSON ExportTraceServiceRequest"""
+    spans = []
+    for trace in traces:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": trace.span_id,
+            "name": trace.name,
+            "kind": 2,  # SERVER
+            "startTimeUnixNano": str(trace.start_ns),
+            "endTimeUnixNano": str(trace.end_ns or trace.start_ns),
+            "attributes": _otlp_attributes({"http.status_code": trace.status_code}),
+            "status": {"code": 2 if trace.status_code >= 500 else 1},
+        })
+        for s in trace.spans:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": s["span_id"],
+                "parentSpanId": trace.span_id,
+                "name": s["name"],
+                "kind": 3 if s["name"].startswith(("db.", "cache.")) else 1,  # CLIENT / INTERNAL
+                "startTimeUnixNano": str(s["start_ns"]),
+                "endTimeUnixNano": str(s["end_ns"]),
+                "attributes": _otlp_attributes(s["attributes"]),
+                "status": {"code": 2 if s["error"] else 1},
+            })
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+async def flush_traces():
+    """Export all buffered traces in one batch"""
+    if not pending_traces:
+        return
+
+    batch = list(pending_traces)
+    pending_traces.clear()
+    payload = to_otlp(batch)
+
+    try:
+        if settings.trace_export_file:
+            line = json.dumps(payload, separators=(",", ":")) + "\n"
+            await asyncio.to_thread(_append_line, settings.trace_export_file, line)
+        if settings.trace_export_url:
+            async with httpx.AsyncClient(timeout=5) as client:
+                await client.post(settings.trace_export_url, json=payload)
+    except Exception as e:
+        print(f"Trace export error: {e}")
+
+
+def _append_line(path: str, line: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+async def run_trace_exporter():
+    """Background task: flush buffered traces every trace_export_interval seconds"""
+    try:
+        while True:
+            await asyncio.sleep(settings.trace_export_interval)
+            await flush_traces()
+    except asyncio.CancelledError:
+        await flush_traces()
+        raise
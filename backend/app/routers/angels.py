@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from typing import List
+from typing import List, Optional
 
 from app.config.supabase import get_supabase
 from app.config.settings import get_settings
@@ -10,20 +10,45 @@ router = APIRouter(prefix="/angels", tags=["angels"])
 settings = get_settings()
 
 
+IMAGE_FIELDS = ("image", "image_bw", "image_opacity", "image_profile_pic")
+
+
+def rendition_path(path: str, rendition: str) -> str:
+    """
+    Storage path of a size rendition.
+
+    images_bw/<series>/<name>.png -> images_bw_thumbnail/<series>/<name>.webp
+    """
+    folder, _, rest = path.partition("/")
+    stem = rest.rsplit(".", 1)[0]
+    return f"{folder}_{rendition}/{stem}.{settings.image_rendition_format}"
+
+
+def build_srcset(path: Optional[str]) -> Optional[str]:
+    """srcset value listing each configured rendition with its width"""
+    widths = settings.image_rendition_widths
+    if not path or not widths:
+        return None
+    base_url = settings.storage_base_url
+    return ", ".join(
+        f"{base_url}/{rendition_path(path, rendition)} {width}w"
+        for rendition, width in widths.items()
+    )
+
+
 def add_image_urls(angel: dict) -> dict:
-    """Add full CDN URLs to angel image paths"""
+    """Add full CDN URLs (and srcset values for the size renditions) to angel image paths"""
     base_url = settings.storage_base_url
-    return {
-        **angel,
-        "image_url": f"{base_url}/{angel['image']}" if angel.get("image") else None,
-        "image_bw_url": f"{base_url}/{angel['image_bw']}" if angel.get("image_bw") else None,
-        "image_opacity_url": f"{base_url}/{angel['image_opacity']}" if angel.get("image_opacity") else None,
-        "image_profile_pic_url": f"{base_url}/{angel['image_profile_pic']}" if angel.get("image_profile_pic") else None,
-    }
+    urls = {}
+    for field in IMAGE_FIELDS:
+        path = angel.get(field)
+        urls[f"{field}_url"] = f"{base_url}/{path}" if path else None
+        urls[f"{field}_srcset"] = build_srcset(path)
+    return {**angel, **urls}
 
 
 @router.get("", response_model=List[AngelResponse])
-async def get_all_angels():
+def get_all_angels():
     """Get all angels with image URLs"""
     supabase = get_supabase()
     result = supabase.table("angels").select("*").execute()
@@ -35,7 +60,7 @@ async def get_all_angels():
 
 
 @router.get("/profile-pictures", response_model=List[AngelProfilePicResponse])
-async def get_profile_pictures():
+def get_profile_pictures():
     """Get angels with profile picture URLs (for profile pic selection)"""
     supabase = get_supabase()
     result = supabase.table("angels").select("id, name, image_profile_pic").execute()
@@ -48,13 +73,14 @@ async def get_profile_pictures():
         {
             **angel,
             "image_url": f"{base_url}/{angel['image_profile_pic']}" if angel.get("image_profile_pic") else None,
+            "image_srcset": build_srcset(angel.get("image_profile_pic")),
         }
         for angel in result.data
     ]
 
 
 @router.get("/series/{series_id}", response_model=List[AngelResponse])
-async def get_angels_by_series(series_id: int):
+def get_angels_by_series(series_id: int):
     """Get all angels in a specific series"""
     supabase = get_supabase()
     result = supabase.table("angels").select("*").eq("series_id", series_id).execute()
@@ -66,7 +92,7 @@ async def get_angels_by_series(series_id: int):
 
 
 @router.get("/{angel_id}", response_model=AngelResponse)
-async def get_angel_by_id(angel_id: int):
+def get_angel_by_id(angel_id: int):
     """Get a single angel by ID"""
     supabase = get_supabase()
     result = supabase.table("angels").select("*").eq("id", angel_id).single().execute()
@@ -7,7 +7,7 @@ router = APIRouter(prefix="/api/audit", tags=["audit"])
 
 
 @router.get("")
-async def get_audit_logs(
+def get_audit_logs(
     limit: int = Query(default=100, le=1000),
     offset: int = Query(default=0),
 ) -> List[Any]:
@@ -21,7 +21,7 @@ async def get_audit_logs(
 
 
 @router.get("/user/{user_id}")
-async def get_user_audit_logs(
+def get_user_audit_logs(
     user_id: str,
     limit: int = Query(default=50, le=500),
 ) -> List[Any]:
@@ -35,7 +35,7 @@ async def get_user_audit_logs(
 
 
 @router.get("/stats")
-async def get_audit_stats() -> dict:
+def get_audit_stats() -> dict:
     """Get audit log statistics"""
     supabase = get_supabase_admin()
     
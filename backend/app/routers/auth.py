@@ -10,6 +10,7 @@ from app.schemas.auth import (
     CheckResponse,
     EmailLookupResponse,
 )
+from app.services.circuit_breaker import CircuitOpenError
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -19,12 +20,12 @@ def _normalize_email(email: str) -> str:
 
 
 @router.get("")
-async def auth_root():
+def auth_root():
     return {"message": "Auth routes are working"}
 
 
 @router.post("/signup")
-async def signup(request: SignupRequest) -> Any:
+def signup(request: SignupRequest) -> Any:
     """
     Create a Supabase Auth user and the app-profile row in public.users.
 
@@ -40,6 +41,9 @@ async def signup(request: SignupRequest) -> Any:
             "password": request.password,
             "email_confirm": True,
         })
+    except CircuitOpenError:
+        # The app-level handler turns it into a 503 with Retry-After
+        raise
     except Exception as e:
         # Supabase-py raises AuthApiError / HTTPStatusError; surface as 400 for the UI.
         raise HTTPException(status_code=400, detail=str(e))
@@ -54,6 +58,8 @@ async def signup(request: SignupRequest) -> Any:
             "email": auth_result.user.email,
             # username/profile_pic are set by a follow-up call from the UI
         }).execute()
+    except CircuitOpenError:
+        raise
     except Exception:
         # If the row already exists (e.g. re-run), ignore; username is set later.
         pass
@@ -68,7 +74,7 @@ async def signup(request: SignupRequest) -> Any:
 
 
 @router.post("/login")
-async def login(request: LoginRequest) -> Any:
+def login(request: LoginRequest) -> Any:
     supabase = get_supabase()
     email = _normalize_email(request.email)
     result = supabase.auth.sign_in_with_password({
@@ -89,14 +95,14 @@ async def login(request: LoginRequest) -> Any:
 
 
 @router.post("/logout")
-async def logout(request: LogoutRequest) -> Any:
+def logout(request: LogoutRequest) -> Any:
     supabase = get_supabase()
     supabase.auth.sign_out()
     return {"message": "Logged out successfully"}
 
 
 @router.get("/check/username/{username}")
-async def check_username(username: str) -> CheckResponse:
+def check_username(username: str) -> CheckResponse:
     # Use admin client because RLS blocks anon reads on public.users
     supabase = get_supabase_admin()
     result = supabase.table("users").select("username").eq("username", username).execute()
@@ -104,7 +110,7 @@ async def check_username(username: str) -> CheckResponse:
 
 
 @router.get("/check/email/{email}")
-async def check_email(email: str) -> CheckResponse:
+def check_email(email: str) -> CheckResponse:
     # Use admin client because RLS blocks anon reads on public.users
     supabase = get_supabase_admin()
     result = supabase.table("users").select("email").eq("email", _normalize_email(email)).execute()
@@ -112,7 +118,7 @@ async def check_email(email: str) -> CheckResponse:
 
 
 @router.get("/user")
-async def get_current_user() -> Any:
+def get_current_user() -> Any:
     supabase = get_supabase()
     result = supabase.auth.get_user()
 
@@ -128,7 +134,7 @@ async def get_current_user() -> Any:
 
 
 @router.post("/users", status_code=201)
-async def create_user(request: CreateUserRequest) -> Any:
+def create_user(request: CreateUserRequest) -> Any:
     # Use admin client to bypass RLS, but this endpoint should only be called
     # immediately after signup for the same user.
     supabase = get_supabase_admin()
@@ -147,7 +153,7 @@ async def create_user(request: CreateUserRequest) -> Any:
 
 
 @router.get("/users/by-username/{username}")
-async def get_user_by_username(username: str) -> EmailLookupResponse:
+def get_user_by_username(username: str) -> EmailLookupResponse:
     # Use admin client because RLS blocks anon reads on public.users
     supabase = get_supabase_admin()
     result = supabase.table("users").select("email").eq("username", username).execute()
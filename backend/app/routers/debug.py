@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import hmac
+
+from app.config.settings import get_settings
+from app.services.profiler import sample_cpu, sample_allocations, collapse
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+settings = get_settings()
+
+profile_lock = asyncio.Lock()
+
+
+def require_admin(x_debug_token: Optional[str] = Header(default=None)):
+    """Debug endpoints are hidden unless enabled with an admin token configured, and need that token"""
+    # Without a DEBUG_TOKEN there is no admin to let in, whatever NODE_ENV says
+    if not settings.debug_endpoints_enabled or not settings.debug_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, settings.debug_token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+@router.get("/profile", dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(default=10, gt=0, le=60),
+    mode: str = Query(default="cpu", pattern="^(cpu|memory)$"),
+    interval_ms: float = Query(default=5, ge=1, le=1000),
+) -> PlainTextResponse:
+    """
+    Profile the running process and return collapsed stacks.
+
+    mode=cpu samples all thread stacks every `interval_ms` (counts are samples);
+    mode=memory diffs tracemalloc snapshots (counts are bytes allocated).
+    """
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    async with profile_lock:
+        if mode == "cpu":
+            counts = await asyncio.to_thread(sample_cpu, seconds, interval_ms)
+        else:
+            counts = await asyncio.to_thread(sample_allocations, seconds)
+
+    return PlainTextResponse(
+        collapse(counts),
+        headers={"Content-Disposition": f"attachment; filename=profile_{mode}.collapsed"},
+    )
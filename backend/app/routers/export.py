@@ -32,7 +32,7 @@ def can_export(user_id: str) -> tuple[bool, str]:
 
 
 @router.get("/users/{user_id}")
-async def export_user_data(
+def export_user_data(
     user_id: str,
     format: str = Query(default="json", regex="^(json|csv)$"),
 ) -> Any:
@@ -104,7 +104,7 @@ async def export_user_data(
 
 
 @router.get("/users/{user_id}/status")
-async def get_export_status(user_id: str) -> dict:
+def get_export_status(user_id: str) -> dict:
     """Get export status (last export time, can export)"""
     can, message = can_export(user_id)
     last_export = export_timestamps.get(user_id)
@@ -1,8 +1,11 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
 import time
 import psutil
 
+from app.services import dependency_monitor
+
 router = APIRouter(prefix="/health", tags=["health"])
 
 start_time = time.time()
@@ -35,24 +38,31 @@ async def health_check():
 
 @router.get("/ready")
 async def readiness_check():
-    """Readiness check - is the service ready to accept traffic?"""
+    """
+    Readiness check - is the service ready to accept traffic?
+
+    Served from the results of the background dependency probes; returns 503
+    when a critical dependency is down.
+    """
+    if not dependency_monitor.memory_status:
+        dependency_monitor.memory_status.update(dependency_monitor.check_memory())
+
     checks = {
         "status": "ok",
         "timestamp": datetime.utcnow().isoformat(),
-        "services": {},
+        "services": {"memory": dict(dependency_monitor.memory_status)},
     }
 
-    process = psutil.Process()
-    memory_info = process.memory_info()
-    heap_used = memory_info.rss
-    heap_total = psutil.virtual_memory().total
-    memory_ratio = heap_used / heap_total
+    for name, dependency in dependency_monitor.dependencies.items():
+        checks["services"][name] = dependency.summary()
+        if dependency.status == "down":
+            if dependency.critical:
+                checks["status"] = "unavailable"
+            elif checks["status"] == "ok":
+                checks["status"] = "degraded"
 
-    checks["services"]["memory"] = {
-        "status": "ok" if memory_ratio < 0.9 else "warning",
-        "heapUsed": f"{heap_used // 1024 // 1024}MB",
-        "heapTotal": f"{heap_total // 1024 // 1024}MB",
-    }
+    if checks["status"] == "unavailable":
+        return JSONResponse(status_code=503, content=checks)
 
     return checks
 
@@ -68,8 +78,7 @@ async def metrics_check():
     )
 
     uptime = time.time() - start_time
-    process = psutil.Process()
-    memory_info = process.memory_info()
+    memory_info = dependency_monitor.process.memory_info()
 
     return {
         "timestamp": datetime.utcnow().isoformat(),
@@ -91,4 +100,12 @@ async def metrics_check():
             "memory_rss_bytes": memory_info.rss,
             "uptime_seconds": int(uptime),
         },
+        "dependencies": {
+            name: {
+                "status": dependency.status,
+                "circuit": dependency.circuit,
+                "probe_latency_ms": dependency.histogram(),
+            }
+            for name, dependency in dependency_monitor.dependencies.items()
+        },
     }
@@ -1,33 +1,42 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Any
 
-from app.services.job_service import run_asset_pipeline, get_job_status, get_latest_job_run
-from app.services.cron_manager import get_cron_status, is_job_running
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.job_service import get_job_run, get_job_status, get_latest_job_run
+from app.services.job_queue import enqueue_job
+from app.services import job_events
+from app.services.cron_manager import get_cron_status
 
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
 
 
-@router.post("/trigger")
+@router.post("/trigger", status_code=202)
 async def trigger_job() -> Any:
-    """Manually trigger the asset pipeline job"""
-    if is_job_running:
-        raise HTTPException(
-            status_code=409,
-            detail="Job is already running. Please wait for it to complete."
-        )
-    
+    """
+    Queue the asset pipeline job.
+
+    Returns immediately with the job id; a job worker runs it in the
+    background (follow it with GET /api/jobs/{job_id}). If a run is already
+    waiting in the queue, that run's id is returned instead of a new one.
+    """
     try:
-        result = await run_asset_pipeline()
-        return {
-            "success": True,
-            "message": "Asset pipeline completed successfully",
-            "result": result,
-        }
+        job_id, created = await enqueue_job("asset_pipeline")
+    except CircuitOpenError:
+        # The app-level handler turns it into a 503 with Retry-After
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Job failed: {str(e)}"
+            detail=f"Failed to queue job: {str(e)}"
         )
+    
+    return {
+        "success": True,
+        "message": "Asset pipeline queued" if created else "Asset pipeline is already queued",
+        "job_id": job_id,
+        "status": "queued",
+    }
 
 
 @router.get("/status")
@@ -40,6 +49,8 @@ async def get_jobs_status(limit: int = 10) -> Any:
             "jobs": jobs,
             "cron": get_cron_status(),
         }
+    except CircuitOpenError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -64,6 +75,8 @@ async def get_latest_job() -> Any:
             "success": True,
             "job": job,
         }
+    except CircuitOpenError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -78,3 +91,61 @@ async def get_cron() -> Any:
         "success": True,
         "cron": get_cron_status(),
     }
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int) -> Any:
+    """Get one job run, including the progress of a running job"""
+    try:
+        job = await get_job_run(job_id)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get job: {str(e)}"
+        )
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "success": True,
+        "job": job,
+    }
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: int) -> StreamingResponse:
+    """
+    Server-Sent Events stream of a job's progress.
+
+    Sends the job's current state, then a "progress" event as it advances
+    (stage, done/total, images_per_second, eta_seconds, counts) and a final
+    "done" event when it succeeds or fails, after which the stream closes.
+    """
+    queue = job_events.broadcaster.subscribe(job_id)
+    initial = job_events.broadcaster.latest.get(job_id)
+    if initial is None:
+        # No event seen for this job on this worker yet: one read for its state
+        try:
+            job = await get_job_run(job_id)
+        except CircuitOpenError:
+            job_events.broadcaster.unsubscribe(job_id, queue)
+            raise
+        except Exception as e:
+            job_events.broadcaster.unsubscribe(job_id, queue)
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to get job: {str(e)}"
+            )
+        if not job:
+            job_events.broadcaster.unsubscribe(job_id, queue)
+            raise HTTPException(status_code=404, detail="Job not found")
+        initial = job_events.job_run_event(job)
+
+    return StreamingResponse(
+        job_events.event_stream(job_id, queue, initial, get_job_run),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -9,7 +9,7 @@ router = APIRouter(prefix="/series", tags=["series"])
 
 
 @router.get("", response_model=List[SeriesResponse])
-async def get_all_series():
+def get_all_series():
     """Get all series (id + name)"""
     supabase = get_supabase()
     result = supabase.table("series").select("*").order("name").execute()
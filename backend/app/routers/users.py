@@ -3,7 +3,7 @@ from typing import List, Any
 from datetime import datetime
 
 from app.config.supabase import get_supabase
-from app.config.settings import get_settings
+from app.routers.angels import add_image_urls
 from app.schemas.users import UserProfile, UserProfileUpdate
 from app.schemas.collections import (
     CollectionItemCreate,
@@ -13,29 +13,19 @@ from app.schemas.collections import (
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
-settings = get_settings()
-
 
 def add_collection_image_urls(collection: dict) -> dict:
     """Add full CDN URLs to collection angel images"""
-    base_url = settings.storage_base_url
     angels = collection.get("angels", {})
     
     if angels:
-        angels_with_urls = {
-            **angels,
-            "image_url": f"{base_url}/{angels['image']}" if angels.get("image") else None,
-            "image_bw_url": f"{base_url}/{angels['image_bw']}" if angels.get("image_bw") else None,
-            "image_opacity_url": f"{base_url}/{angels['image_opacity']}" if angels.get("image_opacity") else None,
-            "image_profile_pic_url": f"{base_url}/{angels['image_profile_pic']}" if angels.get("image_profile_pic") else None,
-        }
-        return {**collection, "angels": angels_with_urls}
+        return {**collection, "angels": add_image_urls(angels)}
     
     return collection
 
 
 @router.get("/{user_id}", response_model=UserProfile)
-async def get_user_profile(user_id: str):
+def get_user_profile(user_id: str):
     """Get user profile by ID"""
     supabase = get_supabase()
     result = supabase.table("users").select(
@@ -49,7 +39,7 @@ async def get_user_profile(user_id: str):
 
 
 @router.put("/{user_id}", response_model=UserProfile)
-async def update_user_profile(user_id: str, updates: UserProfileUpdate):
+def update_user_profile(user_id: str, updates: UserProfileUpdate):
     """Update user profile (username and/or profile_pic only)"""
     supabase = get_supabase()
 
@@ -67,7 +57,7 @@ async def update_user_profile(user_id: str, updates: UserProfileUpdate):
 
 
 @router.get("/{user_id}/collections", response_model=List[CollectionItemResponse])
-async def get_user_collections(user_id: str):
+def get_user_collections(user_id: str):
     """Get all collection items for a user with angel details"""
     supabase = get_supabase()
     result = supabase.table("user_collections").select(
@@ -81,7 +71,7 @@ async def get_user_collections(user_id: str):
 
 
 @router.post("/{user_id}/collections", response_model=Any)
-async def upsert_collection(user_id: str, item: CollectionItemCreate):
+def upsert_collection(user_id: str, item: CollectionItemCreate):
     """Add or update a collection item (upsert on user_id + angel_id)"""
     supabase = get_supabase()
 
@@ -108,7 +98,7 @@ async def upsert_collection(user_id: str, item: CollectionItemCreate):
 
 
 @router.delete("/{user_id}/collections/{angel_id}", response_model=CollectionDeleteResponse)
-async def delete_collection(user_id: str, angel_id: int):
+def delete_collection(user_id: str, angel_id: int):
     """Remove an angel from user's collection"""
     supabase = get_supabase()
 
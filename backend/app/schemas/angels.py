@@ -20,6 +20,11 @@ class AngelResponse(AngelBase):
     image_bw_url: Optional[str] = None
     image_opacity_url: Optional[str] = None
     image_profile_pic_url: Optional[str] = None
+    # srcset values for the size renditions, when IMAGE_RENDITIONS is set
+    image_srcset: Optional[str] = None
+    image_bw_srcset: Optional[str] = None
+    image_opacity_srcset: Optional[str] = None
+    image_profile_pic_srcset: Optional[str] = None
 
 
 class AngelProfilePicResponse(BaseModel):
@@ -27,6 +32,7 @@ class AngelProfilePicResponse(BaseModel):
     name: str
     image_profile_pic: Optional[str] = None
     image_url: Optional[str] = None
+    image_srcset: Optional[str] = None
 
 
 class SeriesResponse(BaseModel):
@@ -0,0 +1,130 @@
+"""
+Persistent manifest of source images seen by the asset pipeline.
+
+One SQLite row per source image (path relative to the images directory)
+records its size, mtime and content hash, the hash whose variants are in
+storage, and the angel row it was recorded as. The pipeline compares the
+scanned tree against it to find the images that are new or changed.
+
+scripts/upload_images.py keeps one row per uploaded object in `uploads`
+(storage path, local size/mtime, content hash and the storage ETag). The
+same file also holds scraper/process_images.py's `processed` table; each
+stage only reads and writes its own table.
+
+Every update commits immediately, so a run that dies part-way leaves the
+rows for finished images behind and the next run picks up from there.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    source_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    uploaded_hash TEXT,
+    angel_id INTEGER,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    storage_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    etag TEXT,
+    uploaded_at TEXT NOT NULL
+);
+"""
+
+
+class AssetManifest:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def all(self) -> dict[str, dict]:
+        """Every row, keyed by source path"""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM assets").fetchall()
+        return {row["source_path"]: dict(row) for row in rows}
+
+    def get(self, source_path: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM assets WHERE source_path = ?", (source_path,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def _execute(self, sql: str, params: tuple):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def record_hash(self, source_path: str, size: int, mtime_ns: int, content_hash: str):
+        """Store the current hash; later stages are kept until they are redone"""
+        self._execute(
+            """
+            INSERT INTO assets (source_path, size, mtime_ns, content_hash, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (source_path) DO UPDATE SET
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                content_hash = excluded.content_hash,
+                updated_at = excluded.updated_at
+            """,
+            (source_path, size, mtime_ns, content_hash, datetime.utcnow().isoformat()),
+        )
+
+    def mark_uploaded(self, source_path: str, content_hash: str):
+        self._execute(
+            "UPDATE assets SET uploaded_hash = ?, updated_at = ? WHERE source_path = ?",
+            (content_hash, datetime.utcnow().isoformat(), source_path),
+        )
+
+    def mark_recorded(self, source_path: str, angel_id: int):
+        self._execute(
+            "UPDATE assets SET angel_id = ?, updated_at = ? WHERE source_path = ?",
+            (angel_id, datetime.utcnow().isoformat(), source_path),
+        )
+
+    def remove(self, source_path: str):
+        self._execute("DELETE FROM assets WHERE source_path = ?", (source_path,))
+
+    def uploads(self) -> dict[str, dict]:
+        """Every uploaded object, keyed by storage path"""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM uploads").fetchall()
+        return {row["storage_path"]: dict(row) for row in rows}
+
+    def record_upload(self, storage_path: str, size: int, mtime_ns: int, content_hash: str, etag: Optional[str] = None):
+        self._execute(
+            """
+            INSERT INTO uploads (storage_path, size, mtime_ns, content_hash, etag, uploaded_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (storage_path) DO UPDATE SET
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                content_hash = excluded.content_hash,
+                etag = excluded.etag,
+                uploaded_at = excluded.uploaded_at
+            """,
+            (storage_path, size, mtime_ns, content_hash, etag, datetime.utcnow().isoformat()),
+        )
+
+    def record_etag(self, storage_path: str, etag: str):
+        self._execute("UPDATE uploads SET etag = ? WHERE storage_path = ?", (etag, storage_path))
@@ -0,0 +1,298 @@
+"""
+Asset pipeline: scraper images -> image service -> storage -> angels table.
+
+Source images live at <images dir>/<Series_Folder>/<Name>.png. Each run:
+  1. scans the tree, hashing only files whose size or mtime changed since
+     the manifest last saw them
+  2. sends new or changed images to the image service's /process/all and
+     uploads the original plus its three variants to storage
+  3. loads series and angels once and inserts rows only for images that
+     have no angel yet
+
+An unchanged tree therefore costs a directory walk and two reads; it makes
+no image service calls, no uploads and no database writes.
+"""
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+import asyncio
+import hashlib
+import re
+
+import httpx
+
+from app.config.settings import get_settings
+from app.config.supabase import get_supabase_admin
+from app.services.asset_manifest import AssetManifest
+from app.services.circuit_breaker import breakers, is_transient_error
+
+settings = get_settings()
+
+DEFAULT_IMAGES_DIR = Path(__file__).resolve().parents[3] / "scraper" / "images"
+
+# /process/all part name -> storage folder
+VARIANT_FOLDERS = {
+    "opacity": "images_opacity",
+    "grayscale": "images_bw",
+    "circular": "images_profile_pic",
+}
+
+IMAGE_SERVICE_TIMEOUT = 120.0
+PAGE_SIZE = 1000
+
+
+def images_dir() -> Path:
+    return Path(settings.asset_images_dir) if settings.asset_images_dir else DEFAULT_IMAGES_DIR
+
+
+def manifest_path() -> Path:
+    if settings.asset_manifest_path:
+        return Path(settings.asset_manifest_path)
+    return images_dir().parent / "asset_manifest.sqlite"
+
+
+def format_series_name(folder_name: str) -> str:
+    """Convert folder name to display name (e.g., 'Fruit_2019_Series' -> 'Fruit 2019 Series')."""
+    return folder_name.replace("_", " ")
+
+
+def format_angel_name(filename: str) -> str:
+    """Convert filename to angel name (e.g., '01_Apple.png' -> 'Apple')."""
+    name = Path(filename).stem
+    name = re.sub(r"^\d+[-_]", "", name)
+    return name.replace("_", " ")
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_images(root: Path, manifest: AssetManifest) -> list[dict]:
+    """
+    List source images with their content hash and manifest state.
+
+    Files whose size and mtime match the manifest reuse the stored hash;
+    rows for files that no longer exist are dropped.
+    """
+    known = manifest.all()
+    images = []
+    if root.exists():
+        for series_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+            for path in sorted(series_dir.glob("*.png")):
+                source_path = f"{series_dir.name}/{path.name}"
+                stat = path.stat()
+                row = known.get(source_path)
+                if row is None or row["size"] != stat.st_size or row["mtime_ns"] != stat.st_mtime_ns:
+                    content_hash = hash_file(path)
+                    manifest.record_hash(source_path, stat.st_size, stat.st_mtime_ns, content_hash)
+                    row = manifest.get(source_path)
+                images.append({
+                    "path": path,
+                    "source_path": source_path,
+                    "series_folder": series_dir.name,
+                    "filename": path.name,
+                    "content_hash": row["content_hash"],
+                    "uploaded_hash": row["uploaded_hash"],
+                    "angel_id": row["angel_id"],
+                })
+
+    seen = {image["source_path"] for image in images}
+    for source_path in known.keys() - seen:
+        manifest.remove(source_path)
+    return images
+
+
+def parse_multipart(body: bytes, content_type: str) -> dict[str, bytes]:
+    """Split a multipart/mixed body from /process/all into {part name: data}"""
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise ValueError("multipart response without a boundary")
+    delimiter = b"--" + match.group(1).encode("ascii")
+
+    parts = {}
+    for chunk in body.split(delimiter)[1:]:
+        if chunk.startswith(b"--"):
+            break
+        header_block, _, data = chunk.lstrip(b"\r\n").partition(b"\r\n\r\n")
+        headers = {}
+        for line in header_block.decode("utf-8").split("\r\n"):
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        name = re.search(r'name="([^"]+)"', headers.get("content-disposition", ""))
+        if not name:
+            continue
+        length = headers.get("content-length")
+        parts[name.group(1)] = data[:int(length)] if length else data.removesuffix(b"\r\n")
+    return parts
+
+
+async def process_variants(client: httpx.AsyncClient, image: dict, data: bytes) -> dict[str, bytes]:
+    """Run one source image through the image service's /process/all"""
+    breaker = breakers["image_service"]
+    breaker.before_call()
+    try:
+        response = await client.post(
+            f"{settings.image_service_url.rstrip('/')}/process/all",
+            files={"file": (image["filename"], data, "image/png")},
+        )
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        # A 4xx is about this image, not the service's health
+        if e.response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    except Exception as e:
+        if is_transient_error(e):
+            breaker.record_failure()
+        raise
+    breaker.record_success()
+
+    variants = parse_multipart(response.content, response.headers.get("content-type", ""))
+    missing = VARIANT_FOLDERS.keys() - variants.keys()
+    if missing:
+        raise ValueError(f"image service response is missing {', '.join(sorted(missing))}")
+    return variants
+
+
+def upload_image(image: dict, data: bytes, variants: dict[str, bytes]):
+    """Upload the original and every variant, replacing older versions"""
+    bucket = get_supabase_admin().storage.from_(settings.bucket_name)
+    files = [("images", data)] + [(VARIANT_FOLDERS[name], variants[name]) for name in VARIANT_FOLDERS]
+    for folder, content in files:
+        bucket.upload(
+            f"{folder}/{image['source_path']}",
+            content,
+            file_options={"content-type": "image/png", "upsert": "true"},
+        )
+
+
+def fetch_all(table: str, columns: str) -> list[dict]:
+    """Read a whole table, paging past PostgREST's row limit"""
+    supabase = get_supabase_admin()
+    rows = []
+    while True:
+        page = (
+            supabase.table(table)
+            .select(columns)
+            .order("id")
+            .range(len(rows), len(rows) + PAGE_SIZE - 1)
+            .execute()
+            .data
+            or []
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def record_angels(images: list[dict], manifest: AssetManifest) -> int:
+    """Insert angel rows for uploaded images that don't have one; returns rows created"""
+    supabase = get_supabase_admin()
+    series_ids = {row["name"]: row["id"] for row in fetch_all("series", "id, name")}
+    angel_ids = {(row["series_id"], row["name"]): row["id"] for row in fetch_all("angels", "id, name, series_id")}
+
+    missing_series = sorted({format_series_name(image["series_folder"]) for image in images} - series_ids.keys())
+    if missing_series:
+        result = supabase.table("series").insert([{"name": name} for name in missing_series]).execute()
+        series_ids.update({row["name"]: row["id"] for row in result.data or []})
+
+    new_rows = {}
+    for image in images:
+        series_id = series_ids[format_series_name(image["series_folder"])]
+        key = (series_id, format_angel_name(image["filename"]))
+        if key in angel_ids:
+            if image["angel_id"] != angel_ids[key]:
+                manifest.mark_recorded(image["source_path"], angel_ids[key])
+            continue
+        new_rows.setdefault(key, []).append(image)
+
+    if not new_rows:
+        return 0
+
+    result = supabase.table("angels").insert([
+        {
+            "name": name,
+            "series_id": series_id,
+            "image": f"images/{group[0]['source_path']}",
+            "image_bw": f"images_bw/{group[0]['source_path']}",
+            "image_opacity": f"images_opacity/{group[0]['source_path']}",
+            "image_profile_pic": f"images_profile_pic/{group[0]['source_path']}",
+        }
+        for (series_id, name), group in new_rows.items()
+    ]).execute()
+
+    for row in result.data or []:
+        for image in new_rows.get((row["series_id"], row["name"]), []):
+            manifest.mark_recorded(image["source_path"], row["id"])
+    return len(result.data or [])
+
+
+async def sync_assets(on_progress: Optional[Callable[[str, dict, int, int], Awaitable[None]]] = None) -> dict:
+    """
+    Bring storage and the angels table up to date with the images directory.
+
+    Returns the job_runs counters plus the images that failed, which are
+    retried on the next run. on_progress, if given, is awaited with the
+    current stage ("scanning", "processing", "recording"), the counters, and
+    how many of the stage's items are done out of its total, whenever they
+    change.
+    """
+    counts = {"images_found": 0, "images_processed": 0, "images_uploaded": 0, "angels_created": 0}
+    failures: list[str] = []
+
+    async def progress(stage: str, done: int = 0, total: int = 0):
+        if on_progress:
+            await on_progress(stage, dict(counts), done, total)
+
+    manifest = AssetManifest(str(manifest_path()))
+    try:
+        await progress("scanning")
+        images = await asyncio.to_thread(scan_images, images_dir(), manifest)
+        counts["images_found"] = len(images)
+
+        pending = [image for image in images if image["uploaded_hash"] != image["content_hash"]]
+        if pending and not settings.image_service_url:
+            raise RuntimeError(f"{len(pending)} images need processing but IMAGE_SERVICE_URL is not set")
+
+        semaphore = asyncio.Semaphore(settings.asset_pipeline_concurrency)
+        await progress("processing", 0, len(pending))
+
+        async def publish(client: httpx.AsyncClient, image: dict):
+            async with semaphore:
+                try:
+                    data = await asyncio.to_thread(image["path"].read_bytes)
+                    if hash_bytes(data) != image["content_hash"]:
+                        raise ValueError("file changed during the run")
+                    variants = await process_variants(client, image, data)
+                    counts["images_processed"] += 1
+                    await asyncio.to_thread(upload_image, image, data, variants)
+                except Exception as e:
+                    print(f"Asset pipeline: {image['source_path']} failed: {e}")
+                    failures.append(f"{image['source_path']}: {e}")
+                else:
+                    await asyncio.to_thread(manifest.mark_uploaded, image["source_path"], image["content_hash"])
+                    image["uploaded_hash"] = image["content_hash"]
+                    counts["images_uploaded"] += 1
+                await progress("processing", counts["images_uploaded"] + len(failures), len(pending))
+
+        if pending:
+            async with httpx.AsyncClient(timeout=IMAGE_SERVICE_TIMEOUT) as client:
+                await asyncio.gather(*(publish(client, image) for image in pending))
+
+        uploaded = [image for image in images if image["uploaded_hash"] == image["content_hash"]]
+        if uploaded:
+            await progress("recording", 0, len(uploaded))
+            counts["angels_created"] = await asyncio.to_thread(record_angels, uploaded, manifest)
+    finally:
+        manifest.close()
+
+    return {**counts, "failures": failures}
@@ -0,0 +1,215 @@
+"""
+Circuit breakers and retry budgets for external dependencies.
+
+Each dependency has one CircuitBreaker:
+  closed    - calls pass through; consecutive failures are counted
+  open      - calls fail immediately with CircuitOpenError until reset_timeout
+  half_open - one trial call is let through; success closes, failure re-opens
+
+Supabase queries are protected by wrapping PostgREST's `.execute()`.
+Idempotent reads (GET/HEAD) get a few jittered retries, limited by a retry
+budget so a degraded dependency never sees a retry storm. The client is
+synchronous, so the backoff sleeps the calling thread: reads made from a
+worker thread (plain `def` routes, asyncio.to_thread) are retried, while a
+read made on the event loop fails at once rather than stall every other
+request. Redis is guarded in `config/redis.py` and `middleware/cache.py`.
+"""
+from functools import wraps
+from typing import Optional
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} is unavailable (circuit open)")
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.circuit_failure_threshold
+        self.reset_timeout = reset_timeout or settings.circuit_reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go through right now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            # A trial that never reported back is abandoned after reset_timeout
+            if self.trial_started is not None and now - self.trial_started < self.reset_timeout:
+                return False
+            self.trial_started = now
+            return True
+
+    def before_call(self):
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_started is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_started = None
+
+
+class RetryBudget:
+    """
+    Token bucket that limits retries to a fraction of calls.
+
+    Every call deposits `ratio` tokens (capped at `max_tokens`); every retry
+    spends one. With ratio=0.1, at most ~10% extra load is added by retries.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+breakers = {
+    "supabase": CircuitBreaker("supabase"),
+    "redis": CircuitBreaker("redis"),
+    "image_service": CircuitBreaker("image_service"),
+}
+supabase_retry_budget = RetryBudget(settings.retry_budget_ratio)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Network failures and 5xx responses count against the circuit; 4xx do not"""
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+
+    code = str(getattr(error, "code", "") or "")
+    if code.isdigit() and len(code) == 3:
+        return int(code) >= 500
+    # Five-digit codes are Postgres SQLSTATEs (e.g. 23505 unique violation):
+    # the query reached the database and was rejected
+    # PGRST000-PGRST003: PostgREST could not reach or get a connection to Postgres
+    return code.startswith("PGRST00")
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _protected_execute(execute):
+    @wraps(execute)
+    def wrapper(self, *args, **kwargs):
+        breaker = breakers["supabase"]
+        request = getattr(self, "request", None)
+        # Sleeping between attempts on the event loop would block every request
+        retryable = getattr(request, "http_method", "") in ("GET", "HEAD") and not _on_event_loop()
+        if request is not None:
+            # postgrest's own retry sleeps for seconds; the budget below replaces it
+            request.retry_enabled = False
+
+        supabase_retry_budget.record_call()
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = execute(self, *args, **kwargs)
+            except Exception as e:
+                if not is_transient_error(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if (
+                    not retryable
+                    or attempt >= settings.read_retry_attempts
+                    or breaker.state != "closed"
+                    or not supabase_retry_budget.try_spend()
+                ):
+                    raise
+                # Only ever on a worker thread (see retryable); keep the delays short
+                time.sleep(backoff_delay(attempt, 0.05, 0.5))
+                attempt += 1
+                continue
+
+            breaker.record_success()
+            return result
+
+    wrapper._protected = True
+    return wrapper
+
+
+def protect_postgrest():
+    """Route every PostgREST `.execute()` through the supabase circuit breaker"""
+    from postgrest._sync import request_builder
+
+    for cls in (
+        request_builder.SyncQueryRequestBuilder,
+        request_builder.SyncSingleRequestBuilder,
+        request_builder.SyncMaybeSingleRequestBuilder,
+        request_builder.SyncExplainRequestBuilder,
+    ):
+        if not getattr(cls.execute, "_protected", False):
+            cls.execute = _protected_execute(cls.execute)
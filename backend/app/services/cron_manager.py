@@ -3,8 +3,9 @@ from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 import os
 
+from app.services.job_queue import enqueue_job, running_job_id
+
 scheduler = AsyncIOScheduler()
-is_job_running = False
 
 
 def get_cron_status() -> dict:
@@ -13,25 +14,23 @@ def get_cron_status() -> dict:
         "enabled": os.getenv("CRON_ENABLED", "false").lower() == "true",
         "schedule": os.getenv("CRON_SCHEDULE", "0 2 * * 0"),
         "running": scheduler.running,
-        "job_in_progress": is_job_running,
+        "job_in_progress": running_job_id() is not None,
         "next_run": None,
     }
 
 
 async def run_scheduled_job():
-    """Wrapper for scheduled job execution"""
-    global is_job_running
-    
-    if is_job_running:
-        print("Job already running, skipping...")
-        return
-    
-    is_job_running = True
+    """
+    Queue the asset pipeline; a job worker runs it.
+
+    Every API worker fires the schedule, but enqueue_job doesn't add a run
+    while one is already queued.
+    """
     try:
-        from app.services.job_service import run_asset_pipeline
-        await run_asset_pipeline()
-    finally:
-        is_job_running = False
+        job_id, created = await enqueue_job("asset_pipeline")
+        print(f"Scheduled asset pipeline {'queued' if created else 'already queued'} (job {job_id})")
+    except Exception as e:
+        print(f"Failed to queue scheduled job: {e}")
 
 
 def initialize_cron():
@@ -0,0 +1,200 @@
+"""
+Background dependency probes.
+
+A lifespan task pings Supabase (PostgREST), Redis and the image service on an
+interval and keeps the latest result per dependency in memory, so readiness
+checks never do network I/O themselves.
+"""
+from datetime import datetime
+from typing import Optional
+import asyncio
+import time
+
+import httpx
+import psutil
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+from app.services.circuit_breaker import CircuitOpenError, breakers
+
+settings = get_settings()
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+process = psutil.Process()
+
+
+class DependencyStatus:
+    """
+    Latest probe result and latency histogram of one dependency.
+
+    Probe outcomes are fed into the dependency's circuit breaker, so a
+    successful probe closes an open circuit without waiting for live traffic.
+    """
+
+    def __init__(self, name: str, critical: bool):
+        self.name = name
+        self.critical = critical
+        self.breaker = breakers[name]
+        self.status = "unknown"
+        self.last_checked: Optional[str] = None
+        self.last_latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum_ms = 0.0
+        self.probe_count = 0
+
+    @property
+    def circuit(self) -> str:
+        return self.breaker.state
+
+    def record(self, ok: bool, latency_ms: float, error: Optional[str] = None):
+        self.last_checked = datetime.utcnow().isoformat()
+        self.last_latency_ms = round(latency_ms, 2)
+        self.last_error = error
+        self.probe_count += 1
+        self.latency_sum_ms += latency_ms
+
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+        if ok:
+            self.status = "ok"
+            self.breaker.record_success()
+        else:
+            self.status = "down"
+            self.breaker.record_failure()
+
+    def mark_unavailable(self, error: str):
+        """Down without a new probe result (e.g. its circuit is open)"""
+        self.status = "down"
+        self.last_checked = datetime.utcnow().isoformat()
+        self.last_error = error
+
+    def skip(self):
+        self.status = "skipped"
+        self.last_checked = datetime.utcnow().isoformat()
+
+    def summary(self) -> dict:
+        return {
+            "status": self.status,
+            "critical": self.critical,
+            "circuit": self.circuit,
+            "latencyMs": self.last_latency_ms,
+            "lastChecked": self.last_checked,
+            "error": self.last_error,
+        }
+
+    def histogram(self) -> dict:
+        """Cumulative Prometheus-style buckets"""
+        buckets = {}
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.bucket_counts):
+            running += count
+            buckets[str(bound)] = running
+        buckets["+Inf"] = running + self.bucket_counts[-1]
+        return {
+            "buckets": buckets,
+            "count": self.probe_count,
+            "sum_ms": round(self.latency_sum_ms, 2),
+        }
+
+
+dependencies = {
+    "supabase": DependencyStatus("supabase", critical=True),
+    "redis": DependencyStatus("redis", critical=False),
+    "image_service": DependencyStatus("image_service", critical=False),
+}
+memory_status: dict = {}
+
+
+def check_memory() -> dict:
+    """Memory usage of this process relative to the host"""
+    heap_used = process.memory_info().rss
+    heap_total = psutil.virtual_memory().total
+    return {
+        "status": "ok" if heap_used / heap_total < 0.9 else "warning",
+        "heapUsed": f"{heap_used // 1024 // 1024}MB",
+        "heapTotal": f"{heap_total // 1024 // 1024}MB",
+    }
+
+
+async def probe_supabase(client: httpx.AsyncClient) -> bool:
+    """Cheapest query that still reaches Postgres through PostgREST"""
+    if not settings.supabase_url:
+        return False
+    response = await client.get(
+        f"{settings.supabase_url.rstrip('/')}/rest/v1/series",
+        params={"select": "id", "limit": 1},
+        headers={
+            "apikey": settings.supabase_key,
+            "Authorization": f"Bearer {settings.supabase_key}",
+        },
+    )
+    response.raise_for_status()
+    return True
+
+
+async def probe_redis(client: httpx.AsyncClient) -> bool:
+    redis_client = await get_redis()
+    if not redis_client:
+        # get_redis is gated by the breaker and reconnect cooldown
+        raise CircuitOpenError("redis", breakers["redis"].retry_after())
+    await redis_client.ping()
+    return True
+
+
+async def probe_image_service(client: httpx.AsyncClient) -> bool:
+    if not settings.image_service_url:
+        return False
+    response = await client.get(f"{settings.image_service_url.rstrip('/')}/health")
+    response.raise_for_status()
+    return True
+
+
+PROBES = {
+    "supabase": probe_supabase,
+    "redis": probe_redis,
+    "image_service": probe_image_service,
+}
+
+
+async def _run_probe(name: str, client: httpx.AsyncClient):
+    dependency = dependencies[name]
+
+    start = time.perf_counter()
+    try:
+        probed = await asyncio.wait_for(PROBES[name](client), settings.health_probe_timeout)
+    except CircuitOpenError as e:
+        dependency.mark_unavailable(str(e))
+        return
+    except Exception as e:
+        dependency.record(False, (time.perf_counter() - start) * 1000, str(e) or type(e).__name__)
+        return
+
+    if probed:
+        dependency.record(True, (time.perf_counter() - start) * 1000)
+    else:
+        dependency.skip()
+
+
+async def probe_all():
+    """Probe every dependency concurrently and refresh the cached results"""
+    async with httpx.AsyncClient(timeout=settings.health_probe_timeout) as client:
+        await asyncio.gather(*(_run_probe(name, client) for name in PROBES))
+    memory_status.update(check_memory())
+
+
+async def run_dependency_monitor():
+    """Lifespan task: probe immediately, then every health_probe_interval seconds"""
+    while True:
+        try:
+            await probe_all()
+        except Exception as e:
+            print(f"Dependency probe error: {e}")
+        await asyncio.sleep(settings.health_probe_interval)
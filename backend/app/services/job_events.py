@@ -0,0 +1,186 @@
+"""
+Live job progress events.
+
+The pipeline publishes progress snapshots (stage, items done/total,
+throughput, ETA) for its job. Each API worker fans them out in memory to the
+SSE streams watching that job (GET /api/jobs/{job_id}/events), and relays
+them through a Redis pub/sub channel so streams on other workers get them
+too. Watching a job costs one database read when the stream opens and this
+worker hasn't seen an event for the job yet, plus one per keepalive while no
+events arrive: if the relay missed the final event (Redis down or
+reconnecting), the job_runs row still says the job is over and the stream
+closes.
+
+Every event is a full snapshot rather than a delta, so a slow subscriber can
+drop old events without losing state.
+"""
+from typing import AsyncIterator, Awaitable, Callable, Optional
+import asyncio
+import json
+import secrets
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+CHANNEL = "job-events"
+TERMINAL_STATUSES = ("success", "failed")
+SUBSCRIBER_QUEUE_SIZE = 100
+LATEST_EVENTS_KEPT = 100
+KEEPALIVE_INTERVAL = 15.0
+
+# Lets the relay skip this worker's own messages, which it already delivered
+WORKER_ID = secrets.token_hex(8)
+
+
+class Broadcaster:
+    """In-process fan-out of job events, plus the latest event of recent jobs."""
+
+    def __init__(self):
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+        self.latest: dict[int, dict] = {}
+
+    def subscribe(self, job_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: int, queue: asyncio.Queue):
+        queues = self.subscribers.get(job_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[job_id]
+
+    def publish(self, job_id: int, event: dict):
+        self.latest.pop(job_id, None)
+        self.latest[job_id] = event
+        while len(self.latest) > LATEST_EVENTS_KEPT:
+            del self.latest[next(iter(self.latest))]
+
+        for queue in self.subscribers.get(job_id, ()):
+            if queue.full():
+                # Snapshots supersede each other; drop the oldest
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+broadcaster = Broadcaster()
+
+
+async def publish(job_id: int, event: dict):
+    """Deliver an event to this worker's subscribers and, via Redis, every other worker's"""
+    event = {"job_id": job_id, **event}
+    broadcaster.publish(job_id, event)
+
+    redis_client = await get_redis()
+    if redis_client:
+        try:
+            await redis_client.publish(CHANNEL, json.dumps({"origin": WORKER_ID, "event": event}))
+        except Exception as e:
+            print(f"Job events: Redis publish failed: {e}")
+
+
+def job_run_event(job: dict) -> dict:
+    """Snapshot event for a job_runs row, for streams opened before any live event"""
+    # The row has counters but not the size of the current stage
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job.get("stage") or job["status"],
+        "done": None,
+        "total": None,
+        "images_per_second": None,
+        "eta_seconds": None,
+        "counts": {
+            key: job.get(key) or 0
+            for key in ("images_found", "images_processed", "images_uploaded", "angels_created")
+        },
+        "error_message": job.get("error_message"),
+    }
+
+
+def format_sse(event: dict) -> str:
+    kind = "done" if event["status"] in TERMINAL_STATUSES else "progress"
+    return f"event: {kind}\ndata: {json.dumps(event)}\n\n"
+
+
+async def finished_job_event(job_id: int, load_job: Callable[[int], Awaitable[Optional[dict]]]) -> Optional[dict]:
+    """The job's final event from its row if it has finished, else None"""
+    try:
+        job = await load_job(job_id)
+    except Exception as e:
+        print(f"Job events: could not check job {job_id}: {e}")
+        return None
+    if job and job["status"] in TERMINAL_STATUSES:
+        return job_run_event(job)
+    return None
+
+
+async def event_stream(
+    job_id: int,
+    queue: asyncio.Queue,
+    initial: Optional[dict],
+    load_job: Callable[[int], Awaitable[Optional[dict]]],
+) -> AsyncIterator[str]:
+    """
+    SSE body for one job: the current snapshot, then live events until the
+    job finishes. The caller subscribes `queue` before reading `initial`, so
+    no event falls between them; it is unsubscribed when the stream ends.
+    `load_job` reads the job's row, checked on every keepalive.
+    """
+    try:
+        if initial:
+            yield format_sse(initial)
+            if initial["status"] in TERMINAL_STATUSES:
+                return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                finished = await finished_job_event(job_id, load_job)
+                if finished:
+                    yield format_sse(finished)
+                    return
+                # Keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+            if event["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        broadcaster.unsubscribe(job_id, queue)
+
+
+async def run_event_relay():
+    """Lifespan task: deliver other workers' events from Redis to this worker's subscribers"""
+    while True:
+        redis_client = await get_redis()
+        if not redis_client:
+            await asyncio.sleep(settings.redis_reconnect_cooldown)
+            continue
+
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(CHANNEL)
+            while True:
+                # Short waits rather than listen(), which would trip the
+                # pool's socket timeout whenever the channel is quiet
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message:
+                    continue
+                payload = json.loads(message["data"])
+                if payload["origin"] != WORKER_ID:
+                    event = payload["event"]
+                    broadcaster.publish(event["job_id"], event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Job events: Redis relay error: {e}")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
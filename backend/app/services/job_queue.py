@@ -0,0 +1,272 @@
+"""
+Background job queue for the asset pipeline.
+
+The queue is the job_runs table: POST /api/jobs/trigger and the cron schedule
+insert a 'queued' row, and a lifespan task in every API worker runs queued
+rows oldest first. Only one pipeline runs at a time across all workers: the
+runner holds a Redis lock (SET NX with a TTL, renewed while the job runs).
+While Redis is unavailable no worker claims jobs; they stay queued until it
+is back, rather than risk two pipelines running at once. For the same
+reason a runner that loses the lock mid-job (it was taken, or could not be
+renewed before the TTL ran out) cancels its pipeline and fails the run.
+
+Queued rows survive restarts, and the unique index on queued rows (see
+database/schema.sql) keeps concurrent triggers from queueing the same job
+twice. A row left 'running' by a worker that died is marked failed by the
+next worker that takes the lock, since holding it means nothing else can be
+running.
+"""
+from datetime import datetime
+from typing import Optional
+import asyncio
+import secrets
+import time
+
+from app.config.redis import get_redis
+from app.config.settings import get_settings
+from app.config.supabase import get_supabase_admin
+from app.services.circuit_breaker import breakers
+from app.services.job_service import publish_job_result, run_asset_pipeline, update_job_run
+
+settings = get_settings()
+
+LOCK_KEY = "job-lock:{job_name}"
+
+# Renew/release only if the lock still holds our token
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+UNIQUE_VIOLATION = "23505"
+ENQUEUE_ATTEMPTS = 3
+
+wake = asyncio.Event()
+current_job_id: Optional[int] = None
+
+
+class PipelineLock:
+    """Non-blocking Redis lock held while a job runs, excluding every worker"""
+
+    def __init__(self, job_name: str):
+        self.key = LOCK_KEY.format(job_name=job_name)
+        self.token = secrets.token_hex(16)
+        self.ttl_ms = int(settings.job_lock_ttl * 1000)
+        self.redis_client = None
+        self.renew_task: Optional[asyncio.Task] = None
+        # Set (with the reason) once the lock can no longer be trusted
+        self.lost = asyncio.Event()
+        self.lost_reason: Optional[str] = None
+
+    async def acquire(self) -> bool:
+        """False if another worker holds the lock or Redis is unavailable"""
+        redis_client = await get_redis()
+        if not redis_client:
+            return False
+        # Taken before the call, so the expiry we track is never later than Redis's
+        started = time.monotonic()
+        try:
+            acquired = await redis_client.set(self.key, self.token, nx=True, px=self.ttl_ms)
+            breakers["redis"].record_success()
+        except Exception as e:
+            breakers["redis"].record_failure()
+            print(f"Job lock error: {e}")
+            return False
+        if not acquired:
+            return False
+
+        self.redis_client = redis_client
+        self.renew_task = asyncio.create_task(self._renew(started + settings.job_lock_ttl))
+        return True
+
+    async def _renew(self, expires_at: float):
+        interval = settings.job_lock_ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            started = time.monotonic()
+            try:
+                renewed = await self.redis_client.eval(RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms)
+                breakers["redis"].record_success()
+            except Exception as e:
+                breakers["redis"].record_failure()
+                print(f"Job lock error: {e}")
+                # Give up while the lock is still ours, before another worker can take it
+                if time.monotonic() + interval >= expires_at:
+                    self._lose(f"could not renew the pipeline lock: {e}")
+                    return
+                continue
+
+            if not renewed:
+                self._lose("the pipeline lock expired or was taken by another worker")
+                return
+            expires_at = started + settings.job_lock_ttl
+
+    def _lose(self, reason: str):
+        self.lost_reason = reason
+        self.lost.set()
+
+    async def release(self):
+        self.renew_task.cancel()
+        try:
+            await self.redis_client.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+            breakers["redis"].record_success()
+        except Exception as e:
+            # The TTL frees it shortly
+            breakers["redis"].record_failure()
+            print(f"Job lock error: {e}")
+
+
+def running_job_id() -> Optional[int]:
+    """Id of the job this process is running, if any"""
+    return current_job_id
+
+
+async def get_queued_job(job_name: str) -> Optional[dict]:
+    """Oldest queued job run for a job"""
+    supabase = get_supabase_admin()
+
+    result = supabase.table("job_runs").select("*").eq("job_name", job_name).eq(
+        "status", "queued"
+    ).order("created_at").limit(1).execute()
+
+    return result.data[0] if result.data else None
+
+
+async def enqueue_job(job_name: str = "asset_pipeline") -> tuple[int, bool]:
+    """
+    Queue a job run unless one is already waiting.
+
+    Returns the queued job's id and whether a new row was created. The insert
+    is the check: the unique index on queued rows rejects a second one, so
+    workers whose cron fires at the same moment queue a single run.
+    """
+    supabase = get_supabase_admin()
+
+    for _ in range(ENQUEUE_ATTEMPTS):
+        try:
+            result = supabase.table("job_runs").insert({
+                "job_name": job_name,
+                "status": "queued",
+                "stage": "queued",
+            }).execute()
+        except Exception as e:
+            if str(getattr(e, "code", "")) != UNIQUE_VIOLATION:
+                raise
+        else:
+            wake.set()
+            return result.data[0]["id"], True
+
+        queued = await get_queued_job(job_name)
+        if queued:
+            return queued["id"], False
+        # Claimed between the insert and the read; try again
+
+    raise RuntimeError(f"Could not queue {job_name}: the queued run kept changing")
+
+
+async def claim_job(job_id: int) -> bool:
+    """Move a queued job to running; False if another worker got it first"""
+    supabase = get_supabase_admin()
+
+    result = supabase.table("job_runs").update({
+        "status": "running",
+        "started_at": datetime.utcnow().isoformat(),
+    }).eq("id", job_id).eq("status", "queued").execute()
+
+    return bool(result.data)
+
+
+async def fail_interrupted_jobs(job_name: str):
+    """Mark runs whose worker died mid-job as failed (call with the lock held)"""
+    supabase = get_supabase_admin()
+
+    error_message = "Interrupted: the worker running this job stopped"
+    result = supabase.table("job_runs").update({
+        "status": "failed",
+        "stage": "failed",
+        "completed_at": datetime.utcnow().isoformat(),
+        "error_message": error_message,
+    }).eq("job_name", job_name).eq("status", "running").execute()
+
+    for job in result.data or []:
+        # Ends the streams still watching it
+        await publish_job_result(job["id"], "failed", {}, error_message)
+
+
+async def run_locked(job_id: int, lock: PipelineLock) -> bool:
+    """
+    Run the pipeline for a claimed job while `lock` holds. If the lock is
+    lost first, cancel the pipeline and fail the run; returns False then.
+    """
+    pipeline = asyncio.create_task(run_asset_pipeline(job_id=job_id))
+    lost = asyncio.create_task(lock.lost.wait())
+    try:
+        await asyncio.wait({pipeline, lost}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        pipeline.cancel()
+        raise
+    finally:
+        lost.cancel()
+
+    if pipeline.done():
+        # Retrieve it; run_asset_pipeline has recorded any failure on the job run
+        pipeline.exception()
+        return True
+
+    pipeline.cancel()
+    await asyncio.wait({pipeline})
+
+    error_message = f"Stopped: {lock.lost_reason}"
+    try:
+        await update_job_run(job_id, status="failed", error_message=error_message)
+    except Exception as e:
+        # The next worker to take the lock fails it as interrupted instead
+        print(f"Failed to record stopped job {job_id}: {e}")
+    await publish_job_result(job_id, "failed", {}, error_message)
+    return False
+
+
+async def process_queue(job_name: str = "asset_pipeline"):
+    """Run queued jobs one at a time until none are left or the lock is held elsewhere (or lost)"""
+    global current_job_id
+
+    while await get_queued_job(job_name):
+        lock = PipelineLock(job_name)
+        if not await lock.acquire():
+            return
+        try:
+            await fail_interrupted_jobs(job_name)
+            job = await get_queued_job(job_name)
+            if not job or not await claim_job(job["id"]):
+                continue
+
+            current_job_id = job["id"]
+            try:
+                if not await run_locked(job["id"], lock):
+                    return
+            finally:
+                current_job_id = None
+        finally:
+            await lock.release()
+
+
+async def run_job_worker():
+    """Lifespan task: run queued jobs when woken by enqueue_job, or every job_poll_interval seconds"""
+    while True:
+        wake.clear()
+        try:
+            await process_queue()
+        except Exception as e:
+            print(f"Job worker error: {e}")
+        try:
+            await asyncio.wait_for(wake.wait(), settings.job_poll_interval)
+        except asyncio.TimeoutError:
+            pass
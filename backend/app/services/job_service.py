@@ -1,8 +1,13 @@
 from datetime import datetime
 from typing import Optional
-import os
+import time
 
+from app.config.settings import get_settings
 from app.config.supabase import get_supabase_admin
+from app.services import job_events
+from app.services.asset_pipeline import sync_assets
+
+settings = get_settings()
 
 
 async def create_job_run(job_name: str) -> int:
@@ -18,6 +23,75 @@ async def create_job_run(job_name: str) -> int:
     return result.data[0]["id"] if result.data else None
 
 
+async def update_job_progress(job_id: int, stage: str, counts: dict):
+    """Record a running job's stage and counters so far"""
+    supabase = get_supabase_admin()
+    
+    supabase.table("job_runs").update({"stage": stage, **counts}).eq("id", job_id).execute()
+
+
+class ProgressWriter:
+    """
+    sync_assets progress callback: live events for SSE watchers, and the
+    stage and counters written to job_runs.
+
+    Every stage change is written and published. Otherwise events go out at
+    most once per job_event_interval seconds (and when a stage finishes),
+    and the row is updated at most once per job_progress_interval, so a
+    large run doesn't write per image.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.stage: Optional[str] = None
+        self.stage_started = 0.0
+        self.last_write = 0.0
+        self.last_event = 0.0
+
+    async def __call__(self, stage: str, counts: dict, done: int = 0, total: int = 0):
+        now = time.monotonic()
+        stage_changed = stage != self.stage
+        if stage_changed:
+            self.stage = stage
+            self.stage_started = now
+
+        if stage_changed or done == total or now - self.last_event >= settings.job_event_interval:
+            self.last_event = now
+            elapsed = now - self.stage_started
+            rate = done / elapsed if done and elapsed > 0 else None
+            await job_events.publish(self.job_id, {
+                "status": "running",
+                "stage": stage,
+                "done": done,
+                "total": total,
+                "images_per_second": round(rate, 2) if rate else None,
+                "eta_seconds": round((total - done) / rate, 1) if rate else None,
+                "counts": counts,
+            })
+
+        if stage_changed or now - self.last_write >= settings.job_progress_interval:
+            self.last_write = now
+            try:
+                await update_job_progress(self.job_id, stage, counts)
+            except Exception as e:
+                # Progress is informational; don't fail the run over it
+                print(f"Failed to record job progress: {e}")
+
+
+async def publish_job_result(job_id: int, status: str, counts: dict, error_message: Optional[str] = None):
+    """Final event for a job's watchers; ends their streams"""
+    await job_events.publish(job_id, {
+        "status": status,
+        "stage": status,
+        "done": None,
+        "total": None,
+        "images_per_second": None,
+        "eta_seconds": None,
+        "counts": counts,
+        "error_message": error_message,
+    })
+
+
 async def update_job_run(
     job_id: int,
     status: str,
@@ -36,6 +110,7 @@ async def update_job_run(
     
     supabase.table("job_runs").update({
         "status": status,
+        "stage": status,
         "completed_at": datetime.utcnow().isoformat(),
         "images_found": images_found,
         "images_processed": images_processed,
@@ -46,54 +121,49 @@ async def update_job_run(
     }).eq("id", job_id).execute()
 
 
-async def run_asset_pipeline() -> dict:
+async def run_asset_pipeline(job_id: Optional[int] = None) -> dict:
     """
     Run the asset pipeline job:
-    1. Scan scraper/images for new images
-    2. Process images (grayscale, opacity, circular)
+    1. Scan scraper/images for new or changed images
+    2. Process them through the image service (grayscale, opacity, circular)
     3. Upload to Supabase Storage
     4. Create angel records in database
+
+    job_id is a run already claimed from the queue (see job_queue); without
+    one a new run is recorded.
     """
-    job_id = await create_job_run("asset_pipeline")
+    if job_id is None:
+        job_id = await create_job_run("asset_pipeline")
     
     try:
-        print("Starting asset pipeline...")
+        print(f"Starting asset pipeline (job {job_id})...")
         
-        # Placeholder for actual pipeline logic
-        # In production, this would:
-        # 1. Scan scraper/images/ directory
-        # 2. Compare with existing angels in database
-        # 3. Process new images through image processing
-        # 4. Upload to Supabase Storage
-        # 5. Create angel records
+        result = await sync_assets(on_progress=ProgressWriter(job_id))
+        failures = result.pop("failures")
+        error_message = None
+        if failures:
+            # Failed images keep their old manifest state and are retried next run
+            error_message = f"{len(failures)} images failed: " + "; ".join(failures[:10])
         
-        images_found = 0
-        images_processed = 0
-        images_uploaded = 0
-        angels_created = 0
+        await update_job_run(job_id, status="success", error_message=error_message, **result)
+        await publish_job_result(job_id, "success", result, error_message)
         
-        await update_job_run(
-            job_id,
-            status="success",
-            images_found=images_found,
-            images_processed=images_processed,
-            images_uploaded=images_uploaded,
-            angels_created=angels_created,
+        print(
+            f"Asset pipeline completed: {result['images_found']} found, "
+            f"{result['images_processed']} processed, {result['images_uploaded']} uploaded, "
+            f"{result['angels_created']} angels created, {len(failures)} failed"
         )
         
-        print("Asset pipeline completed successfully")
-        
         return {
             "job_id": job_id,
             "status": "success",
-            "images_found": images_found,
-            "images_processed": images_processed,
-            "images_uploaded": images_uploaded,
-            "angels_created": angels_created,
+            **result,
+            "images_failed": len(failures),
         }
         
     except Exception as e:
         await update_job_run(job_id, status="failed", error_message=str(e))
+        await publish_job_result(job_id, "failed", {}, str(e))
         print(f"Asset pipeline failed: {e}")
         raise
 
@@ -109,6 +179,15 @@ async def get_job_status(limit: int = 10) -> list:
     return result.data or []
 
 
+async def get_job_run(job_id: int) -> Optional[dict]:
+    """Get one job run"""
+    supabase = get_supabase_admin()
+    
+    result = supabase.table("job_runs").select("*").eq("id", job_id).limit(1).execute()
+    
+    return result.data[0] if result.data else None
+
+
 async def get_latest_job_run() -> Optional[dict]:
     """Get the most recent job run"""
     supabase = get_supabase_admin()
@@ -0,0 +1,90 @@
+"""
+On-demand profiling of the running API process.
+
+Both profilers return Brendan Gregg "collapsed" stacks (`frame;frame;frame N`)
+that can be fed directly to flamegraph.pl or speedscope.
+"""
+from collections import Counter
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_cpu(seconds: float, interval_ms: float = 5.0) -> Counter:
+    """
+    Sample the stacks of every other thread for `seconds`.
+
+    Runs in a worker thread so the event loop keeps serving (and gets sampled)
+    while the profile is taken. Each stack is rooted at its thread name.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    interval = interval_ms / 1000
+    counts: Counter = Counter()
+
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            counts[";".join(reversed(stack))] += 1
+
+        time.sleep(interval)
+
+    return counts
+
+
+def sample_allocations(seconds: float, nframes: int = 25) -> Counter:
+    """
+    Diff two tracemalloc snapshots taken `seconds` apart.
+
+    Stacks are weighted by bytes allocated (and still alive) in the window.
+    tracemalloc is only enabled for the duration of the capture unless it
+    was already running.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(nframes)
+
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    ignore = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]
+    before = before.filter_traces(ignore)
+    after = after.filter_traces(ignore)
+
+    counts: Counter = Counter()
+    for stat in after.compare_to(before, "traceback"):
+        if stat.size_diff <= 0:
+            continue
+        stack = ";".join(
+            f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback
+        )
+        counts[stack] += stat.size_diff
+
+    return counts
+
+
+def collapse(counts: Counter) -> str:
+    """Render stack counts in collapsed-stack text format"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
@@ -23,7 +23,8 @@ CREATE TABLE IF NOT EXISTS public.angels (
     image_bw VARCHAR(500),
     image_opacity VARCHAR(500),
     image_profile_pic VARCHAR(500),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(name, series_id)
 );
 
 CREATE INDEX idx_angels_series ON public.angels(series_id);
@@ -104,7 +105,8 @@ COMMENT ON TABLE public.audit_logs IS 'Audit trail for all sensitive operations'
 CREATE TABLE IF NOT EXISTS public.job_runs (
     id BIGSERIAL PRIMARY KEY,
     job_name VARCHAR(100) NOT NULL,
-    status VARCHAR(20) NOT NULL CHECK (status IN ('running', 'success', 'failed')),
+    status VARCHAR(20) NOT NULL CHECK (status IN ('queued', 'running', 'success', 'failed')),
+    stage VARCHAR(20),
     started_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     completed_at TIMESTAMP WITH TIME ZONE,
     images_found INTEGER DEFAULT 0,
@@ -119,8 +121,18 @@ CREATE TABLE IF NOT EXISTS public.job_runs (
 CREATE INDEX idx_job_runs_status ON public.job_runs(status);
 CREATE INDEX idx_job_runs_started_at ON public.job_runs(started_at DESC);
 CREATE INDEX idx_job_runs_job_name ON public.job_runs(job_name);
+-- At most one queued run per job: enqueueing is a plain insert that this rejects
+CREATE UNIQUE INDEX idx_job_runs_one_queued ON public.job_runs(job_name) WHERE status = 'queued';
 
 COMMENT ON TABLE public.job_runs IS 'Tracks automated job executions';
+COMMENT ON COLUMN public.job_runs.status IS 'queued rows are the job queue; started_at is reset when a worker claims one';
+
+-- Databases created before the job queue need:
+--   ALTER TABLE public.job_runs DROP CONSTRAINT job_runs_status_check;
+--   ALTER TABLE public.job_runs ADD CONSTRAINT job_runs_status_check
+--       CHECK (status IN ('queued', 'running', 'success', 'failed'));
+--   ALTER TABLE public.job_runs ADD COLUMN stage VARCHAR(20);
+--   CREATE UNIQUE INDEX idx_job_runs_one_queued ON public.job_runs(job_name) WHERE status = 'queued';
 
 -- =====================================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cache middleware's Redis access patterns.
+
+Run from the backend directory against a local Redis:
+    docker run --rm -p 6379:6379 redis:7
+    python scripts/benchmark_redis.py --requests 2000 --keys 8
+
+Compares, per simulated request that needs `--keys` cache entries (a
+catalog key plus per-user keys):
+  - a new client per request (no pooling)
+  - the app's pool (app/config/redis.py), get_cached once per key
+  - the app's pool, one get_cached_many (MGET) round-trip per request
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import redis.asyncio as redis
+
+from app.config import redis as redis_config
+from app.middleware import cache
+
+REDIS_URL = redis_config.settings.redis_url
+
+
+def make_keys(request_id: int, count: int) -> list[str]:
+    """A catalog key shared by all requests plus per-user keys"""
+    user_id = request_id % 50
+    return ["bench:angels:all"] + [f"bench:user:{user_id}:{i}" for i in range(count - 1)]
+
+
+async def unpooled(requests: int, keys: int, concurrency: int):
+    async def one(request_id: int):
+        client = redis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            for key in make_keys(request_id, keys):
+                await client.get(key)
+        finally:
+            await client.aclose()
+            await client.connection_pool.disconnect()
+
+    await run_concurrently(one, requests, concurrency)
+
+
+async def pooled_sequential(requests: int, keys: int, concurrency: int):
+    async def one(request_id: int):
+        for key in make_keys(request_id, keys):
+            await cache.get_cached(key)
+
+    await run_concurrently(one, requests, concurrency)
+
+
+async def pooled_batched(requests: int, keys: int, concurrency: int):
+    async def one(request_id: int):
+        await cache.get_cached_many(make_keys(request_id, keys))
+
+    await run_concurrently(one, requests, concurrency)
+
+
+async def run_concurrently(fn, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(request_id: int):
+        async with semaphore:
+            await fn(request_id)
+
+    await asyncio.gather(*(guarded(i) for i in range(requests)))
+
+
+async def seed(keys: int):
+    values = {"bench:angels:all": "x" * 20_000}
+    for user_id in range(50):
+        for i in range(keys - 1):
+            values[f"bench:user:{user_id}:{i}"] = "y" * 500
+    await cache.set_cached_many(values, expiration=600)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark Redis cache access patterns")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=8, help="cache keys per request")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=redis_config.settings.redis_max_connections)
+    args = parser.parse_args()
+
+    redis_config.settings.redis_max_connections = args.pool_size
+    await redis_config.init_redis()
+    if redis_config.redis_client is None:
+        print(f"Error: cannot reach Redis at {REDIS_URL}")
+        sys.exit(1)
+
+    await seed(args.keys)
+
+    print(f"Redis: {REDIS_URL}")
+    print(f"{args.requests} requests x {args.keys} keys, concurrency {args.concurrency}, pool {args.pool_size}")
+    print("-" * 50)
+
+    scenarios = [
+        ("new client per request", lambda: unpooled(args.requests, args.keys, args.concurrency)),
+        ("pooled, get_cached per key", lambda: pooled_sequential(args.requests, args.keys, args.concurrency)),
+        ("pooled, get_cached_many", lambda: pooled_batched(args.requests, args.keys, args.concurrency)),
+    ]
+
+    for name, scenario in scenarios:
+        start = time.perf_counter()
+        await scenario()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28} {elapsed:7.3f}s  {args.requests / elapsed:9.0f} req/s")
+
+    await redis_config.close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
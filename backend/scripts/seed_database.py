@@ -1,6 +1,24 @@
+#!/usr/bin/env python3
+"""
+Seed the series and angels tables from the scraped images.
+
+Run from the backend directory:
+    python scripts/seed_database.py [--dry-run]
+
+Existing series and angels are read once (one paged query per table), the
+image tree is diffed against them in memory, and only new or changed rows
+are written, as multi-row upserts keyed on series name and on angel
+(name, series_id). Seeding thousands of angels takes a handful of
+round-trips. --dry-run prints the diff without writing anything.
+
+The angel upsert relies on UNIQUE(name, series_id) from database/schema.sql.
+On databases created before it was added, run once:
+    ALTER TABLE public.angels ADD CONSTRAINT angels_name_series_id_key UNIQUE (name, series_id);
+"""
+
+import argparse
 import os
 import sys
-import re
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -8,120 +26,164 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 from supabase import create_client
 
+from app.services.asset_pipeline import format_angel_name, format_series_name
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    print("Error: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in .env")
-    sys.exit(1)
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 SCRAPER_DIR = Path(__file__).parent.parent.parent / "scraper"
 IMAGES_DIR = SCRAPER_DIR / "images"
 
-
-def format_series_name(folder_name: str) -> str:
-    """Convert folder name to display name (e.g., 'Fruit_2019_Series' -> 'Fruit 2019 Series')."""
-    return folder_name.replace("_", " ")
-
-
-def format_angel_name(filename: str) -> str:
-    """Convert filename to angel name (e.g., 'Apple.png' -> 'Apple')."""
-    name = Path(filename).stem
-    name = re.sub(r"^\d+[-_]", "", name)
-    name = name.replace("_", " ")
-    return name
-
-
-def get_or_create_series(name: str) -> int:
-    """Get existing series ID or create new series."""
-    result = supabase.table("series").select("id").eq("name", name).execute()
-    if result.data:
-        return result.data[0]["id"]
-    
-    result = supabase.table("series").insert({"name": name}).execute()
-    if result.data:
-        print(f"  Created series: {name}")
-        return result.data[0]["id"]
-    
-    raise Exception(f"Failed to create series: {name}")
-
-
-def angel_exists(name: str, series_id: int) -> bool:
-    """Check if angel already exists in the database."""
-    result = supabase.table("angels").select("id").eq("name", name).eq("series_id", series_id).execute()
-    return len(result.data) > 0
-
-
-def create_angel(name: str, series_id: int, series_folder: str, filename: str) -> bool:
-    """Create an angel record in the database."""
-    base_name = Path(filename).stem
-    
-    angel_data = {
-        "name": name,
-        "series_id": series_id,
+PAGE_SIZE = 1000
+UPSERT_BATCH_SIZE = 500
+IMAGE_COLUMNS = ("image", "image_bw", "image_opacity", "image_profile_pic")
+
+
+def fetch_all(supabase, table: str, columns: str) -> list[dict]:
+    """Read a whole table, paging past PostgREST's row limit."""
+    rows = []
+    while True:
+        page = (
+            supabase.table(table)
+            .select(columns)
+            .order("id")
+            .range(len(rows), len(rows) + PAGE_SIZE - 1)
+            .execute()
+            .data
+            or []
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def angel_images(series_folder: str, filename: str) -> dict:
+    """Storage paths of an angel's image and its variants."""
+    return {
         "image": f"images/{series_folder}/{filename}",
         "image_bw": f"images_bw/{series_folder}/{filename}",
         "image_opacity": f"images_opacity/{series_folder}/{filename}",
         "image_profile_pic": f"images_profile_pic/{series_folder}/{filename}",
     }
-    
-    try:
-        result = supabase.table("angels").insert(angel_data).execute()
-        if result.data:
-            return True
-    except Exception as e:
-        print(f"    Error creating angel {name}: {e}")
-    
-    return False
+
+
+def scan_images(images_dir: Path) -> dict[str, list[dict]]:
+    """{series name: [angel row without series_id]} for every PNG under images_dir."""
+    catalog = {}
+    for series_folder in sorted(p for p in images_dir.iterdir() if p.is_dir()):
+        angels = {}
+        for image_file in sorted(series_folder.glob("*.png")):
+            name = format_angel_name(image_file.name)
+            # Two files that map to the same name would collide on the
+            # unique key; the first one wins
+            angels.setdefault(name, {"name": name, **angel_images(series_folder.name, image_file.name)})
+        catalog[format_series_name(series_folder.name)] = list(angels.values())
+    return catalog
+
+
+def plan_seed(catalog: dict[str, list[dict]], series_rows: list[dict], angel_rows: list[dict]) -> dict:
+    """
+    Diff the scanned catalog against the database.
+
+    Returns the series to create, and per series the angels to create and
+    the existing angels whose image paths differ.
+    """
+    series_ids = {row["name"]: row["id"] for row in series_rows}
+    existing = {(row["series_id"], row["name"]): row for row in angel_rows}
+
+    plan = {"new_series": [], "new_angels": {}, "changed_angels": {}, "unchanged": 0}
+    for series_name, angels in catalog.items():
+        series_id = series_ids.get(series_name)
+        if series_id is None:
+            plan["new_series"].append(series_name)
+        for angel in angels:
+            row = existing.get((series_id, angel["name"])) if series_id is not None else None
+            if row is None:
+                plan["new_angels"].setdefault(series_name, []).append(angel)
+            elif any(row.get(column) != angel[column] for column in IMAGE_COLUMNS):
+                plan["changed_angels"].setdefault(series_name, []).append(angel)
+            else:
+                plan["unchanged"] += 1
+    return plan
+
+
+def apply_seed(supabase, plan: dict, series_rows: list[dict]) -> dict:
+    """Write the plan with bulk upserts. Returns counts of rows written."""
+    series_ids = {row["name"]: row["id"] for row in series_rows}
+
+    if plan["new_series"]:
+        result = supabase.table("series").upsert(
+            [{"name": name} for name in plan["new_series"]], on_conflict="name"
+        ).execute()
+        series_ids.update({row["name"]: row["id"] for row in result.data or []})
+
+    rows = [
+        {**angel, "series_id": series_ids[series_name]}
+        for group in ("new_angels", "changed_angels")
+        for series_name, angels in plan[group].items()
+        for angel in angels
+    ]
+    written = 0
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        result = supabase.table("angels").upsert(
+            rows[start:start + UPSERT_BATCH_SIZE], on_conflict="name,series_id"
+        ).execute()
+        written += len(result.data or [])
+
+    return {"series": len(plan["new_series"]), "angels": written}
+
+
+def print_plan(plan: dict):
+    for series_name in plan["new_series"]:
+        print(f"  + series: {series_name}")
+    for label, group in (("+", "new_angels"), ("~", "changed_angels")):
+        for series_name, angels in plan[group].items():
+            for angel in angels:
+                print(f"    {label} {series_name}: {angel['name']}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Seed series and angels from scraped images")
+    parser.add_argument("--dry-run", action="store_true", help="print the diff without writing")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        print("Error: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in .env")
+        sys.exit(1)
+
     print("Seeding database with series and angels...")
     print(f"Images directory: {IMAGES_DIR}")
     print("-" * 50)
-    
+
     if not IMAGES_DIR.exists():
         print(f"Error: Images directory not found: {IMAGES_DIR}")
         print("Run the scraper first: python scraper/scrape_images.py")
         sys.exit(1)
-    
-    series_count = 0
-    angel_count = 0
-    skipped_count = 0
-    
-    for series_folder in sorted(IMAGES_DIR.iterdir()):
-        if not series_folder.is_dir():
-            continue
-        
-        series_name = format_series_name(series_folder.name)
-        print(f"\nProcessing: {series_name}")
-        
-        series_id = get_or_create_series(series_name)
-        series_count += 1
-        
-        for image_file in sorted(series_folder.glob("*.png")):
-            angel_name = format_angel_name(image_file.name)
-            
-            if angel_exists(angel_name, series_id):
-                print(f"    Skipped (exists): {angel_name}")
-                skipped_count += 1
-                continue
-            
-            if create_angel(angel_name, series_id, series_folder.name, image_file.name):
-                print(f"    Created: {angel_name}")
-                angel_count += 1
-    
+
+    supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+    catalog = scan_images(IMAGES_DIR)
+    series_rows = fetch_all(supabase, "series", "id, name")
+    angel_rows = fetch_all(supabase, "angels", "id, name, series_id, " + ", ".join(IMAGE_COLUMNS))
+    plan = plan_seed(catalog, series_rows, angel_rows)
+
+    new_angels = sum(len(angels) for angels in plan["new_angels"].values())
+    changed_angels = sum(len(angels) for angels in plan["changed_angels"].values())
+
+    print_plan(plan)
     print("-" * 50)
-    print(f"Done!")
-    print(f"  Series: {series_count}")
-    print(f"  Angels created: {angel_count}")
-    print(f"  Angels skipped: {skipped_count}")
+    print(f"Series: {len(catalog)} scanned, {len(plan['new_series'])} to create")
+    print(f"Angels: {new_angels} to create, {changed_angels} to update, {plan['unchanged']} unchanged")
+
+    if args.dry_run:
+        print("Dry run: nothing written.")
+        return
+
+    written = apply_seed(supabase, plan, series_rows)
+    print(f"Done! Series created: {written['series']}, angels written: {written['angels']}")
 
 
 if __name__ == "__main__":
     main()
-
@@ -3,20 +3,38 @@
 Upload images to Supabase Storage.
 
 Run from the backend directory:
-    python scripts/upload_images.py
+    python scripts/upload_images.py [--concurrency 8] [--retries 3] [--force]
 
 Expects images in ../scraper/images/, ../scraper/images_bw/, etc.
+
+Uploads run concurrently over one pool of keep-alive connections to the
+Storage API. Transient failures (network errors, 408/429/5xx) are retried
+with jittered exponential backoff.
+
+Each uploaded file is recorded in the asset manifest
+(../scraper/asset_manifest.sqlite, or ASSET_MANIFEST_PATH) with its content
+hash and storage ETag, so later runs only upload new or changed files and an
+interrupted run resumes where it stopped. Files the manifest doesn't know
+yet are also skipped when the object in storage already has the same MD5
+ETag. --force uploads everything.
 """
 
+import argparse
+import asyncio
+import hashlib
 import os
 import sys
+import time
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import httpx
 from dotenv import load_dotenv
-from supabase import create_client
+
+from app.services.asset_manifest import AssetManifest
+from app.services.circuit_breaker import backoff_delay
 
 load_dotenv()
 
@@ -24,85 +42,234 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 BUCKET_NAME = os.getenv("BUCKET_NAME", "angels")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    print("Error: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in .env")
-    sys.exit(1)
-
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 # Paths relative to backend directory
 SCRAPER_DIR = Path(__file__).parent.parent.parent / "scraper"
-IMAGE_FOLDERS = ["images", "images_bw", "images_opacity", "images_profile_pic"]
+VARIANT_FOLDERS = ["images", "images_bw", "images_opacity", "images_profile_pic"]
+# Size renditions written by process_images.py, e.g. images_bw_thumbnail/
+RENDITIONS = ["thumbnail", "card"]
+IMAGE_FOLDERS = VARIANT_FOLDERS + [f"{folder}_{rendition}" for folder in VARIANT_FOLDERS for rendition in RENDITIONS]
+CONTENT_TYPES = {".png": "image/png", ".webp": "image/webp"}
+MANIFEST_PATH = Path(os.getenv("ASSET_MANIFEST_PATH") or SCRAPER_DIR / "asset_manifest.sqlite")
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+LIST_PAGE_SIZE = 1000
 
 
-def upload_file(local_path: Path, storage_path: str) -> bool:
-    """Upload a single file to Supabase Storage."""
+def file_hashes(path: Path) -> tuple[str, str]:
+    """SHA-256 (manifest) and MD5 (storage ETag) of a file's contents."""
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def collect_files(scraper_dir: Path, folders: list[str]) -> list[tuple[Path, str]]:
+    """(local path, storage path) for every image under the given folders."""
+    files = []
+    for folder in folders:
+        folder_path = scraper_dir / folder
+        if not folder_path.exists():
+            print(f"Skipping {folder}/ (not found)")
+            continue
+        for path in sorted(folder_path.rglob("*")):
+            if path.is_file() and path.suffix.lower() in CONTENT_TYPES:
+                files.append((path, path.relative_to(scraper_dir).as_posix()))
+    return files
+
+
+def manifest_unchanged(local_path: Path, storage_path: str, manifest: AssetManifest, uploaded: dict) -> bool:
+    """Whether the manifest says storage already has this file's contents."""
+    row = uploaded.get(storage_path)
+    if row is None:
+        return False
     try:
-        with open(local_path, "rb") as f:
-            file_data = f.read()
-        
-        # Normalize path separators for storage
-        storage_path = storage_path.replace("\\", "/")
-        
-        result = supabase.storage.from_(BUCKET_NAME).upload(
-            storage_path,
-            file_data,
-            file_options={"content-type": "image/png", "upsert": "true"}
+        stat = local_path.stat()
+        if row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if file_hashes(local_path)[0] != row["content_hash"]:
+            return False
+    except OSError:
+        # Unreadable: let the upload attempt report it as a failed file
+        return False
+    # Touched but not changed: remember the new mtime so it isn't hashed again
+    manifest.record_upload(storage_path, stat.st_size, stat.st_mtime_ns, row["content_hash"], row["etag"])
+    return True
+
+
+async def request_with_retries(client: httpx.AsyncClient, retries: int, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request, retrying network errors and transient statuses with backoff."""
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response
+            error = httpx.HTTPStatusError(f"{response.status_code} from storage", request=response.request, response=response)
+        except httpx.TransportError as e:
+            error = e
+        if attempt >= retries:
+            raise error
+        await asyncio.sleep(backoff_delay(attempt, 0.5, 8.0))
+        attempt += 1
+
+
+async def list_remote_etags(client: httpx.AsyncClient, bucket: str, prefix: str, retries: int) -> dict[str, str]:
+    """{storage path: ETag} for the objects directly under a folder."""
+    etags = {}
+    offset = 0
+    while True:
+        response = await request_with_retries(
+            client,
+            retries,
+            "POST",
+            f"/object/list/{bucket}",
+            json={"prefix": prefix, "limit": LIST_PAGE_SIZE, "offset": offset},
         )
-        
+        objects = response.json()
+        for obj in objects:
+            etag = (obj.get("metadata") or {}).get("eTag")
+            if etag:
+                etags[f"{prefix}/{obj['name']}"] = etag.strip('"')
+        if len(objects) < LIST_PAGE_SIZE:
+            return etags
+        offset += LIST_PAGE_SIZE
+
+
+async def upload_all(
+    client: httpx.AsyncClient,
+    files: list[tuple[Path, str]],
+    manifest: AssetManifest,
+    bucket: str = BUCKET_NAME,
+    concurrency: int = 8,
+    retries: int = 3,
+    force: bool = False,
+) -> dict:
+    """
+    Upload every file whose contents aren't in storage yet.
+
+    Returns counts of uploaded, unchanged and failed files and the bytes
+    uploaded.
+    """
+    stats = {"uploaded": 0, "unchanged": 0, "failed": 0, "bytes": 0}
+    uploaded = manifest.uploads()
+
+    pending = []
+    for local_path, storage_path in files:
+        if not force and manifest_unchanged(local_path, storage_path, manifest, uploaded):
+            stats["unchanged"] += 1
+        else:
+            pending.append((local_path, storage_path))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Files the manifest doesn't vouch for are compared against storage's
+    # ETags (the MD5 of objects uploaded in one request), one list call per folder
+    remote_etags = {}
+    if not force:
+        async def list_folder(prefix: str):
+            async with semaphore:
+                try:
+                    remote_etags.update(await list_remote_etags(client, bucket, prefix, retries))
+                except Exception as e:
+                    # Network errors and unexpected responses alike: the
+                    # folder's files are just uploaded without the ETag check
+                    print(f"  Could not list {prefix}/: {e}")
+
+        prefixes = sorted({storage_path.rpartition("/")[0] for _, storage_path in pending})
+        await asyncio.gather(*(list_folder(prefix) for prefix in prefixes))
+
+    async def upload_one(local_path: Path, storage_path: str):
+        stat = local_path.stat()
+        content_hash, md5 = await asyncio.to_thread(file_hashes, local_path)
+        if not force and remote_etags.get(storage_path) == md5:
+            manifest.record_upload(storage_path, stat.st_size, stat.st_mtime_ns, content_hash, md5)
+            stats["unchanged"] += 1
+            return
+
+        data = await asyncio.to_thread(local_path.read_bytes)
+        response = await request_with_retries(
+            client,
+            retries,
+            "POST",
+            f"/object/{bucket}/{storage_path}",
+            content=data,
+            headers={"content-type": CONTENT_TYPES[local_path.suffix.lower()], "x-upsert": "true"},
+        )
+
+        # Storage sets the ETag of a single-request upload to the body's MD5
+        etag = response.headers.get("etag", md5).strip('"')
+        manifest.record_upload(storage_path, stat.st_size, stat.st_mtime_ns, content_hash, etag)
+        stats["uploaded"] += 1
+        stats["bytes"] += len(data)
         print(f"✓ Uploaded: {storage_path}")
-        return True
-    except Exception as e:
-        print(f"✗ Error uploading {storage_path}: {e}")
-        return False
+
+    async def upload(local_path: Path, storage_path: str):
+        async with semaphore:
+            try:
+                await upload_one(local_path, storage_path)
+            except Exception as e:
+                # One bad file (unreadable, rejected, odd response) must not
+                # abort the others and lose the run's summary
+                print(f"✗ Error uploading {storage_path}: {e}")
+                stats["failed"] += 1
+
+    await asyncio.gather(*(upload(local_path, storage_path) for local_path, storage_path in pending))
+    return stats
 
 
-def upload_directory(local_dir: Path, storage_prefix: str = "") -> tuple[int, int]:
-    """Recursively upload a directory to storage. Returns (success, failed) counts."""
-    success = 0
-    failed = 0
-    
-    if not local_dir.exists():
-        print(f"Directory not found: {local_dir}")
-        return 0, 0
-    
-    for item in local_dir.iterdir():
-        if item.is_dir():
-            s, f = upload_directory(item, f"{storage_prefix}/{item.name}" if storage_prefix else item.name)
-            success += s
-            failed += f
-        elif item.is_file() and item.suffix.lower() == ".png":
-            storage_path = f"{storage_prefix}/{item.name}" if storage_prefix else item.name
-            if upload_file(item, storage_path):
-                success += 1
-            else:
-                failed += 1
-    
-    return success, failed
+def storage_client(concurrency: int) -> httpx.AsyncClient:
+    """Client for the Storage API with one keep-alive connection per upload slot."""
+    return httpx.AsyncClient(
+        base_url=f"{SUPABASE_URL.rstrip('/')}/storage/v1",
+        headers={
+            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+            "apikey": SUPABASE_SERVICE_KEY,
+        },
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+
+async def run(concurrency: int, retries: int, force: bool) -> dict:
+    files = collect_files(SCRAPER_DIR, IMAGE_FOLDERS)
+    print(f"Found {len(files)} files")
+
+    manifest = AssetManifest(str(MANIFEST_PATH))
+    try:
+        async with storage_client(concurrency) as client:
+            return await upload_all(client, files, manifest, BUCKET_NAME, concurrency, retries, force)
+    finally:
+        manifest.close()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Upload images to Supabase Storage")
+    parser.add_argument("--concurrency", type=int, default=8, help="uploads in flight at once")
+    parser.add_argument("--retries", type=int, default=3, help="retries per request for transient errors")
+    parser.add_argument("--force", action="store_true", help="upload files even if storage already has them")
+    args = parser.parse_args()
+
+    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        print("Error: SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in .env")
+        sys.exit(1)
+
     print(f"Uploading images to Supabase Storage bucket: {BUCKET_NAME}")
     print(f"Scraper directory: {SCRAPER_DIR}")
+    print(f"Manifest: {MANIFEST_PATH}")
     print("-" * 50)
-    
-    total_success = 0
-    total_failed = 0
-    
-    for folder in IMAGE_FOLDERS:
-        folder_path = SCRAPER_DIR / folder
-        if folder_path.exists():
-            print(f"\nProcessing {folder}/...")
-            success, failed = upload_directory(folder_path, folder)
-            total_success += success
-            total_failed += failed
-        else:
-            print(f"\nSkipping {folder}/ (not found)")
-    
+
+    start = time.perf_counter()
+    stats = asyncio.run(run(args.concurrency, args.retries, args.force))
+    elapsed = time.perf_counter() - start
+
     print("-" * 50)
-    print(f"Done! Uploaded: {total_success}, Failed: {total_failed}")
+    print(f"Done! Uploaded: {stats['uploaded']}, Unchanged: {stats['unchanged']}, Failed: {stats['failed']}")
+    print(f"{stats['bytes'] / 2**20:.1f} MB in {elapsed:.1f}s ({stats['bytes'] / 2**20 / elapsed:.2f} MB/s)")
 
 
 if __name__ == "__main__":
     main()
-
@@ -83,3 +83,32 @@ class TestAngelsEndpoints:
         data = response.json()
         assert len(data) == 1
         assert "image_url" in data[0]
+
+    @patch("app.routers.angels.get_supabase")
+    def test_srcset_disabled_by_default(self, mock_get_supabase, client, sample_angel):
+        """No srcset values unless renditions are configured"""
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.execute.return_value.data = [sample_angel]
+        mock_get_supabase.return_value = mock_supabase
+
+        with patch("app.routers.angels.settings.image_renditions", ""):
+            data = client.get("/angels").json()
+
+        assert data[0]["image_srcset"] is None
+
+    @patch("app.routers.angels.get_supabase")
+    def test_srcset_lists_configured_renditions(self, mock_get_supabase, client, sample_angel):
+        """srcset points at the rendition folders with their widths"""
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.execute.return_value.data = [
+            {**sample_angel, "image_bw": "images_bw/Animal_Series/Cockerel.png"}
+        ]
+        mock_get_supabase.return_value = mock_supabase
+
+        with patch("app.routers.angels.settings.image_renditions", "thumbnail:240,card:480"):
+            data = client.get("/angels").json()
+
+        srcset = data[0]["image_bw_srcset"]
+        thumbnail, card = srcset.split(", ")
+        assert thumbnail.endswith("/images_bw_thumbnail/Animal_Series/Cockerel.webp 240w")
+        assert card.endswith("/images_bw_card/Animal_Series/Cockerel.webp 480w")
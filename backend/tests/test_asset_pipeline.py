@@ -0,0 +1,189 @@
+"""Tests for the asset pipeline and its manifest."""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import asset_pipeline
+from app.services.asset_manifest import AssetManifest
+
+VARIANTS = {"opacity": b"o", "grayscale": b"g", "circular": b"c"}
+
+
+@pytest.fixture
+def images_tree(tmp_path):
+    """scraper/images with two series"""
+    root = tmp_path / "images"
+    (root / "Fruit_Series").mkdir(parents=True)
+    (root / "Animal_Series").mkdir()
+    (root / "Fruit_Series" / "01_Apple.png").write_bytes(b"apple")
+    (root / "Fruit_Series" / "Peach.png").write_bytes(b"peach")
+    (root / "Animal_Series" / "Rabbit.png").write_bytes(b"rabbit")
+    with patch.object(asset_pipeline.settings, "asset_images_dir", str(root)), \
+         patch.object(asset_pipeline.settings, "asset_manifest_path", str(tmp_path / "manifest.sqlite")), \
+         patch.object(asset_pipeline.settings, "image_service_url", "http://image-service"):
+        yield root
+
+
+def make_supabase(series=None, angels=None):
+    """Admin client whose paged reads return the given rows and inserts echo ids"""
+    mock_sb = MagicMock()
+    tables = {"series": list(series or []), "angels": list(angels or [])}
+    inserts = {"series": [], "angels": []}
+
+    def table(name):
+        query = MagicMock()
+        query.select.return_value.order.return_value.range.return_value.execute.return_value = MagicMock(
+            data=tables[name]
+        )
+
+        def insert(rows):
+            inserts[name].append(rows)
+            start = 100 * (len(inserts[name]))
+            created = [{**row, "id": start + i} for i, row in enumerate(rows)]
+            tables[name].extend(created)
+            result = MagicMock()
+            result.execute.return_value = MagicMock(data=created)
+            return result
+
+        query.insert.side_effect = insert
+        return query
+
+    mock_sb.table.side_effect = table
+    return mock_sb, inserts
+
+
+class TestAssetPipeline:
+    """Test change detection and counters of sync_assets."""
+
+    @patch("app.services.asset_pipeline.process_variants", new_callable=AsyncMock)
+    @patch("app.services.asset_pipeline.get_supabase_admin")
+    async def test_first_run_processes_uploads_and_records_everything(self, mock_admin, mock_process, images_tree):
+        mock_sb, inserts = make_supabase(series=[{"id": 1, "name": "Fruit Series"}])
+        mock_admin.return_value = mock_sb
+        mock_process.return_value = VARIANTS
+
+        result = await asset_pipeline.sync_assets()
+
+        assert result == {
+            "images_found": 3,
+            "images_processed": 3,
+            "images_uploaded": 3,
+            "angels_created": 3,
+            "failures": [],
+        }
+        # Original plus three variants per image
+        bucket = mock_sb.storage.from_.return_value
+        assert bucket.upload.call_count == 12
+        assert "images_bw/Fruit_Series/01_Apple.png" in [c.args[0] for c in bucket.upload.call_args_list]
+        assert inserts["series"] == [[{"name": "Animal Series"}]]
+        assert len(inserts["angels"]) == 1
+        assert {row["name"] for row in inserts["angels"][0]} == {"Apple", "Peach", "Rabbit"}
+
+    @patch("app.services.asset_pipeline.process_variants", new_callable=AsyncMock)
+    @patch("app.services.asset_pipeline.get_supabase_admin")
+    async def test_rerun_on_unchanged_tree_does_no_work(self, mock_admin, mock_process, images_tree):
+        mock_sb, inserts = make_supabase()
+        mock_admin.return_value = mock_sb
+        mock_process.return_value = VARIANTS
+        await asset_pipeline.sync_assets()
+        mock_process.reset_mock()
+        mock_sb.storage.from_.return_value.upload.reset_mock()
+        inserts["series"].clear()
+        inserts["angels"].clear()
+
+        result = await asset_pipeline.sync_assets()
+
+        assert result["images_found"] == 3
+        assert result["images_processed"] == result["images_uploaded"] == result["angels_created"] == 0
+        mock_process.assert_not_called()
+        mock_sb.storage.from_.return_value.upload.assert_not_called()
+        assert inserts == {"series": [], "angels": []}
+
+    @patch("app.services.asset_pipeline.process_variants", new_callable=AsyncMock)
+    @patch("app.services.asset_pipeline.get_supabase_admin")
+    async def test_changed_image_is_reuploaded_without_new_angel(self, mock_admin, mock_process, images_tree):
+        mock_sb, inserts = make_supabase()
+        mock_admin.return_value = mock_sb
+        mock_process.return_value = VARIANTS
+        await asset_pipeline.sync_assets()
+        inserts["angels"].clear()
+
+        (images_tree / "Fruit_Series" / "Peach.png").write_bytes(b"a better peach")
+        result = await asset_pipeline.sync_assets()
+
+        assert result["images_processed"] == 1
+        assert result["images_uploaded"] == 1
+        assert result["angels_created"] == 0
+        assert inserts["angels"] == []
+
+    @patch("app.services.asset_pipeline.process_variants", new_callable=AsyncMock)
+    @patch("app.services.asset_pipeline.get_supabase_admin")
+    async def test_failed_image_is_retried_next_run(self, mock_admin, mock_process, images_tree):
+        mock_sb, inserts = make_supabase()
+        mock_admin.return_value = mock_sb
+
+        async def flaky(client, image, data):
+            if image["filename"] == "Rabbit.png":
+                raise ValueError("image service returned 500")
+            return VARIANTS
+
+        mock_process.side_effect = flaky
+        result = await asset_pipeline.sync_assets()
+        assert result["images_uploaded"] == 2
+        assert result["angels_created"] == 2
+        assert len(result["failures"]) == 1
+
+        mock_process.side_effect = None
+        mock_process.return_value = VARIANTS
+        result = await asset_pipeline.sync_assets()
+        assert result["images_processed"] == 1
+        assert result["angels_created"] == 1
+        assert result["failures"] == []
+
+    async def test_pending_images_require_image_service(self, images_tree):
+        with patch.object(asset_pipeline.settings, "image_service_url", ""):
+            with pytest.raises(RuntimeError, match="IMAGE_SERVICE_URL"):
+                await asset_pipeline.sync_assets()
+
+    def test_parse_multipart(self):
+        body = (
+            b"--abc\r\nContent-Type: image/png\r\n"
+            b'Content-Disposition: attachment; name="opacity"; filename="opacity_a.png"\r\n'
+            b"Content-Length: 5\r\n\r\n\r\n\r\nx\r\n"
+            b"--abc\r\nContent-Type: image/png\r\n"
+            b'Content-Disposition: attachment; name="grayscale"; filename="bw_a.png"\r\n\r\n'
+            b"gray\r\n--abc--\r\n"
+        )
+        parts = asset_pipeline.parse_multipart(body, "multipart/mixed; boundary=abc")
+        assert parts == {"opacity": b"\r\n\r\nx", "grayscale": b"gray"}
+
+
+class TestAssetManifest:
+    """Test the SQLite manifest."""
+
+    def test_rows_survive_reopen(self, tmp_path):
+        path = str(tmp_path / "manifest.sqlite")
+        manifest = AssetManifest(path)
+        manifest.record_hash("S/a.png", 10, 123, "h1")
+        manifest.mark_uploaded("S/a.png", "h1")
+        manifest.close()
+
+        manifest = AssetManifest(path)
+        row = manifest.get("S/a.png")
+        assert (row["content_hash"], row["uploaded_hash"], row["angel_id"]) == ("h1", "h1", None)
+
+        # A new hash keeps the uploaded hash, so the image shows as changed
+        manifest.record_hash("S/a.png", 11, 456, "h2")
+        row = manifest.get("S/a.png")
+        assert (row["content_hash"], row["uploaded_hash"]) == ("h2", "h1")
+        manifest.close()
+
+    def test_new_upload_clears_stale_etag(self, tmp_path):
+        manifest = AssetManifest(str(tmp_path / "manifest.sqlite"))
+        manifest.record_upload("images/S/a.png", 10, 1, "h1")
+        manifest.record_etag("images/S/a.png", "etag1")
+        assert manifest.uploads()["images/S/a.png"]["etag"] == "etag1"
+
+        manifest.record_upload("images/S/a.png", 12, 2, "h2")
+        row = manifest.uploads()["images/S/a.png"]
+        assert (row["content_hash"], row["etag"]) == ("h2", None)
+        manifest.close()
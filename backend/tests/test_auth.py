@@ -55,6 +55,19 @@ class TestAuthEndpoints:
         assert response.status_code == 200
         assert response.json()["exists"] == False
 
+    @patch("app.routers.auth.get_supabase_admin")
+    def test_signup_open_circuit_returns_503(self, mock_get_supabase_admin, client):
+        """Test that an open Supabase circuit during signup is a 503, not a swallowed error"""
+        from app.services.circuit_breaker import CircuitOpenError
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.insert.return_value.execute.side_effect = CircuitOpenError("supabase", 5)
+        mock_get_supabase_admin.return_value = mock_supabase
+
+        response = client.post("/auth/signup", json={"email": "new@example.com", "password": "password123"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+
     @patch("app.routers.auth.get_supabase_admin")
     def test_create_user_success(self, mock_get_supabase_admin, client, sample_user):
         """Test user creation"""
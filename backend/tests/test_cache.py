@@ -0,0 +1,126 @@
+"""Tests for the Redis cache helpers."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.middleware import cache
+
+
+def make_redis():
+    """Async Redis stand-in whose pipeline records queued commands"""
+    redis_client = MagicMock()
+    redis_client.mget = AsyncMock(return_value=["catalog", None])
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[True, True])
+    redis_client.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    redis_client.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    return redis_client, pipe
+
+
+class TestCacheBatching:
+    """Test multi-key cache operations."""
+
+    async def test_get_cached_many_uses_one_mget(self):
+        """All keys are fetched in a single MGET round-trip."""
+        redis_client, _ = make_redis()
+        with patch("app.middleware.cache.get_redis", AsyncMock(return_value=redis_client)):
+            result = await cache.get_cached_many(["angels:all", "user:1:collections"])
+
+        redis_client.mget.assert_awaited_once_with(["angels:all", "user:1:collections"])
+        assert result == {"angels:all": "catalog", "user:1:collections": None}
+
+    async def test_set_cached_many_pipelines_writes(self):
+        """Writes are queued on one non-transactional pipeline."""
+        redis_client, pipe = make_redis()
+        with patch("app.middleware.cache.get_redis", AsyncMock(return_value=redis_client)):
+            await cache.set_cached_many({"a": "1", "b": "2"}, expiration=60)
+
+        redis_client.pipeline.assert_called_once_with(transaction=False)
+        assert pipe.setex.call_count == 2
+        pipe.execute.assert_awaited_once()
+
+    async def test_get_cached_many_without_redis(self):
+        """An unavailable cache yields misses instead of errors."""
+        with patch("app.middleware.cache.get_redis", AsyncMock(return_value=None)):
+            result = await cache.get_cached_many(["a", "b"])
+
+        assert result == {"a": None, "b": None}
+
+
+@pytest.fixture
+def fresh_redis(monkeypatch):
+    """No connection yet, a closed redis breaker, and a pool factory that records what it builds"""
+    from app.config import redis as redis_config
+    from app.services import circuit_breaker
+
+    monkeypatch.setattr(redis_config, "redis_pool", None)
+    monkeypatch.setattr(redis_config, "redis_client", None)
+    monkeypatch.setattr(redis_config, "last_connect_attempt", None)
+    monkeypatch.setitem(circuit_breaker.breakers, "redis", circuit_breaker.CircuitBreaker("redis"))
+
+    pools = []
+
+    def make_pool(url, **kwargs):
+        pool = MagicMock()
+        pool.disconnect = AsyncMock()
+        pools.append(pool)
+        return pool
+
+    async def slow_ping():
+        await asyncio.sleep(0.01)
+
+    def make_client(connection_pool):
+        client = MagicMock()
+        client.connection_pool = connection_pool
+        client.ping = AsyncMock(side_effect=slow_ping)
+        client.aclose = AsyncMock()
+        return client
+
+    monkeypatch.setattr(redis_config.redis.BlockingConnectionPool, "from_url", make_pool)
+    monkeypatch.setattr(redis_config.redis, "Redis", make_client)
+    return redis_config, pools
+
+
+class TestRedisLifecycle:
+    """Test the pooled client's startup, sharing and shutdown."""
+
+    async def test_init_and_close(self, fresh_redis):
+        """init_redis opens one pool that get_redis shares; close_redis releases it."""
+        redis_config, pools = fresh_redis
+
+        await redis_config.init_redis()
+        client = await redis_config.get_redis()
+        assert await redis_config.get_redis() is client
+        assert len(pools) == 1
+
+        await redis_config.close_redis()
+        client.aclose.assert_awaited_once()
+        pools[0].disconnect.assert_awaited_once()
+        assert redis_config.redis_client is None
+        assert redis_config.redis_pool is None
+
+    async def test_concurrent_first_callers_share_one_pool(self, fresh_redis):
+        """Callers racing to connect wait for one pool instead of each building one."""
+        redis_config, pools = fresh_redis
+
+        clients = await asyncio.gather(*(redis_config.get_redis() for _ in range(5)))
+
+        assert len(pools) == 1
+        assert all(client is clients[0] for client in clients)
+
+    def test_app_lifespan_opens_and_closes_the_pool(self):
+        """The pool is opened at startup and closed at shutdown."""
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with patch("app.main.init_redis", new_callable=AsyncMock) as mock_init, \
+             patch("app.main.close_redis", new_callable=AsyncMock) as mock_close, \
+             patch("app.main.initialize_cron"), patch("app.main.shutdown_cron"), \
+             patch("app.main.run_dependency_monitor", new_callable=AsyncMock), \
+             patch("app.main.run_job_worker", new_callable=AsyncMock), \
+             patch("app.main.run_event_relay", new_callable=AsyncMock), \
+             patch("app.main.tracing.run_trace_exporter", new_callable=AsyncMock):
+            with TestClient(app):
+                mock_init.assert_awaited_once()
+                mock_close.assert_not_awaited()
+            mock_close.assert_awaited_once()
@@ -0,0 +1,152 @@
+"""Tests for dependency circuit breakers and retry budgets."""
+import pytest
+from unittest.mock import MagicMock, patch
+
+import httpx
+from postgrest.exceptions import APIError
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+
+
+@pytest.fixture
+def supabase_breaker(monkeypatch):
+    """Fresh supabase breaker and retry budget with no backoff sleeps"""
+    breaker = CircuitBreaker("supabase", failure_threshold=2, reset_timeout=30)
+    monkeypatch.setitem(circuit_breaker.breakers, "supabase", breaker)
+    monkeypatch.setattr(circuit_breaker, "supabase_retry_budget", RetryBudget(0.1))
+    monkeypatch.setattr(circuit_breaker.time, "sleep", lambda seconds: None)
+    return breaker
+
+
+def make_builder(method: str):
+    builder = MagicMock()
+    builder.request.http_method = method
+    return builder
+
+
+class TestCircuitBreaker:
+    """Test breaker state transitions."""
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        """Consecutive failures open the circuit and calls are rejected."""
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError) as exc_info:
+            breaker.before_call()
+        assert exc_info.value.retry_after > 0
+
+    def test_half_open_allows_single_trial(self):
+        """After the reset timeout exactly one trial call is let through."""
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        breaker.opened_at -= 31
+
+        assert breaker.state == "half_open"
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_failed_trial_reopens(self):
+        """A failed half-open trial re-opens the circuit immediately."""
+        breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+        breaker.opened_at = 0.0
+        assert breaker.allow() is True
+
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+    def test_retry_budget_caps_retries(self):
+        """Retries are limited by the tokens deposited by calls."""
+        budget = RetryBudget(ratio=0.5, max_tokens=1)
+        assert budget.try_spend() is True
+        assert budget.try_spend() is False
+
+        budget.record_call()
+        budget.record_call()
+        assert budget.try_spend() is True
+
+
+class TestProtectedExecute:
+    """Test the breaker wrapper around PostgREST execute()."""
+
+    def test_idempotent_read_is_retried(self, supabase_breaker):
+        """A GET that hits a transient error is retried and succeeds."""
+        execute = MagicMock(side_effect=[httpx.ConnectError("refused"), "rows"])
+        wrapped = circuit_breaker._protected_execute(execute)
+
+        assert wrapped(make_builder("GET")) == "rows"
+        assert execute.call_count == 2
+        assert supabase_breaker.state == "closed"
+
+    async def test_reads_on_the_event_loop_are_not_retried(self, supabase_breaker):
+        """The backoff sleep would block the loop, so reads there fail at once."""
+        import asyncio
+
+        execute = MagicMock(side_effect=[httpx.ConnectError("refused"), "rows"])
+        wrapped = circuit_breaker._protected_execute(execute)
+
+        with pytest.raises(httpx.ConnectError):
+            wrapped(make_builder("GET"))
+        assert execute.call_count == 1
+
+        # From a worker thread the same read is retried
+        assert await asyncio.to_thread(wrapped, make_builder("GET")) == "rows"
+
+    def test_writes_are_not_retried(self, supabase_breaker):
+        """Non-idempotent requests fail on the first transient error."""
+        execute = MagicMock(side_effect=httpx.ConnectError("refused"))
+        wrapped = circuit_breaker._protected_execute(execute)
+
+        with pytest.raises(httpx.ConnectError):
+            wrapped(make_builder("POST"))
+        assert execute.call_count == 1
+
+    def test_open_circuit_skips_the_call(self, supabase_breaker):
+        """Once open, queries fail fast without touching the network."""
+        execute = MagicMock(side_effect=httpx.ConnectTimeout("timeout"))
+        wrapped = circuit_breaker._protected_execute(execute)
+
+        with pytest.raises(httpx.ConnectTimeout):
+            wrapped(make_builder("GET"))
+        assert supabase_breaker.state == "open"
+
+        execute.reset_mock()
+        with pytest.raises(CircuitOpenError):
+            wrapped(make_builder("GET"))
+        execute.assert_not_called()
+
+    def test_client_errors_do_not_trip_the_circuit(self, supabase_breaker):
+        """PostgREST 4xx-style errors mean the dependency is healthy."""
+        execute = MagicMock(side_effect=APIError({"message": "not found", "code": "PGRST116"}))
+        wrapped = circuit_breaker._protected_execute(execute)
+
+        for _ in range(3):
+            with pytest.raises(APIError):
+                wrapped(make_builder("GET"))
+        assert supabase_breaker.state == "closed"
+
+    def test_database_errors_do_not_trip_the_circuit(self, supabase_breaker):
+        """Postgres SQLSTATEs like a unique violation are not 5xx responses."""
+        execute = MagicMock(side_effect=APIError({"message": "duplicate key value", "code": "23505"}))
+        wrapped = circuit_breaker._protected_execute(execute)
+
+        for _ in range(3):
+            with pytest.raises(APIError):
+                wrapped(make_builder("POST"))
+        assert supabase_breaker.state == "closed"
+
+    def test_open_circuit_returns_503(self, client):
+        """Routers surface an open circuit as 503 with Retry-After."""
+        with patch("app.routers.series.get_supabase") as mock_get_supabase:
+            mock_get_supabase.return_value.table.side_effect = CircuitOpenError("supabase", 12.3)
+            response = client.get("/series")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "12"
@@ -0,0 +1,73 @@
+"""Tests for the on-demand profiling endpoint."""
+import pytest
+from unittest.mock import patch
+
+from app.routers import debug
+
+
+ADMIN = {"X-Debug-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def debug_token():
+    with patch.object(debug.settings, "debug_token", "secret"):
+        yield
+
+
+class TestProfileEndpoint:
+    """Test /debug/profile."""
+
+    def test_cpu_profile_returns_collapsed_stacks(self, client):
+        """CPU mode returns `stack count` lines rooted at thread names."""
+        response = client.get("/debug/profile?seconds=0.2&mode=cpu", headers=ADMIN)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+        lines = response.text.strip().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0
+        assert ";" in stack
+
+    def test_memory_profile(self, client):
+        """Memory mode diffs tracemalloc snapshots."""
+        response = client.get("/debug/profile?seconds=0.1&mode=memory", headers=ADMIN)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+    def test_invalid_mode(self, client):
+        """Unknown modes are rejected by validation."""
+        response = client.get("/debug/profile?mode=gpu", headers=ADMIN)
+        assert response.status_code == 422
+
+    @patch.object(debug.settings, "debug_endpoints", False)
+    def test_disabled_returns_404(self, client):
+        """Disabled debug endpoints look like they don't exist."""
+        response = client.get("/debug/profile?seconds=0.1", headers=ADMIN)
+        assert response.status_code == 404
+
+    def test_requires_admin_token(self, client):
+        """A configured token must be presented in X-Debug-Token."""
+        response = client.get("/debug/profile?seconds=0.1")
+        assert response.status_code == 403
+
+        response = client.get(
+            "/debug/profile?seconds=0.1", headers={"X-Debug-Token": "wrong"}
+        )
+        assert response.status_code == 403
+
+        response = client.get("/debug/profile?seconds=0.1", headers=ADMIN)
+        assert response.status_code == 200
+
+    @patch.object(debug.settings, "debug_token", "")
+    def test_hidden_without_configured_token(self, client):
+        """Without DEBUG_TOKEN the endpoints don't exist, even in development."""
+        assert debug.settings.is_development
+        response = client.get("/debug/profile?seconds=0.1", headers=ADMIN)
+        assert response.status_code == 404
+
+    @patch.object(debug.settings, "node_env", "production")
+    def test_disabled_by_default_in_production(self, client):
+        """Production hides the endpoints unless explicitly enabled."""
+        response = client.get("/debug/profile?seconds=0.1", headers=ADMIN)
+        assert response.status_code == 404
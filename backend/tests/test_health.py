@@ -47,3 +47,78 @@ class TestHealthEndpoints:
         
         data = response.json()
         assert data["message"] == "Welcome to the API"
+
+
+class TestDependencyMonitor:
+    """Tests for the cached dependency probes behind /health/ready"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_dependencies(self, monkeypatch):
+        from app.services import dependency_monitor
+        from app.services.circuit_breaker import CircuitBreaker
+
+        monkeypatch.setattr(dependency_monitor, "breakers", {
+            "supabase": CircuitBreaker("supabase", failure_threshold=3),
+            "redis": CircuitBreaker("redis", failure_threshold=3),
+        })
+        monkeypatch.setattr(dependency_monitor, "dependencies", {
+            "supabase": dependency_monitor.DependencyStatus("supabase", critical=True),
+            "redis": dependency_monitor.DependencyStatus("redis", critical=False),
+        })
+        return dependency_monitor
+
+    def test_readiness_reports_cached_dependencies(self, client, fresh_dependencies):
+        """Readiness answers from probe results without probing itself"""
+        fresh_dependencies.dependencies["supabase"].record(True, 12.0)
+        fresh_dependencies.dependencies["redis"].record(False, 3.0, "Connection refused")
+
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["status"] == "degraded"
+        assert data["services"]["supabase"]["status"] == "ok"
+        assert data["services"]["redis"]["error"] == "Connection refused"
+
+    def test_readiness_unavailable_when_critical_down(self, client, fresh_dependencies):
+        """A down critical dependency fails readiness with 503"""
+        fresh_dependencies.dependencies["supabase"].record(False, 2000.0, "timeout")
+
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "unavailable"
+
+    def test_circuit_opens_after_repeated_failures(self, fresh_dependencies):
+        """Consecutive probe failures open the circuit; a success closes it"""
+        redis = fresh_dependencies.dependencies["redis"]
+        for _ in range(3):
+            redis.record(False, 1.0, "down")
+        assert redis.circuit == "open"
+
+        redis.record(True, 1.0)
+        assert redis.circuit == "closed"
+        assert redis.breaker.failures == 0
+
+    def test_latency_histogram_is_cumulative(self, fresh_dependencies):
+        """Histogram buckets are cumulative like Prometheus"""
+        supabase = fresh_dependencies.dependencies["supabase"]
+        supabase.record(True, 3.0)
+        supabase.record(True, 40.0)
+        supabase.record(True, 9000.0)
+
+        histogram = supabase.histogram()
+        assert histogram["buckets"]["5"] == 1
+        assert histogram["buckets"]["50"] == 2
+        assert histogram["buckets"]["+Inf"] == 3
+        assert histogram["count"] == 3
+
+    async def test_unconfigured_dependencies_are_skipped(self, fresh_dependencies, monkeypatch):
+        """Dependencies without a configured URL are reported as skipped"""
+        monkeypatch.setattr(fresh_dependencies.settings, "supabase_url", "")
+        monkeypatch.setattr(fresh_dependencies, "PROBES", {
+            "supabase": fresh_dependencies.probe_supabase,
+        })
+
+        await fresh_dependencies.probe_all()
+        assert fresh_dependencies.dependencies["supabase"].status == "skipped"
+        assert fresh_dependencies.memory_status["status"] in ("ok", "warning")
@@ -6,20 +6,69 @@ from unittest.mock import MagicMock, patch, AsyncMock
 class TestJobRoutes:
     """Test job management endpoints."""
 
-    @patch("app.services.job_service.get_supabase_admin")
-    def test_trigger_job_success(self, mock_get_supabase_admin, client):
-        """Test manually triggering a job."""
+    @patch("app.services.job_queue.get_supabase_admin")
+    def test_trigger_job_queues_run(self, mock_get_supabase_admin, client):
+        """Test that triggering returns 202 with the id of a new queued run."""
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+        mock_sb.table.return_value.insert.return_value.execute.return_value = MagicMock(data=[{"id": 7, "status": "queued"}])
+        mock_get_supabase_admin.return_value = mock_sb
+
+        response = client.post("/api/jobs/trigger")
+        assert response.status_code == 202
+        data = response.json()
+        assert data["job_id"] == 7
+        assert data["status"] == "queued"
+        assert mock_sb.table.return_value.insert.call_args.args[0]["status"] == "queued"
+
+    @patch("app.services.job_queue.get_supabase_admin")
+    def test_trigger_job_reuses_queued_run(self, mock_get_supabase_admin, client):
+        """Test that a run already waiting in the queue is returned instead of a new one."""
+        from postgrest.exceptions import APIError
+
         mock_sb = MagicMock()
-        mock_sb.table.return_value.insert.return_value.execute.return_value = MagicMock(data=[{"id": 1, "status": "running"}])
-        # update_job_run fetches started_at then updates
-        mock_sb.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
-            data={"started_at": "2024-01-01T00:00:00Z"}
+        # The unique index on queued rows rejects the insert
+        mock_sb.table.return_value.insert.return_value.execute.side_effect = APIError(
+            {"code": "23505", "message": "duplicate key value violates unique constraint \"idx_job_runs_one_queued\""}
+        )
+        mock_sb.table.return_value.select.return_value.eq.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(
+            data=[{"id": 3, "status": "queued"}]
         )
-        mock_sb.table.return_value.update.return_value.eq.return_value.execute.return_value = MagicMock(data=[{"id": 1}])
         mock_get_supabase_admin.return_value = mock_sb
 
         response = client.post("/api/jobs/trigger")
-        assert response.status_code in [200, 202, 503]  # May be disabled in test mode
+        assert response.status_code == 202
+        assert response.json()["job_id"] == 3
+        assert response.json()["message"] == "Asset pipeline is already queued"
+
+    @patch("app.services.job_service.get_supabase_admin")
+    @patch("app.services.job_queue.get_supabase_admin")
+    def test_open_circuit_returns_503(self, mock_queue_supabase, mock_service_supabase, client):
+        """Test that an open Supabase circuit is a 503 with Retry-After, not a 500."""
+        from app.services.circuit_breaker import CircuitOpenError
+
+        mock_queue_supabase.return_value.table.side_effect = CircuitOpenError("supabase", 12.3)
+        mock_service_supabase.return_value.table.side_effect = CircuitOpenError("supabase", 12.3)
+
+        for response in (client.post("/api/jobs/trigger"), client.get("/api/jobs/status"), client.get("/api/jobs/5")):
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "12"
+
+    @patch("app.services.job_service.get_supabase_admin")
+    def test_get_job_by_id(self, mock_get_supabase_admin, client):
+        """Test fetching one job run, and 404 for an unknown id."""
+        mock_sb = MagicMock()
+        mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(
+            data=[{"id": 5, "status": "running", "stage": "processing", "images_uploaded": 12}]
+        )
+        mock_get_supabase_admin.return_value = mock_sb
+
+        response = client.get("/api/jobs/5")
+        assert response.status_code == 200
+        assert response.json()["job"]["stage"] == "processing"
+
+        mock_sb.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = MagicMock(data=[])
+        assert client.get("/api/jobs/6").status_code == 404
 
     @patch("app.services.job_service.get_supabase_admin")
     def test_get_job_history(self, mock_get_supabase_admin, client):
@@ -132,9 +181,249 @@ class TestCronManager:
             assert field in status
 
 
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for the job lock."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.values.get(key) != token:
+            return 0
+        if "del" in script:
+            del self.values[key]
+        return 1
+
+
+class TestJobQueue:
+    """Test the background job queue."""
+
+    @patch("app.services.job_queue.run_asset_pipeline", new_callable=AsyncMock)
+    @patch("app.services.job_queue.fail_interrupted_jobs", new_callable=AsyncMock)
+    @patch("app.services.job_queue.claim_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_queued_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_redis", new_callable=AsyncMock)
+    async def test_runs_queued_jobs_under_the_lock(
+        self, mock_get_redis, mock_get_queued_job, mock_claim_job, mock_fail_interrupted, mock_run
+    ):
+        from app.services import job_queue
+
+        redis_client = FakeRedis()
+        mock_get_redis.return_value = redis_client
+        mock_get_queued_job.side_effect = [{"id": 1}, {"id": 1}, {"id": 2}, {"id": 2}, None]
+        mock_claim_job.return_value = True
+        # A failed job doesn't stop the ones behind it
+        mock_run.side_effect = [RuntimeError("image service down"), None]
+
+        await job_queue.process_queue()
+
+        assert [call.kwargs["job_id"] for call in mock_run.call_args_list] == [1, 2]
+        # Holding the Redis lock, runs left 'running' by a dead worker are failed
+        mock_fail_interrupted.assert_called_with("asset_pipeline")
+        assert redis_client.values == {}
+        assert job_queue.running_job_id() is None
+
+    @patch("app.services.job_queue.run_asset_pipeline", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_queued_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_redis", new_callable=AsyncMock)
+    async def test_leaves_job_queued_while_another_worker_holds_the_lock(
+        self, mock_get_redis, mock_get_queued_job, mock_run
+    ):
+        from app.services import job_queue
+
+        redis_client = FakeRedis()
+        redis_client.values["job-lock:asset_pipeline"] = "other-worker"
+        mock_get_redis.return_value = redis_client
+        mock_get_queued_job.return_value = {"id": 1}
+
+        await job_queue.process_queue()
+
+        mock_run.assert_not_called()
+        assert redis_client.values["job-lock:asset_pipeline"] == "other-worker"
+
+    @patch("app.services.job_queue.run_asset_pipeline", new_callable=AsyncMock)
+    @patch("app.services.job_queue.claim_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_queued_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_redis", new_callable=AsyncMock)
+    async def test_leaves_jobs_queued_without_redis(
+        self, mock_get_redis, mock_get_queued_job, mock_claim_job, mock_run
+    ):
+        from app.services import job_queue
+
+        # Another worker may be running the pipeline; a per-process lock can't tell
+        mock_get_redis.return_value = None
+        mock_get_queued_job.return_value = {"id": 4}
+
+        await job_queue.process_queue()
+
+        mock_claim_job.assert_not_called()
+        mock_run.assert_not_called()
+
+
+    @patch("app.services.job_queue.publish_job_result", new_callable=AsyncMock)
+    @patch("app.services.job_queue.update_job_run", new_callable=AsyncMock)
+    @patch("app.services.job_queue.run_asset_pipeline")
+    @patch("app.services.job_queue.fail_interrupted_jobs", new_callable=AsyncMock)
+    @patch("app.services.job_queue.claim_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_queued_job", new_callable=AsyncMock)
+    @patch("app.services.job_queue.get_redis", new_callable=AsyncMock)
+    @pytest.mark.parametrize("failure", ["taken", "redis_down"])
+    async def test_stops_the_pipeline_when_the_lock_is_lost(
+        self, mock_get_redis, mock_get_queued_job, mock_claim_job, mock_fail_interrupted,
+        mock_run, mock_update_job_run, mock_publish, failure
+    ):
+        import asyncio
+        from app.services import job_queue
+
+        redis_client = FakeRedis()
+        mock_get_redis.return_value = redis_client
+        mock_get_queued_job.return_value = {"id": 1}
+        mock_claim_job.return_value = True
+        cancelled = asyncio.Event()
+
+        async def pipeline(job_id):
+            if failure == "taken":
+                # The lock expired and another worker took it
+                redis_client.values["job-lock:asset_pipeline"] = "other-worker"
+            else:
+                redis_client.eval = AsyncMock(side_effect=ConnectionError("redis down"))
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        mock_run.side_effect = pipeline
+
+        with patch.object(job_queue.settings, "job_lock_ttl", 0.06):
+            await asyncio.wait_for(job_queue.process_queue(), 1)
+
+        assert cancelled.is_set()
+        # Stops instead of claiming the next queued run
+        mock_run.assert_called_once_with(job_id=1)
+        assert mock_update_job_run.call_args.kwargs["status"] == "failed"
+        assert mock_update_job_run.call_args.kwargs["error_message"].startswith("Stopped:")
+        mock_publish.assert_awaited_once()
+        assert job_queue.running_job_id() is None
+
+
+class TestJobEvents:
+    """Test live job progress events."""
+
+    async def test_broadcaster_fans_out_and_keeps_latest(self):
+        from app.services.job_events import Broadcaster, SUBSCRIBER_QUEUE_SIZE
+
+        broadcaster = Broadcaster()
+        first = broadcaster.subscribe(1)
+        second = broadcaster.subscribe(1)
+        other = broadcaster.subscribe(2)
+
+        for done in range(SUBSCRIBER_QUEUE_SIZE + 5):
+            broadcaster.publish(1, {"status": "running", "done": done})
+
+        assert other.empty()
+        # A full queue drops its oldest snapshots, never the newest
+        assert first.qsize() == second.qsize() == SUBSCRIBER_QUEUE_SIZE
+        assert first.get_nowait()["done"] == 5
+        assert broadcaster.latest[1]["done"] == SUBSCRIBER_QUEUE_SIZE + 4
+
+        broadcaster.unsubscribe(1, first)
+        broadcaster.unsubscribe(1, second)
+        assert 1 not in broadcaster.subscribers
+
+    @patch("app.services.job_events.get_redis", new_callable=AsyncMock)
+    async def test_stream_follows_job_until_it_finishes(self, mock_get_redis):
+        from app.services import job_events
+
+        mock_get_redis.return_value = None
+        queue = job_events.broadcaster.subscribe(11)
+        stream = job_events.event_stream(11, queue, {"job_id": 11, "status": "queued", "stage": "queued"}, AsyncMock())
+
+        assert (await anext(stream)).startswith("event: progress\n")
+        await job_events.publish(11, {"status": "running", "stage": "processing", "done": 3, "total": 10})
+        chunk = await anext(stream)
+        assert '"done": 3' in chunk
+        await job_events.publish(11, {"status": "success", "stage": "success"})
+        assert (await anext(stream)).startswith("event: done\n")
+
+        with pytest.raises(StopAsyncIteration):
+            await anext(stream)
+        assert 11 not in job_events.broadcaster.subscribers
+
+    async def test_stream_closes_when_the_final_event_is_missed(self):
+        from app.services import job_events
+
+        # The worker running the job published "success", but the relay was down
+        load_job = AsyncMock(side_effect=[
+            {"id": 15, "status": "running", "stage": "uploading"},
+            {"id": 15, "status": "success", "stage": "success", "images_uploaded": 9},
+        ])
+        queue = job_events.broadcaster.subscribe(15)
+        stream = job_events.event_stream(15, queue, {"job_id": 15, "status": "running", "stage": "uploading"}, load_job)
+
+        with patch.object(job_events, "KEEPALIVE_INTERVAL", 0.01):
+            chunks = [chunk async for chunk in stream]
+
+        assert chunks[1] == ": keepalive\n\n"
+        assert chunks[-1].startswith("event: done\n")
+        assert '"images_uploaded": 9' in chunks[-1]
+        load_job.assert_called_with(15)
+        assert 15 not in job_events.broadcaster.subscribers
+
+    def test_events_endpoint_sends_finished_state_and_closes(self, client):
+        from app.services import job_events
+
+        job_events.broadcaster.publish(12, {"job_id": 12, "status": "failed", "stage": "failed", "error_message": "boom"})
+
+        response = client.get("/api/jobs/12/events")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text.startswith("event: done\n")
+        assert '"error_message": "boom"' in response.text
+
+    @patch("app.routers.jobs.get_job_run", new_callable=AsyncMock)
+    def test_events_endpoint_reads_unseen_job_once(self, mock_get_job_run, client):
+        mock_get_job_run.return_value = {"id": 13, "status": "success", "stage": "success", "images_found": 4}
+
+        response = client.get("/api/jobs/13/events")
+        assert response.status_code == 200
+        assert '"images_found": 4' in response.text
+        mock_get_job_run.assert_called_once_with(13)
+
+        mock_get_job_run.return_value = None
+        assert client.get("/api/jobs/14/events").status_code == 404
+
+
 class TestJobService:
     """Test job service functionality."""
 
+    @patch("app.services.job_service.job_events.publish", new_callable=AsyncMock)
+    @patch("app.services.job_service.update_job_progress", new_callable=AsyncMock)
+    async def test_progress_is_throttled(self, mock_update_progress, mock_publish):
+        from app.services.job_service import ProgressWriter
+
+        writer = ProgressWriter(9)
+        await writer("scanning", {"images_found": 0})
+        for uploaded in range(1, 51):
+            await writer("processing", {"images_uploaded": uploaded}, uploaded, 50)
+        await writer("recording", {"images_uploaded": 50}, 0, 50)
+
+        # Every stage change is written; per-image updates within the interval aren't
+        assert [call.args[1] for call in mock_update_progress.call_args_list] == ["scanning", "processing", "recording"]
+
+        events = [call.args[1] for call in mock_publish.call_args_list]
+        assert [event["stage"] for event in events] == ["scanning", "processing", "processing", "recording"]
+        finished = events[2]
+        assert (finished["done"], finished["total"]) == (50, 50)
+        assert finished["images_per_second"] > 0
+        assert finished["eta_seconds"] == 0
+
     def test_job_service_creates_job_record(self, mock_supabase_admin):
         """Test that running a job creates a database record."""
         mock_supabase_admin.table.return_value.insert.return_value.execute.return_value = MagicMock(
@@ -0,0 +1,75 @@
+"""Tests for scripts/seed_database.py."""
+import importlib.util
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    "seed_database", Path(__file__).parent.parent / "scripts" / "seed_database.py"
+)
+seed_database = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(seed_database)
+
+
+@pytest.fixture
+def images_dir(tmp_path):
+    for series, names in {"Fruit_Series": ["01_Apple", "Peach"], "Animal_Series": ["Rabbit"]}.items():
+        (tmp_path / series).mkdir()
+        for name in names:
+            (tmp_path / series / f"{name}.png").write_bytes(b"png")
+    return tmp_path
+
+
+class TestSeedDatabase:
+    """Test the in-memory diff and bulk writes."""
+
+    def test_plan_only_includes_new_and_changed_rows(self, images_dir):
+        catalog = seed_database.scan_images(images_dir)
+        series_rows = [{"id": 1, "name": "Fruit Series"}]
+        angel_rows = [
+            {"id": 10, "name": "Apple", "series_id": 1, **seed_database.angel_images("Fruit_Series", "01_Apple.png")},
+            {"id": 11, "name": "Peach", "series_id": 1, **seed_database.angel_images("Fruit_Series", "old.png")},
+        ]
+
+        plan = seed_database.plan_seed(catalog, series_rows, angel_rows)
+
+        assert plan["new_series"] == ["Animal Series"]
+        assert [a["name"] for a in plan["new_angels"]["Animal Series"]] == ["Rabbit"]
+        assert [a["name"] for a in plan["changed_angels"]["Fruit Series"]] == ["Peach"]
+        assert plan["unchanged"] == 1
+
+    def test_apply_uses_one_upsert_per_table(self, images_dir):
+        catalog = seed_database.scan_images(images_dir)
+        plan = seed_database.plan_seed(catalog, [], [])
+        supabase = MagicMock()
+        series_table = MagicMock()
+        series_table.upsert.return_value.execute.return_value = MagicMock(
+            data=[{"id": 1, "name": "Animal Series"}, {"id": 2, "name": "Fruit Series"}]
+        )
+        angels_table = MagicMock()
+        angels_table.upsert.side_effect = lambda rows, on_conflict: MagicMock(
+            execute=MagicMock(return_value=MagicMock(data=rows))
+        )
+        supabase.table.side_effect = {"series": series_table, "angels": angels_table}.get
+
+        written = seed_database.apply_seed(supabase, plan, [])
+
+        assert written == {"series": 2, "angels": 3}
+        assert series_table.upsert.call_count == 1
+        assert angels_table.upsert.call_count == 1
+        rows, = angels_table.upsert.call_args.args
+        assert angels_table.upsert.call_args.kwargs["on_conflict"] == "name,series_id"
+        assert {(row["series_id"], row["name"]) for row in rows} == {(1, "Rabbit"), (2, "Apple"), (2, "Peach")}
+
+    def test_upserts_are_batched(self, images_dir, monkeypatch):
+        monkeypatch.setattr(seed_database, "UPSERT_BATCH_SIZE", 2)
+        plan = seed_database.plan_seed(seed_database.scan_images(images_dir), [
+            {"id": 1, "name": "Animal Series"}, {"id": 2, "name": "Fruit Series"}
+        ], [])
+        supabase = MagicMock()
+        supabase.table.return_value.upsert.return_value.execute.return_value = MagicMock(data=[{}])
+
+        seed_database.apply_seed(supabase, plan, [{"id": 1, "name": "Animal Series"}, {"id": 2, "name": "Fruit Series"}])
+
+        assert supabase.table.return_value.upsert.call_count == 2
@@ -0,0 +1,67 @@
+"""Tests for request tracing and the Server-Timing header."""
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.middleware import tracing
+
+SAMPLED_TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class TestTracingMiddleware:
+    """Test tracing of HTTP requests."""
+
+    def test_sampled_request_gets_server_timing(self, client):
+        """A sampled traceparent forces the request to be traced."""
+        response = client.get("/health", headers={"traceparent": SAMPLED_TRACEPARENT})
+        assert response.status_code == 200
+        assert "total;dur=" in response.headers["Server-Timing"]
+        assert "serialize;dur=" in response.headers["Server-Timing"]
+        assert response.headers["traceparent"].startswith("00-0af7651916cd43dd8448eb211c80319c-")
+
+    @patch.object(tracing.settings, "trace_sample_rate", 0.0)
+    def test_unsampled_request_has_no_server_timing(self, client):
+        """Requests outside the sample carry no tracing overhead or headers."""
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert "Server-Timing" not in response.headers
+
+    def test_postgrest_execute_is_recorded_as_db_span(self):
+        """The instrumented .execute() opens a db span with the table name."""
+        builder = MagicMock()
+        builder.request.http_method = "GET"
+        builder.request.path = "https://example.supabase.co/rest/v1/angels"
+        execute = tracing._traced_execute(lambda self: "result")
+
+        trace = tracing.Trace("GET /angels")
+        token = tracing.current_trace.set(trace)
+        try:
+            assert execute(builder) == "result"
+        finally:
+            tracing.current_trace.reset(token)
+
+        assert trace.spans[0]["name"] == "db.execute"
+        assert trace.spans[0]["attributes"]["db.table"] == "angels"
+        assert trace.server_timing(5.0).startswith("db;dur=")
+
+
+class TestTraceExport:
+    """Test the OTLP/JSON exporter."""
+
+    async def test_flush_writes_otlp_json(self, tmp_path):
+        """Buffered traces are written as one OTLP/JSON line per flush."""
+        export_file = tmp_path / "traces.jsonl"
+        trace = tracing.Trace("GET /angels")
+        trace.add_span("cache.get", trace.start_ns, 1000, {"key": "angels"}, False)
+        trace.end_ns = trace.start_ns + 5000
+        trace.status_code = 200
+        tracing.pending_traces.append(trace)
+
+        with patch.object(tracing.settings, "trace_export_file", str(export_file)):
+            await tracing.flush_traces()
+
+        payload = json.loads(export_file.read_text().splitlines()[0])
+        spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [s["name"] for s in spans] == ["GET /angels", "cache.get"]
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert not tracing.pending_traces
@@ -0,0 +1,156 @@
+"""Tests for scripts/upload_images.py against an in-memory storage stand-in."""
+import hashlib
+import importlib.util
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.services.asset_manifest import AssetManifest
+
+spec = importlib.util.spec_from_file_location(
+    "upload_images", Path(__file__).parent.parent / "scripts" / "upload_images.py"
+)
+upload_images = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(upload_images)
+
+
+class FakeStorage:
+    """Implements the Storage API's upload and list calls for one bucket."""
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.uploads: list[str] = []
+        self.lists = 0
+        self.fail_next: list[int] = []
+        self.broken_list = False
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if self.fail_next:
+            return httpx.Response(self.fail_next.pop(0))
+        if path.startswith("/storage/v1/object/list/angels"):
+            self.lists += 1
+            if self.broken_list:
+                return httpx.Response(200, content=b"<html>Bad gateway</html>")
+            prefix = json.loads(request.content)["prefix"]
+            return httpx.Response(200, json=[
+                {"name": key.rpartition("/")[2], "metadata": {"eTag": f'"{hashlib.md5(data).hexdigest()}"'}}
+                for key, data in self.objects.items()
+                if key.rpartition("/")[0] == prefix
+            ])
+        key = path.removeprefix("/storage/v1/object/angels/")
+        self.objects[key] = request.content
+        self.uploads.append(key)
+        return httpx.Response(200, json={"Key": f"angels/{key}"})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url="http://storage.test/storage/v1", transport=httpx.MockTransport(self.handler)
+        )
+
+
+@pytest.fixture
+def scraper_dir(tmp_path):
+    for folder in ("images", "images_bw"):
+        for name in ("Apple", "Peach"):
+            path = tmp_path / folder / "Fruit_Series" / f"{name}.png"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(f"{folder}-{name}".encode())
+    return tmp_path
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = AssetManifest(str(tmp_path / "manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(upload_images, "backoff_delay", lambda attempt, base, cap: 0)
+
+
+class TestUploadImages:
+    """Test the concurrent uploader."""
+
+    async def test_uploads_everything_then_skips_unchanged(self, scraper_dir, manifest):
+        storage = FakeStorage()
+        files = upload_images.collect_files(scraper_dir, ["images", "images_bw"])
+
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest, concurrency=3)
+        assert stats["uploaded"] == 4
+        assert stats["bytes"] == sum(len(data) for data in storage.objects.values())
+        assert storage.objects["images_bw/Fruit_Series/Apple.png"] == b"images_bw-Apple"
+        etag = manifest.uploads()["images/Fruit_Series/Peach.png"]["etag"]
+        assert etag == hashlib.md5(b"images-Peach").hexdigest()
+
+        storage.uploads.clear()
+        storage.lists = 0
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest)
+        assert stats == {"uploaded": 0, "unchanged": 4, "failed": 0, "bytes": 0}
+        assert storage.uploads == []
+        assert storage.lists == 0
+
+    async def test_changed_file_is_reuploaded(self, scraper_dir, manifest):
+        storage = FakeStorage()
+        files = upload_images.collect_files(scraper_dir, ["images"])
+        async with storage.client() as client:
+            await upload_images.upload_all(client, files, manifest)
+
+        storage.uploads.clear()
+        (scraper_dir / "images" / "Fruit_Series" / "Apple.png").write_bytes(b"new apple")
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest)
+        assert storage.uploads == ["images/Fruit_Series/Apple.png"]
+        assert stats["unchanged"] == 1
+
+    async def test_skips_files_whose_remote_etag_matches(self, scraper_dir, manifest):
+        storage = FakeStorage()
+        storage.objects["images/Fruit_Series/Apple.png"] = b"images-Apple"
+        storage.objects["images/Fruit_Series/Peach.png"] = b"stale peach"
+        files = upload_images.collect_files(scraper_dir, ["images"])
+
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest)
+        assert storage.uploads == ["images/Fruit_Series/Peach.png"]
+        assert (stats["uploaded"], stats["unchanged"]) == (1, 1)
+        # The matching file is now in the manifest, so the next run won't list
+        assert "images/Fruit_Series/Apple.png" in manifest.uploads()
+
+    async def test_transient_errors_are_retried(self, scraper_dir, manifest):
+        storage = FakeStorage()
+        storage.fail_next = [503, 502]
+        files = upload_images.collect_files(scraper_dir, ["images"])[:1]
+
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest, force=True, retries=3)
+        assert stats["uploaded"] == 1
+        assert stats["failed"] == 0
+
+    async def test_client_errors_are_not_retried(self, scraper_dir, manifest):
+        storage = FakeStorage()
+        storage.fail_next = [400]
+        files = upload_images.collect_files(scraper_dir, ["images"])[:1]
+
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest, force=True, retries=3)
+        assert stats["failed"] == 1
+        assert storage.uploads == []
+        assert manifest.uploads() == {}
+
+    async def test_one_bad_file_does_not_abort_the_run(self, scraper_dir, manifest):
+        storage = FakeStorage()
+        storage.broken_list = True
+        files = upload_images.collect_files(scraper_dir, ["images", "images_bw"])
+        # Vanishes between collection and upload
+        (scraper_dir / "images" / "Fruit_Series" / "Apple.png").unlink()
+
+        async with storage.client() as client:
+            stats = await upload_images.upload_all(client, files, manifest)
+        assert (stats["uploaded"], stats["failed"]) == (3, 1)
+        assert "images/Fruit_Series/Apple.png" not in storage.objects
@@ -0,0 +1,271 @@
+"""
+Image service benchmarks.
+
+    python benchmark.py batch --images 50 --workers 1,4,8
+    python benchmark.py fused --images 20
+    python benchmark.py kernels --images 20
+    python benchmark.py encoding --images 10
+    python benchmark.py decode --width 6000
+
+batch: runs a /process/batch/all-sized workload (all three variants per
+image) through process_batch with a process pool of each requested size.
+
+fused: compares the per-variant pipeline (a copy and conversion per variant,
+circular crop resampled twice) with main.all_variants, counting image
+buffers allocated and bytes allocated per source image.
+
+kernels: times each single transform in image_kernels against the version it
+replaced (split, lambda lookup table and merge for opacity, mode "L" round
+trip that dropped alpha for grayscale, ImageDraw mask and paste with a
+resample down and back up for the circular crop).
+
+encoding: encode time and output size of every profile and rendition for
+the all-variants outputs.
+
+decode: thumbnail and card renditions of a large JPEG and PNG photo, decoded
+at full size vs with draft/reduce early downscaling.
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from contextlib import contextmanager
+
+from PIL import Image, ImageDraw
+from starlette.datastructures import UploadFile
+
+import main
+from encoding import PROFILES, RENDITIONS, encode
+from result_cache import ResultCache
+
+def make_source_image(index: int, width: int = 1200, height: int = 1600) -> bytes:
+    # Figure-like test image: transparent background with an opaque shape
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    color = (40 + index * 7 % 200, 120, 200 - index * 3 % 150, 255)
+    draw.ellipse((150, 100, width - 150, height - 100), fill=color)
+    draw.rectangle((width // 3, height // 4, 2 * width // 3, height // 2), fill=(250, 220, 180, 255))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def make_uploads(sources: list) -> list:
+    return [
+        UploadFile(file=io.BytesIO(data), filename=f"angel_{i}.png")
+        for i, data in enumerate(sources)
+    ]
+
+def bench_batch(images: int, worker_counts: list):
+    sources = [make_source_image(i) for i in range(images)]
+    print(f"Batch: {images} images, {len(sources[0]) // 1024} KB each, {os.cpu_count()} cores available")
+    print("-" * 50)
+
+    # Every run processes the same images; measure processing, not cache hits
+    main.result_cache = ResultCache(main.result_cache.directory, 0)
+
+    baseline = None
+    for workers in worker_counts:
+        main.IMAGE_WORKERS = workers
+        main.executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            # Warm the pool so process start-up isn't timed
+            asyncio.run(main.run_in_pool(os.getpid))
+
+            start = time.perf_counter()
+            results = asyncio.run(main.process_batch(make_uploads(sources), main.all_variants_job, 0.5))
+            elapsed = time.perf_counter() - start
+        finally:
+            main.executor.shutdown()
+            main.executor = None
+
+        failed = sum(1 for result in results if "error" in result)
+        baseline = baseline or elapsed
+        print(
+            f"{workers:>2} workers: {elapsed:7.2f}s  {images / elapsed:6.2f} images/s  "
+            f"speedup {baseline / elapsed:4.2f}x  failed {failed}"
+        )
+
+def legacy_reduce_opacity(img: Image.Image, opacity: float) -> Image.Image:
+    r, g, b, a = img.convert("RGBA").split()
+    return Image.merge("RGBA", (r, g, b, a.point(lambda p: int(p * opacity))))
+
+def legacy_grayscale(img: Image.Image) -> Image.Image:
+    return img.convert("L").convert("RGBA")
+
+def legacy_circular(img: Image.Image, crop_width=1000, crop_height=1000, zoom_factor=0.5, y_shift=-300) -> Image.Image:
+    img_width, img_height = img.size
+    x_center = img_width // 2
+    y_center = img_height // 2 + y_shift
+    top = max(0, y_center - crop_height // 2)
+    bottom = min(img_height, y_center + crop_height // 2)
+    cropped_img = img.crop((x_center - crop_width // 2, top, x_center + crop_width // 2, bottom))
+
+    zoomed_width = int(crop_width * zoom_factor)
+    zoomed_height = int(crop_height * zoom_factor)
+    cropped_img = cropped_img.resize((zoomed_width, zoomed_height), Image.LANCZOS)
+
+    mask = Image.new("L", (zoomed_width, zoomed_height), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, zoomed_width, zoomed_height), fill=255)
+    circular_img = Image.new("RGBA", (zoomed_width, zoomed_height), (0, 0, 0, 0))
+    circular_img.paste(cropped_img, (0, 0), mask)
+    return circular_img.resize((crop_width, crop_height), Image.LANCZOS)
+
+def legacy_all_variants(img: Image.Image, opacity: float) -> dict:
+    # The pipeline before the fused version: a full copy per variant and a
+    # convert("RGBA") inside each transform
+    return {
+        "opacity": legacy_reduce_opacity(img.copy(), opacity),
+        "grayscale": legacy_grayscale(img.copy()),
+        "circular": legacy_circular(img.copy())
+    }
+
+@contextmanager
+def count_image_allocations():
+    # Every Pillow operation that produces a new image buffer goes through
+    # Image.Image._new
+    stats = {"images": 0, "bytes": 0}
+    original = Image.Image._new
+
+    def counting_new(self, im):
+        stats["images"] += 1
+        stats["bytes"] += im.size[0] * im.size[1] * len(im.mode.replace(";16", ""))
+        return original(self, im)
+
+    Image.Image._new = counting_new
+    try:
+        yield stats
+    finally:
+        Image.Image._new = original
+
+def bench_fused(images: int):
+    sources = [make_source_image(i) for i in range(images)]
+    print(f"Fused pipeline: {images} images, {len(sources[0]) // 1024} KB each")
+    print("-" * 50)
+
+    for label, pipeline in (("per-variant", legacy_all_variants), ("fused", main.all_variants)):
+        with count_image_allocations() as stats:
+            start = time.perf_counter()
+            for data in sources:
+                for variant in pipeline(Image.open(io.BytesIO(data)), 0.5).values():
+                    variant.load()
+            elapsed = time.perf_counter() - start
+
+        # numpy arrays are invisible to the Pillow counter but are traced
+        tracemalloc.start()
+        pipeline(Image.open(io.BytesIO(sources[0])), 0.5)
+        numpy_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(
+            f"{label:<12} {elapsed / images * 1000:7.1f} ms/image  "
+            f"{stats['images'] / images:5.1f} Pillow buffers/image  "
+            f"{stats['bytes'] / images / 2**20:6.1f} MiB Pillow + "
+            f"{numpy_peak / 2**20:5.1f} MiB numpy peak"
+        )
+
+def bench_kernels(images: int):
+    sources = [Image.open(io.BytesIO(make_source_image(i))).convert("RGBA") for i in range(images)]
+    print(f"Kernels: {images} images, {sources[0].width}x{sources[0].height} RGBA")
+    print("-" * 50)
+
+    transforms = [
+        ("opacity", lambda img: legacy_reduce_opacity(img, 0.5), lambda img: main.reduce_opacity(img, 0.5)),
+        ("grayscale", legacy_grayscale, main.convert_to_grayscale),
+        ("circular", legacy_circular, main.convert_to_circular),
+    ]
+    for name, legacy, kernel in transforms:
+        timings = []
+        for fn in (legacy, kernel):
+            start = time.perf_counter()
+            for img in sources:
+                fn(img).load()
+            timings.append((time.perf_counter() - start) / images * 1000)
+        print(f"{name:<10} old {timings[0]:7.2f} ms  new {timings[1]:7.2f} ms  {timings[0] / timings[1]:5.2f}x")
+
+def bench_encoding(images: int):
+    variants = [
+        variant
+        for i in range(images)
+        for variant in main.all_variants(Image.open(io.BytesIO(make_source_image(i))), 0.5).values()
+    ]
+    print(f"Encoding: {len(variants)} variant images")
+    print("-" * 50)
+
+    for rendition in RENDITIONS:
+        for profile in PROFILES:
+            start = time.perf_counter()
+            size = sum(len(encode(variant, profile, rendition)) for variant in variants)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{rendition:<10} {profile:<14} {elapsed / len(variants) * 1000:7.1f} ms/image  "
+                f"{size / len(variants) / 1024:8.1f} KB/image"
+            )
+
+def make_photo(width: int, image_format: str) -> bytes:
+    height = width * 2 // 3
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def bench_decode(width: int, runs: int):
+    print(f"Decode: {width}x{width * 2 // 3} source, opacity variant")
+    print("-" * 50)
+
+    for image_format in ("JPEG", "PNG"):
+        source = make_photo(width, image_format)
+        for rendition in ("thumbnail", "card"):
+            def full_decode():
+                return encode(main.reduce_opacity(Image.open(io.BytesIO(source)), 0.5), "png", rendition)
+
+            def early_downscale():
+                return main.opacity_job(source, 0.5, "png", rendition)
+
+            for label, fn in (("full decode", full_decode), ("downscaled", early_downscale)):
+                with count_image_allocations() as stats:
+                    start = time.perf_counter()
+                    for _ in range(runs):
+                        fn()
+                    elapsed = (time.perf_counter() - start) / runs
+                print(
+                    f"{image_format:<5} {rendition:<10} {label:<12} {elapsed * 1000:8.1f} ms  "
+                    f"{stats['bytes'] / runs / 2**20:7.1f} MiB Pillow buffers"
+                )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image service benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="batch throughput vs worker count")
+    batch_parser.add_argument("--images", type=int, default=50)
+    batch_parser.add_argument("--workers", default="1,4,8", help="comma-separated pool sizes")
+
+    fused_parser = subparsers.add_parser("fused", help="per-variant vs fused all-variants pipeline")
+    fused_parser.add_argument("--images", type=int, default=20)
+
+    kernels_parser = subparsers.add_parser("kernels", help="Pillow vs numpy single transforms")
+    kernels_parser.add_argument("--images", type=int, default=20)
+
+    encoding_parser = subparsers.add_parser("encoding", help="encode time and size per profile and rendition")
+    encoding_parser.add_argument("--images", type=int, default=10)
+
+    decode_parser = subparsers.add_parser("decode", help="full decode vs early downscale for large sources")
+    decode_parser.add_argument("--width", type=int, default=6000)
+    decode_parser.add_argument("--runs", type=int, default=3)
+
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        bench_batch(args.images, [int(w) for w in args.workers.split(",")])
+    elif args.command == "fused":
+        bench_fused(args.images)
+    elif args.command == "kernels":
+        bench_kernels(args.images)
+    elif args.command == "encoding":
+        bench_encoding(args.images)
+    elif args.command == "decode":
+        bench_decode(args.width, args.runs)
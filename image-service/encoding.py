@@ -0,0 +1,53 @@
+"""
+Output encoding profiles and size renditions.
+
+A profile picks the output format and its size/speed trade-off; a rendition
+bounds the output width. Both are selected by name on every endpoint, so
+clients and the result cache only ever deal in a small, fixed set.
+"""
+import io
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+class EncodingProfile(NamedTuple):
+    format: str
+    extension: str
+    media_type: str
+    options: dict
+
+PROFILES = {
+    # Pillow's default zlib level; the previous behaviour
+    "png": EncodingProfile("PNG", "png", "image/png", {"compress_level": 6}),
+    # Several times faster to encode, ~10-20% larger
+    "png_fast": EncodingProfile("PNG", "png", "image/png", {"compress_level": 1}),
+    # Smallest output for catalog thumbnails; alpha is kept
+    "webp": EncodingProfile("WEBP", "webp", "image/webp", {"quality": 80, "method": 4}),
+    "webp_lossless": EncodingProfile("WEBP", "webp", "image/webp", {"lossless": True, "quality": 80, "method": 4}),
+}
+
+# Maximum output width per rendition; None keeps the transform's size
+RENDITIONS = {
+    "thumbnail": 240,
+    "card": 480,
+    "full": None,
+}
+
+def resize_for_rendition(img: Image.Image, rendition: str) -> Image.Image:
+    max_width = RENDITIONS[rendition]
+    if max_width is None or img.width <= max_width:
+        return img
+    height = max(1, round(img.height * max_width / img.width))
+    return img.resize((max_width, height), Image.LANCZOS)
+
+def encode(img: Image.Image, profile: str = "png", rendition: str = "full") -> bytes:
+    encoding = PROFILES[profile]
+    buffer = io.BytesIO()
+    resize_for_rendition(img, rendition).save(buffer, format=encoding.format, **encoding.options)
+    return buffer.getvalue()
+
+def output_filename(prefix: Optional[str], filename: str, profile: str) -> str:
+    # Keep the upload's stem, with the extension of the output format
+    stem, dot, extension = filename.rpartition(".")
+    name = f"{stem}.{PROFILES[profile].extension}" if dot else f"{filename}.{PROFILES[profile].extension}"
+    return f"{prefix}_{name}" if prefix else name
@@ -0,0 +1,99 @@
+"""
+Pixel transforms for the angel image variants.
+
+Shared by the service (main.py) and the scraper's batch script
+(scraper/process_images.py), so both produce the same opacity, grayscale and
+circular outputs. Each transform uses whichever of Pillow or numpy is faster
+for it (see `python benchmark.py kernels`): opacity and grayscale are single
+Pillow operations in C, and the anti-aliased circle mask is built and applied
+with numpy.
+"""
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+def to_rgba(img: Image.Image) -> Image.Image:
+    # convert() always copies, even when the mode already matches
+    return img if img.mode == "RGBA" else img.convert("RGBA")
+
+def to_array(img: Image.Image) -> np.ndarray:
+    # A writable HxWx4 uint8 copy for the numpy kernels to work on in place
+    return np.array(to_rgba(img))
+
+def from_array(pixels: np.ndarray) -> Image.Image:
+    # Wraps the array without a copy
+    height, width = pixels.shape[:2]
+    return Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+
+@lru_cache(maxsize=32)
+def opacity_table(opacity: float) -> tuple:
+    # point() table for all four bands: RGB unchanged, alpha scaled with the
+    # same truncation as the old a.point(lambda p: int(p * opacity))
+    identity = tuple(range(256))
+    return identity * 3 + tuple(int(p * opacity) for p in range(256))
+
+def reduce_opacity(img: Image.Image, opacity: float) -> Image.Image:
+    # One lookup pass over the image instead of split, point and merge
+    return to_rgba(img).point(opacity_table(opacity))
+
+def convert_to_grayscale(img: Image.Image) -> Image.Image:
+    # convert("L") computes ITU-R 601-2 luma in C; the original alpha plane
+    # is put back so transparency survives
+    img = to_rgba(img)
+    gray = img.convert("L")
+    return Image.merge("RGBA", (gray, gray, gray, img.getchannel("A")))
+
+@lru_cache(maxsize=32)
+def circle_mask(width: int, height: int) -> np.ndarray:
+    # Anti-aliased ellipse filling the box, coverage ramped over ~1px
+    y, x = np.ogrid[:height, :width]
+    rx, ry = width / 2, height / 2
+    distance = np.sqrt(((x + 0.5 - rx) / rx) ** 2 + ((y + 0.5 - ry) / ry) ** 2)
+    coverage = np.clip(0.5 - (distance - 1) * min(rx, ry), 0, 1)
+    mask = (coverage * 255 + 0.5).astype(np.uint8)
+    mask.setflags(write=False)
+    return mask
+
+def apply_mask(alpha: np.ndarray, mask: np.ndarray):
+    alpha[:] = (alpha.astype(np.uint16) * mask + 127) // 255
+
+def crop_circular(
+    img: Image.Image,
+    crop_width: int,
+    crop_height: int,
+    y_shift: int
+) -> Image.Image:
+    img_width, img_height = img.size
+
+    x_center = img_width // 2
+    y_center = img_height // 2 + y_shift
+
+    left = x_center - crop_width // 2
+    top = y_center - crop_height // 2
+    right = x_center + crop_width // 2
+    bottom = y_center + crop_height // 2
+
+    top = max(0, top)
+    bottom = min(img_height, bottom)
+
+    cropped_img = img.crop((left, top, right, bottom))
+
+    # Only resample when the crop was clamped at the top or bottom edge
+    if cropped_img.size != (crop_width, crop_height):
+        cropped_img = cropped_img.resize((crop_width, crop_height), Image.LANCZOS)
+
+    return cropped_img
+
+def convert_to_circular(
+    img: Image.Image,
+    crop_width: int = 1000,
+    crop_height: int = 1000,
+    y_shift: int = -300,
+) -> Image.Image:
+    # The crop is masked at its final size. (The old zoom_factor shrank it
+    # before masking and scaled it back up: two LANCZOS passes whose only
+    # effect was softening.)
+    pixels = to_array(crop_circular(to_rgba(img), crop_width, crop_height, y_shift))
+    apply_mask(pixels[..., 3], circle_mask(crop_width, crop_height))
+    return from_array(pixels)
@@ -1,18 +1,111 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, File, Form, Query, UploadFile, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image, ImageDraw
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from collections import deque
+from PIL import Image
+import asyncio
+import base64
+import hashlib
 import io
-from typing import Optional, List
+import shutil
+import time
+import math
+import json
+from typing import AsyncIterator, Callable, Dict, Optional, List
 import uvicorn
-import zipfile
 import tempfile
 import os
+import uuid
+import warnings
+
+from encoding import PROFILES, RENDITIONS, encode, output_filename
+from image_kernels import convert_to_circular, convert_to_grayscale, reduce_opacity, to_rgba
+from result_cache import ResultCache, content_digest
+from streaming_zip import ZipStream
+
+# Pillow work runs in worker processes so it never blocks the event loop
+# and can use every core. Defaults to one worker per core.
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "0")) or os.cpu_count() or 1
+
+executor: Optional[ProcessPoolExecutor] = None
+
+# Inputs over either limit are rejected with 413. The pixel limit is checked
+# from the image header, before anything is decoded or allocated.
+MAX_INPUT_BYTES = int(os.getenv("MAX_INPUT_MB", "25")) * 1024 * 1024
+MAX_INPUT_PIXELS = int(os.getenv("MAX_INPUT_PIXELS", "50000000"))
+
+# Pillow's own bomb check (a warning past the limit, an error at twice it)
+Image.MAX_IMAGE_PIXELS = MAX_INPUT_PIXELS
+
+class InputTooLarge(Exception):
+    pass
+
+# Processed PNGs are cached on disk by input hash, operation and parameters.
+# RESULT_CACHE_MAX_MB=0 disables the cache. Bump PIPELINE_VERSION whenever a
+# transform's output changes so cached results from the old code are ignored.
+PIPELINE_VERSION = 1
+
+result_cache = ResultCache(
+    os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "angel-archive-image-cache")),
+    int(os.getenv("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    PIPELINE_VERSION
+)
+
+# Background batch jobs (POST /jobs). At most JOB_QUEUE_SIZE jobs wait in
+# the queue; further submissions get 503 until it drains. JOB_RUNNERS jobs
+# run at once, each using the whole worker pool.
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+JOB_RUNNERS = int(os.getenv("JOB_RUNNERS", "1"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "angel-archive-jobs"))
+# Jobs may read inputs from paths under this directory; unset disables paths
+SHARED_INPUT_DIR = os.getenv("SHARED_INPUT_DIR", "")
+
+job_queue: Optional[asyncio.Queue] = None
+# Queue slots claimed by submissions still staging their uploads
+reserved_slots = 0
+jobs: Dict[str, dict] = {}
+job_specs: Dict[str, dict] = {}
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return executor
+
+async def run_in_pool(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), fn, *args)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global executor, job_queue
+    get_executor()
+    job_queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+    runners = [asyncio.create_task(job_runner()) for _ in range(JOB_RUNNERS)]
+    yield
+    for runner in runners:
+        runner.cancel()
+    await asyncio.gather(*runners, return_exceptions=True)
+    job_queue = None
+    # Jobs live in memory, so anything unfinished is lost with the process
+    for job in jobs.values():
+        if job["status"] in ("queued", "running"):
+            job["status"] = "failed"
+            job["error"] = "Service shut down before the job finished"
+            job["finished_at"] = time.time()
+    job_specs.clear()
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = None
 
 app = FastAPI(
     title="Angel Archive Image Processing Service",
     description="Microservice for image processing operations (opacity, grayscale, circular crop)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -23,6 +116,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(InputTooLarge)
+async def input_too_large_handler(request: Request, exc: InputTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
 @app.get("/")
 async def root():
     return {
@@ -37,7 +134,10 @@ async def root():
             "batch_all": "POST /process/batch/all",
             "batch_grayscale": "POST /process/batch/grayscale",
             "batch_opacity": "POST /process/batch/opacity",
-            "batch_circular": "POST /process/batch/circular"
+            "batch_circular": "POST /process/batch/circular",
+            "jobs": "POST /jobs",
+            "job_status": "GET /jobs/{id}",
+            "job_archive": "GET /jobs/{id}/archive"
         }
     }
 
@@ -46,98 +146,222 @@ async def health_check():
     return {
         "status": "ok",
         "service": "image-processing",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "workers": IMAGE_WORKERS,
+        "cache": result_cache.stats()
     }
 
-def reduce_opacity(img: Image.Image, opacity: float) -> Image.Image:
-    img = img.convert("RGBA")
-    r, g, b, a = img.split()
-    a = a.point(lambda p: int(p * opacity))
-    return Image.merge("RGBA", (r, g, b, a))
-
-def convert_to_grayscale(img: Image.Image) -> Image.Image:
-    return img.convert("L").convert("RGBA")
+# The circular crop all_variants uses (convert_to_circular's defaults)
+ALL_VARIANTS_CIRCULAR = {"crop_width": 1000, "crop_height": 1000, "y_shift": -300}
 
-def convert_to_circular(
-    img: Image.Image,
-    crop_width: int = 1000,
-    crop_height: int = 1000,
-    zoom_factor: float = 0.5,
-    y_shift: int = -300,
-) -> Image.Image:
-    img_width, img_height = img.size
-
-    x_center = img_width // 2
-    y_center = img_height // 2 + y_shift
-
-    left = x_center - crop_width // 2
-    top = y_center - crop_height // 2
-    right = x_center + crop_width // 2
-    bottom = y_center + crop_height // 2
-
-    top = max(0, top)
-    bottom = min(img_height, bottom)
-
-    cropped_img = img.crop((left, top, right, bottom))
-
-    zoomed_width = int(crop_width * zoom_factor)
-    zoomed_height = int(crop_height * zoom_factor)
-    cropped_img = cropped_img.resize((zoomed_width, zoomed_height), Image.LANCZOS)
-
-    mask = Image.new("L", (zoomed_width, zoomed_height), 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, zoomed_width, zoomed_height), fill=255)
+def open_image(contents: bytes) -> Image.Image:
+    # Only parses the header; pixels are decoded on first access
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = Image.open(io.BytesIO(contents))
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise InputTooLarge(str(e))
+    if img.width * img.height > MAX_INPUT_PIXELS:
+        raise InputTooLarge(
+            f"Image is {img.width}x{img.height} ({img.width * img.height} pixels); "
+            f"the limit is {MAX_INPUT_PIXELS} pixels"
+        )
+    return img
+
+def downscale(img: Image.Image, max_scale: float) -> tuple:
+    # Shrink a freshly opened image by up to max_scale when the output will be
+    # at least 2x smaller than the input: JPEGs are scaled by the decoder
+    # (1/2, 1/4 or 1/8 via draft), anything else is box-reduced by an integer
+    # factor right after decoding, before the transforms run. The final
+    # resample to the exact output size still happens at encode time.
+    # Returns the image and the scale actually applied.
+    if max_scale < 2:
+        return img, 1.0
+    width = img.width
+    img.draft("RGB", (math.ceil(img.width / max_scale), math.ceil(img.height / max_scale)))
+    factor = int(max_scale * img.width / width)
+    if factor >= 2:
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        img = img.reduce(factor)
+    return img, width / img.width
+
+def all_variants(img: Image.Image, opacity: float, scale: float = 1.0) -> dict:
+    # Fused pipeline: one RGBA decode shared by every variant; each transform
+    # reads it and allocates only its own output.
+    # scale is how much img was already shrunk; the circular crop's pixel
+    # geometry is shrunk to match.
+    img = to_rgba(img)
+    return {
+        "opacity": reduce_opacity(img, opacity),
+        "grayscale": convert_to_grayscale(img),
+        "circular": convert_to_circular(
+            img,
+            round(ALL_VARIANTS_CIRCULAR["crop_width"] / scale),
+            round(ALL_VARIANTS_CIRCULAR["crop_height"] / scale),
+            round(ALL_VARIANTS_CIRCULAR["y_shift"] / scale)
+        )
+    }
 
-    circular_img = Image.new("RGBA", (zoomed_width, zoomed_height), (0, 0, 0, 0))
-    circular_img.paste(cropped_img, (0, 0), mask)
+async def read_upload(file: UploadFile) -> bytes:
+    # Rejects oversized uploads and images whose header declares too many
+    # pixels, without decoding them
+    if file.size is not None and file.size > MAX_INPUT_BYTES:
+        raise InputTooLarge(f"Upload is {file.size} bytes; the limit is {MAX_INPUT_BYTES} bytes")
+    contents = await file.read(MAX_INPUT_BYTES + 1)
+    if len(contents) > MAX_INPUT_BYTES:
+        raise InputTooLarge(f"Upload exceeds the limit of {MAX_INPUT_BYTES} bytes")
+    try:
+        open_image(contents)
+    except InputTooLarge:
+        raise
+    except Exception:
+        # Not an image Pillow can identify; let the job report the error
+        pass
+    return contents
+
+def check_encoding(profile: str, rendition: str):
+    if profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile '{profile}'; expected one of {', '.join(PROFILES)}")
+    if rendition not in RENDITIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown rendition '{rendition}'; expected one of {', '.join(RENDITIONS)}")
+
+# Pool jobs take and return encoded bytes so only bytes cross the process
+# boundary, never pickled Image objects. Every job ends with the encoding
+# profile and rendition names.
+
+def max_scale(source_width: int, rendition: str) -> float:
+    target_width = RENDITIONS[rendition]
+    return source_width / target_width if target_width else 1.0
+
+def opacity_job(contents: bytes, opacity: float, profile: str = "png", rendition: str = "full") -> bytes:
+    img = open_image(contents)
+    img, _ = downscale(img, max_scale(img.width, rendition))
+    return encode(reduce_opacity(img, opacity), profile, rendition)
+
+def grayscale_job(contents: bytes, profile: str = "png", rendition: str = "full") -> bytes:
+    img = open_image(contents)
+    img, _ = downscale(img, max_scale(img.width, rendition))
+    return encode(convert_to_grayscale(img), profile, rendition)
+
+def circular_job(
+    contents: bytes,
+    crop_width: int,
+    crop_height: int,
+    y_shift: int,
+    profile: str = "png",
+    rendition: str = "full"
+) -> bytes:
+    img = open_image(contents)
+    # The output is the crop, so only the crop needs to cover the rendition
+    img, scale = downscale(img, max_scale(crop_width, rendition))
+    circular = convert_to_circular(
+        img,
+        round(crop_width / scale),
+        round(crop_height / scale),
+        round(y_shift / scale)
+    )
+    return encode(circular, profile, rendition)
+
+def all_variants_job(contents: bytes, opacity: float, profile: str = "png", rendition: str = "full") -> dict:
+    img = open_image(contents)
+    img, scale = downscale(
+        img,
+        min(max_scale(img.width, rendition), max_scale(ALL_VARIANTS_CIRCULAR["crop_width"], rendition))
+    )
+    return {
+        variant_name: encode(variant, profile, rendition)
+        for variant_name, variant in all_variants(img, opacity, scale).items()
+    }
 
-    circular_img = circular_img.resize((crop_width, crop_height), Image.LANCZOS)
+# Cache operation name and parameter names for each single-variant job
+CACHED_JOBS = {
+    opacity_job: ("opacity", ("opacity", "profile", "rendition")),
+    grayscale_job: ("grayscale", ("profile", "rendition")),
+    circular_job: ("circular", ("crop_width", "crop_height", "y_shift", "profile", "rendition")),
+}
+
+def variant_cache_keys(digest: str, opacity: float, profile: str = "png", rendition: str = "full") -> dict:
+    # At full size all_variants produces the single-variant jobs' output byte
+    # for byte, so its outputs are stored under their keys and shared with
+    # those endpoints. Smaller renditions are downscaled differently (once,
+    # for all three variants), so they get keys of their own.
+    encoding = {"profile": profile, "rendition": rendition}
+    namespace = "" if rendition == "full" else "all_variants/"
+    return {
+        "opacity": result_cache.key(digest, f"{namespace}opacity", {"opacity": opacity, **encoding}),
+        "grayscale": result_cache.key(digest, f"{namespace}grayscale", encoding),
+        "circular": result_cache.key(digest, f"{namespace}circular", {**ALL_VARIANTS_CIRCULAR, **encoding})
+    }
 
-    return circular_img
+async def run_job(job, contents: bytes, *args):
+    # A cache hit returns the stored output without decoding the input
+    if not result_cache.enabled:
+        return await run_in_pool(job, contents, *args)
+
+    digest = await asyncio.to_thread(content_digest, contents)
+
+    if job is all_variants_job:
+        keys = variant_cache_keys(digest, *args)
+        cached = await asyncio.to_thread(result_cache.get_many, keys)
+        if cached is not None:
+            return cached
+        encoded = await run_in_pool(job, contents, *args)
+        await asyncio.to_thread(
+            result_cache.put_many,
+            {keys[variant_name]: data for variant_name, data in encoded.items()}
+        )
+        return encoded
+
+    operation, param_names = CACHED_JOBS[job]
+    key = result_cache.key(digest, operation, dict(zip(param_names, args)))
+    cached = await asyncio.to_thread(result_cache.get, key)
+    if cached is not None:
+        return cached
+    data = await run_in_pool(job, contents, *args)
+    await asyncio.to_thread(result_cache.put, key, data)
+    return data
+
+def image_response(data: bytes, prefix: str, filename: str, profile: str) -> Response:
+    return Response(
+        data,
+        media_type=PROFILES[profile].media_type,
+        headers={"Content-Disposition": f"attachment; filename={output_filename(prefix, filename, profile)}"}
+    )
 
 @app.post("/process/opacity")
 async def process_opacity(
     file: UploadFile = File(...),
-    opacity: float = 0.5
+    opacity: float = 0.5,
+    profile: str = "png",
+    rendition: str = "full"
 ):
     if opacity < 0 or opacity > 1:
         raise HTTPException(status_code=400, detail="Opacity must be between 0 and 1")
+    check_encoding(profile, rendition)
 
-    try:
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
+    contents = await read_upload(file)
 
-        processed_img = reduce_opacity(img, opacity)
-
-        img_byte_arr = io.BytesIO()
-        processed_img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-
-        return StreamingResponse(
-            img_byte_arr,
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename=opacity_{file.filename}"}
-        )
+    try:
+        data = await run_job(opacity_job, contents, opacity, profile, rendition)
+        return image_response(data, "opacity", file.filename, profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
 
 @app.post("/process/grayscale")
-async def process_grayscale(file: UploadFile = File(...)):
-    try:
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
-
-        processed_img = convert_to_grayscale(img)
+async def process_grayscale(
+    file: UploadFile = File(...),
+    profile: str = "png",
+    rendition: str = "full"
+):
+    check_encoding(profile, rendition)
 
-        img_byte_arr = io.BytesIO()
-        processed_img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
+    contents = await read_upload(file)
 
-        return StreamingResponse(
-            img_byte_arr,
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename=bw_{file.filename}"}
-        )
+    try:
+        data = await run_job(grayscale_job, contents, profile, rendition)
+        return image_response(data, "bw", file.filename, profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
 
@@ -146,120 +370,224 @@ async def process_circular(
     file: UploadFile = File(...),
     crop_width: int = 1000,
     crop_height: int = 2000,
-    zoom_factor: float = 0.5,
-    y_shift: int = -200
+    # Deprecated and ignored; the crop is no longer zoomed
+    zoom_factor: float = Query(0.5, deprecated=True),
+    y_shift: int = -200,
+    profile: str = "png",
+    rendition: str = "full"
 ):
-    try:
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
-
-        processed_img = convert_to_circular(img, crop_width, crop_height, zoom_factor, y_shift)
+    check_encoding(profile, rendition)
 
-        img_byte_arr = io.BytesIO()
-        processed_img.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
+    contents = await read_upload(file)
 
-        return StreamingResponse(
-            img_byte_arr,
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename=circular_{file.filename}"}
-        )
+    try:
+        data = await run_job(circular_job, contents, crop_width, crop_height, y_shift, profile, rendition)
+        return image_response(data, "circular", file.filename, profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
 
+def build_multipart(parts: List[tuple], media_type: str = "image/png") -> tuple:
+    # parts: (name, filename, data). Each part carries its length and a
+    # Content-Digest so clients can verify and dedupe without re-hashing.
+    boundary = uuid.uuid4().hex
+    body = bytearray()
+    for name, filename, data in parts:
+        digest = base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+        body += (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Disposition: attachment; name=\"{name}\"; filename=\"{filename}\"\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Content-Digest: sha-256=:{digest}:\r\n"
+            f"\r\n"
+        ).encode("utf-8")
+        body += data
+        body += b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return bytes(body), boundary
+
 @app.post("/process/all")
 async def process_all_variants(
+    request: Request,
     file: UploadFile = File(...),
-    opacity: float = 0.5
+    opacity: float = 0.5,
+    profile: str = "png",
+    rendition: str = "full"
 ):
+    # Returns every variant in one multipart/mixed response. Clients that
+    # only want sizes and hashes can send Accept: application/json.
+    check_encoding(profile, rendition)
+
+    contents = await read_upload(file)
+
     try:
-        contents = await file.read()
-        img = Image.open(io.BytesIO(contents))
-
-        opacity_img = reduce_opacity(img.copy(), opacity)
-        grayscale_img = convert_to_grayscale(img.copy())
-        circular_img = convert_to_circular(img.copy())
-
-        variants = {}
-
-        for variant_name, variant_img in [
-            ("opacity", opacity_img),
-            ("grayscale", grayscale_img),
-            ("circular", circular_img)
-        ]:
-            img_byte_arr = io.BytesIO()
-            variant_img.save(img_byte_arr, format='PNG')
-            variants[variant_name] = {
-                "size": img_byte_arr.tell(),
-                "format": "PNG"
+        encoded = await run_job(all_variants_job, contents, opacity, profile, rendition)
+
+        if "application/json" in request.headers.get("accept", ""):
+            variants = {}
+
+            for variant_name, data in encoded.items():
+                variants[variant_name] = {
+                    "size": len(data),
+                    "format": PROFILES[profile].format,
+                    "sha256": hashlib.sha256(data).hexdigest()
+                }
+
+            return {
+                "message": "All variants processed successfully",
+                "variants": variants
             }
 
-        return {
-            "message": "All variants processed successfully",
-            "variants": variants,
-            "note": "Use individual endpoints to download specific variants"
-        }
+        body, boundary = build_multipart(
+            [
+                (variant_name, output_filename(variant_name, file.filename, profile), data)
+                for variant_name, data in encoded.items()
+            ],
+            PROFILES[profile].media_type
+        )
+        return Response(body, media_type=f"multipart/mixed; boundary={boundary}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image processing failed: {str(e)}")
 
-@app.post("/process/batch/grayscale")
-async def batch_process_grayscale(files: List[UploadFile] = File(...)):
+async def iter_batch(files: List[UploadFile], job, *args) -> AsyncIterator[dict]:
+    # Files are processed concurrently, at most IMAGE_WORKERS at a time, and
+    # results are yielded in upload order as soon as each one is ready. A
+    # failing file is recorded instead of failing the batch.
+    async def process_one(file: UploadFile) -> dict:
+        try:
+            contents = await read_upload(file)
+            return {"filename": file.filename, "result": await run_job(job, contents, *args)}
+        except Exception as e:
+            return {"filename": file.filename, "error": str(e)}
+
+    pending = deque()
     try:
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file in files:
-                contents = await file.read()
-                img = Image.open(io.BytesIO(contents))
-
-                processed_img = convert_to_grayscale(img)
+        for file in files:
+            pending.append(asyncio.ensure_future(process_one(file)))
+            if len(pending) >= IMAGE_WORKERS:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def process_batch(files: List[UploadFile], job, *args) -> List[dict]:
+    return [result async for result in iter_batch(files, job, *args)]
+
+def batch_outputs(result: dict, prefix: Optional[str], profile: str = "png") -> List[tuple]:
+    # Single-variant jobs return bytes; the all-variants job returns a dict
+    if prefix is not None:
+        return [(output_filename(prefix, result["filename"], profile), result["result"])]
+    return [
+        (output_filename(variant_name, result["filename"], profile), data)
+        for variant_name, data in result["result"].items()
+    ]
+
+def manifest_entry(result: dict, prefix: Optional[str], profile: str = "png") -> dict:
+    if "error" in result:
+        return {"filename": result["filename"], "status": "error", "error": result["error"]}
+    return {
+        "filename": result["filename"],
+        "status": "ok",
+        "outputs": [name for name, _ in batch_outputs(result, prefix, profile)]
+    }
 
-                img_byte_arr = io.BytesIO()
-                processed_img.save(img_byte_arr, format='PNG')
-                img_byte_arr.seek(0)
+def build_manifest(entries: List[dict]) -> dict:
+    return {
+        "succeeded": sum(1 for entry in entries if entry["status"] == "ok"),
+        "failed": sum(1 for entry in entries if entry["status"] == "error"),
+        "files": entries
+    }
 
-                zip_file.writestr(f"bw_{file.filename}", img_byte_arr.getvalue())
+def detach_uploads(files: List[UploadFile]) -> List[UploadFile]:
+    # FastAPI closes form files as soon as the handler returns, before a
+    # streamed body is sent. Hand the underlying spooled files over to the
+    # stream, which closes them when it is done.
+    detached = []
+    for file in files:
+        detached.append(UploadFile(file=file.file, filename=file.filename))
+        file.file = io.BytesIO()
+    return detached
+
+async def stream_batch_zip(
+    files: List[UploadFile],
+    job,
+    args: tuple,
+    prefix: Optional[str],
+    profile: str = "png",
+    on_entry: Optional[Callable[[dict], None]] = None
+) -> AsyncIterator[bytes]:
+    # Each image's entries are written as soon as it is processed, so only
+    # the in-flight images are held in memory. PNG and WebP output is already
+    # compressed and is stored as-is; only the manifest is deflated.
+    archive = ZipStream()
+    entries = []
+    try:
+        async for result in iter_batch(files, job, *args):
+            entries.append(manifest_entry(result, prefix, profile))
+            if on_entry:
+                on_entry(entries[-1])
+            if "error" in result:
+                continue
+            for name, data in batch_outputs(result, prefix, profile):
+                for chunk in archive.add(name, data):
+                    yield chunk
+
+        manifest = json.dumps(build_manifest(entries), indent=2).encode("utf-8")
+        for chunk in archive.add("manifest.json", manifest, compress=True):
+            yield chunk
+        yield archive.finish()
+    finally:
+        for file in files:
+            await file.close()
+
+def build_batch_zip(
+    files: List[UploadFile],
+    job,
+    args: tuple,
+    prefix: Optional[str],
+    archive_name: str,
+    profile: str = "png"
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_batch_zip(detach_uploads(files), job, args, prefix, profile),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={archive_name}"}
+    )
 
-        zip_buffer.seek(0)
+@app.post("/process/batch/grayscale")
+async def batch_process_grayscale(
+    files: List[UploadFile] = File(...),
+    profile: str = "png",
+    rendition: str = "full"
+):
+    check_encoding(profile, rendition)
 
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=batch_grayscale.zip"}
-        )
+    try:
+        return build_batch_zip(files, grayscale_job, (profile, rendition), "bw", "batch_grayscale.zip", profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
 
 @app.post("/process/batch/opacity")
 async def batch_process_opacity(
     files: List[UploadFile] = File(...),
-    opacity: float = 0.5
+    opacity: float = 0.5,
+    profile: str = "png",
+    rendition: str = "full"
 ):
     if opacity < 0 or opacity > 1:
         raise HTTPException(status_code=400, detail="Opacity must be between 0 and 1")
+    check_encoding(profile, rendition)
 
     try:
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file in files:
-                contents = await file.read()
-                img = Image.open(io.BytesIO(contents))
-
-                processed_img = reduce_opacity(img, opacity)
-
-                img_byte_arr = io.BytesIO()
-                processed_img.save(img_byte_arr, format='PNG')
-                img_byte_arr.seek(0)
-
-                zip_file.writestr(f"opacity_{file.filename}", img_byte_arr.getvalue())
-
-        zip_buffer.seek(0)
-
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=batch_opacity.zip"}
+        return build_batch_zip(
+            files,
+            opacity_job,
+            (opacity, profile, rendition),
+            "opacity",
+            "batch_opacity.zip",
+            profile
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
@@ -269,31 +597,22 @@ async def batch_process_circular(
     files: List[UploadFile] = File(...),
     crop_width: int = 1000,
     crop_height: int = 2000,
-    zoom_factor: float = 0.5,
-    y_shift: int = -200
+    # Deprecated and ignored; the crop is no longer zoomed
+    zoom_factor: float = Query(0.5, deprecated=True),
+    y_shift: int = -200,
+    profile: str = "png",
+    rendition: str = "full"
 ):
-    try:
-        zip_buffer = io.BytesIO()
+    check_encoding(profile, rendition)
 
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file in files:
-                contents = await file.read()
-                img = Image.open(io.BytesIO(contents))
-
-                processed_img = convert_to_circular(img, crop_width, crop_height, zoom_factor, y_shift)
-
-                img_byte_arr = io.BytesIO()
-                processed_img.save(img_byte_arr, format='PNG')
-                img_byte_arr.seek(0)
-
-                zip_file.writestr(f"circular_{file.filename}", img_byte_arr.getvalue())
-
-        zip_buffer.seek(0)
-
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=batch_circular.zip"}
+    try:
+        return build_batch_zip(
+            files,
+            circular_job,
+            (crop_width, crop_height, y_shift, profile, rendition),
+            "circular",
+            "batch_circular.zip",
+            profile
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
@@ -301,44 +620,229 @@ async def batch_process_circular(
 @app.post("/process/batch/all")
 async def batch_process_all_variants(
     files: List[UploadFile] = File(...),
-    opacity: float = 0.5
+    opacity: float = 0.5,
+    profile: str = "png",
+    rendition: str = "full"
 ):
     if opacity < 0 or opacity > 1:
         raise HTTPException(status_code=400, detail="Opacity must be between 0 and 1")
+    check_encoding(profile, rendition)
 
     try:
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file in files:
-                contents = await file.read()
-                img = Image.open(io.BytesIO(contents))
-
-                opacity_img = reduce_opacity(img.copy(), opacity)
-                grayscale_img = convert_to_grayscale(img.copy())
-                circular_img = convert_to_circular(img.copy())
-
-                for variant_name, variant_img in [
-                    ("opacity", opacity_img),
-                    ("grayscale", grayscale_img),
-                    ("circular", circular_img)
-                ]:
-                    img_byte_arr = io.BytesIO()
-                    variant_img.save(img_byte_arr, format='PNG')
-                    img_byte_arr.seek(0)
-
-                    zip_file.writestr(f"{variant_name}_{file.filename}", img_byte_arr.getvalue())
-
-        zip_buffer.seek(0)
-
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=batch_all_variants.zip"}
+        return build_batch_zip(
+            files,
+            all_variants_job,
+            (opacity, profile, rendition),
+            None,
+            "batch_all_variants.zip",
+            profile
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
 
+# Background jobs
+
+# operation -> (job, output prefix, archive name)
+JOB_OPERATIONS = {
+    "all": (all_variants_job, None, "batch_all_variants.zip"),
+    "grayscale": (grayscale_job, "bw", "batch_grayscale.zip"),
+    "opacity": (opacity_job, "opacity", "batch_opacity.zip"),
+    "circular": (circular_job, "circular", "batch_circular.zip"),
+}
+
+def job_args(operation: str, opacity: float, crop_width: int, crop_height: int,
+             y_shift: int, profile: str, rendition: str) -> tuple:
+    if operation == "grayscale":
+        return (profile, rendition)
+    if operation == "circular":
+        return (crop_width, crop_height, y_shift, profile, rendition)
+    return (opacity, profile, rendition)
+
+def resolve_shared_path(path: str) -> str:
+    if not SHARED_INPUT_DIR:
+        raise HTTPException(status_code=400, detail="Path inputs are disabled (SHARED_INPUT_DIR is not set)")
+    root = os.path.realpath(SHARED_INPUT_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail=f"Path is outside the shared input directory: {path}")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=400, detail=f"No such file in the shared input directory: {path}")
+    return resolved
+
+def stage_uploads(files: List[UploadFile], inputs_dir: str) -> List[tuple]:
+    # Uploads are closed when the request ends, so copy them next to the job
+    os.makedirs(inputs_dir, exist_ok=True)
+    staged = []
+    for index, file in enumerate(files):
+        path = os.path.join(inputs_dir, str(index))
+        file.file.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(file.file, out)
+        staged.append((file.filename, path))
+    return staged
+
+def prune_jobs():
+    # Keep the JOB_HISTORY most recent finished jobs and their archives
+    finished = [job_id for job_id, job in jobs.items() if job["status"] in ("done", "failed")]
+    for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+        del jobs[job_id]
+        shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
+
+async def run_batch_job(job_id: str):
+    job = jobs[job_id]
+    spec = job_specs.pop(job_id)
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    archive_path = os.path.join(job_dir, spec["archive_name"])
+
+    def on_entry(entry: dict):
+        job["processed"] += 1
+        job["succeeded" if entry["status"] == "ok" else "failed"] += 1
+        job["files"][job["processed"] - 1] = entry
+
+    job["status"] = "running"
+    job["started_at"] = time.time()
+
+    files = []
+    try:
+        # Opened here so a missing or unreadable input fails this job only
+        for filename, path in spec["inputs"]:
+            files.append(UploadFile(file=open(path, "rb"), filename=filename))
+        with open(archive_path, "wb") as out:
+            async for chunk in stream_batch_zip(
+                files, spec["job"], spec["args"], spec["prefix"], spec["profile"], on_entry
+            ):
+                await asyncio.to_thread(out.write, chunk)
+        job["status"] = "done"
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        for file in files:
+            file.file.close()
+        shutil.rmtree(os.path.join(job_dir, "inputs"), ignore_errors=True)
+
+async def job_runner():
+    while True:
+        job_id = await job_queue.get()
+        try:
+            await run_batch_job(job_id)
+        except Exception as e:
+            # Keep the runner alive for the jobs behind this one
+            print(f"Job runner error on {job_id}: {e}")
+        finally:
+            job_queue.task_done()
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    files: List[UploadFile] = File(None),
+    paths: List[str] = Form(None),
+    operation: str = "all",
+    opacity: float = 0.5,
+    crop_width: int = 1000,
+    crop_height: int = 2000,
+    # Deprecated and ignored; the crop is no longer zoomed
+    zoom_factor: float = Query(0.5, deprecated=True),
+    y_shift: int = -200,
+    profile: str = "png",
+    rendition: str = "full"
+):
+    global reserved_slots
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job runner is not running")
+    if operation not in JOB_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation '{operation}'; expected one of {', '.join(JOB_OPERATIONS)}")
+    if opacity < 0 or opacity > 1:
+        raise HTTPException(status_code=400, detail="Opacity must be between 0 and 1")
+    check_encoding(profile, rendition)
+    if not files and not paths:
+        raise HTTPException(status_code=400, detail="Provide files or paths")
+
+    shared_inputs = [(os.path.basename(path), resolve_shared_path(path)) for path in paths or []]
+
+    # Check and reserve a slot with no await in between, so concurrent
+    # submissions can't all pass the check and overfill the queue while
+    # their uploads are being staged
+    if job_queue.maxsize and job_queue.qsize() + reserved_slots >= job_queue.maxsize:
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is full, retry later",
+            headers={"Retry-After": "30"}
+        )
+    reserved_slots += 1
+
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    try:
+        uploaded_inputs = await asyncio.to_thread(stage_uploads, files or [], os.path.join(job_dir, "inputs"))
+    except Exception as e:
+        print(f"Job {job_id}: staging uploads failed: {e}")
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=503,
+            detail="Could not stage the uploaded files, retry later",
+            headers={"Retry-After": "30"}
+        )
+    finally:
+        reserved_slots -= 1
+    inputs = uploaded_inputs + shared_inputs
+
+    job, prefix, archive_name = JOB_OPERATIONS[operation]
+    job_specs[job_id] = {
+        "inputs": inputs,
+        "job": job,
+        "args": job_args(operation, opacity, crop_width, crop_height, y_shift, profile, rendition),
+        "prefix": prefix,
+        "profile": profile,
+        "archive_name": archive_name
+    }
+    jobs[job_id] = {
+        "id": job_id,
+        "status": "queued",
+        "operation": operation,
+        "total": len(inputs),
+        "processed": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "files": [{"filename": filename, "status": "pending"} for filename, _ in inputs],
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "error": None
+    }
+    job_queue.put_nowait(job_id)
+    prune_jobs()
+
+    return {
+        "id": job_id,
+        "status": "queued",
+        "total": len(inputs),
+        "status_url": f"/jobs/{job_id}",
+        "archive_url": f"/jobs/{job_id}/archive"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/archive")
+async def get_job_archive(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    archive_name = JOB_OPERATIONS[job["operation"]][2]
+    return FileResponse(
+        os.path.join(JOBS_DIR, job_id, archive_name),
+        media_type="application/zip",
+        filename=archive_name
+    )
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
 
@@ -0,0 +1,144 @@
+"""
+Content-addressed cache for processed images.
+
+Entries are keyed on a hash of the input bytes, the operation and its
+parameters, and stored as files under a bounded directory. An in-memory
+index keeps LRU order and sizes so lookups and eviction never scan the
+disk; it is rebuilt from file modification times on start-up, and hits
+touch the file so the order survives restarts.
+
+Methods do blocking file I/O; call them through asyncio.to_thread.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+def content_digest(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+class ResultCache:
+    def __init__(self, directory: str, max_bytes: int, version: int = 1):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # Part of every key, so outputs from an older pipeline are never served
+        self.version = version
+        self.index: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, digest: str, operation: str, params: dict) -> str:
+        spec = json.dumps([self.version, digest, operation, params], sort_keys=True)
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _load(self):
+        # Rebuild the index from disk once, oldest first
+        self.loaded = True
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.glob("*/*"):
+            if path.name.endswith(".tmp"):
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self.index[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.index:
+            key, size = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self._path(key).unlink(missing_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        results = self.get_many({key: key})
+        return results[key] if results is not None else None
+
+    def get_many(self, keys: dict) -> Optional[dict]:
+        # All-or-nothing lookup of {name: key}, counted as a single lookup.
+        # Files are read outside the lock; one evicted in the meantime just
+        # turns the lookup into a miss.
+        if not self.enabled:
+            return None
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            if not all(key in self.index for key in keys.values()):
+                self.misses += 1
+                return None
+
+        results = {}
+        for name, key in keys.items():
+            path = self._path(key)
+            try:
+                results[name] = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                with self.lock:
+                    if key in self.index:
+                        self.total_bytes -= self.index.pop(key)
+                    self.misses += 1
+                return None
+
+        with self.lock:
+            for key in keys.values():
+                if key in self.index:
+                    self.index.move_to_end(key)
+            self.hits += 1
+        return results
+
+    def put(self, key: str, data: bytes):
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            if key in self.index:
+                self.index.move_to_end(key)
+                return
+            path = self._path(key)
+            tmp_path = path.with_name(f"{key}.tmp")
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Result cache write failed: {e}")
+                tmp_path.unlink(missing_ok=True)
+                return
+            self.index[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def put_many(self, entries: dict):
+        for key, data in entries.items():
+            self.put(key, data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,192 @@
+"""
+Streaming ZIP writer.
+
+Entries are emitted as soon as their data is available: a local file header
+with the data-descriptor flag set (so CRC and sizes can follow the data), the
+data itself, then the data descriptor. The central directory is written by
+finish(). ZIP64 records are used for entries, offsets or archives that don't
+fit the classic 32-bit fields.
+
+Only one entry's data is held at a time; deflated entries are compressed
+incrementally, so memory is bounded by the entry plus the zlib window.
+"""
+import struct
+import time
+import zlib
+from typing import Iterable, Iterator, List
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+
+def _dos_datetime(timestamp: float) -> tuple:
+    t = time.localtime(timestamp)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+class _Entry:
+    def __init__(self, name: bytes, method: int, offset: int, zip64: bool, timestamp: float):
+        self.name = name
+        self.method = method
+        self.offset = offset
+        self.zip64 = zip64
+        self.dos_time, self.dos_date = _dos_datetime(timestamp)
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+class ZipStream:
+    def __init__(self):
+        self.offset = 0
+        self.entries: List[_Entry] = []
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def add(self, name: str, data: bytes, compress: bool = False) -> Iterator[bytes]:
+        return self.add_stream(name, [data], compress, zip64=len(data) >= ZIP32_LIMIT)
+
+    def add_stream(
+        self,
+        name: str,
+        chunks: Iterable[bytes],
+        compress: bool = False,
+        zip64: bool = False
+    ) -> Iterator[bytes]:
+        # zip64 must be decided up front for streamed data of unknown size
+        entry = _Entry(
+            name.encode("utf-8"),
+            ZIP_DEFLATED if compress else ZIP_STORED,
+            self.offset,
+            zip64,
+            time.time()
+        )
+        self.entries.append(entry)
+
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+        placeholder = ZIP32_LIMIT if zip64 else 0
+        yield self._emit(struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            VERSION_ZIP64 if zip64 else VERSION_DEFAULT,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            entry.method,
+            entry.dos_time,
+            entry.dos_date,
+            0,
+            placeholder,
+            placeholder,
+            len(entry.name),
+            len(extra)
+        ) + entry.name + extra)
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if compress else None
+        for chunk in chunks:
+            entry.crc = zlib.crc32(chunk, entry.crc)
+            entry.size += len(chunk)
+            out = compressor.compress(chunk) if compressor else chunk
+            if out:
+                entry.compressed_size += len(out)
+                yield self._emit(out)
+        if compressor:
+            out = compressor.flush()
+            entry.compressed_size += len(out)
+            yield self._emit(out)
+
+        if not zip64 and max(entry.size, entry.compressed_size) >= ZIP32_LIMIT:
+            raise ValueError(f"{name} exceeds 4 GiB; add it with zip64=True")
+
+        if zip64:
+            descriptor = struct.pack("<IIQQ", 0x08074B50, entry.crc, entry.compressed_size, entry.size)
+        else:
+            descriptor = struct.pack("<IIII", 0x08074B50, entry.crc, entry.compressed_size, entry.size)
+        yield self._emit(descriptor)
+
+    def finish(self) -> bytes:
+        central_directory = bytearray()
+        for entry in self.entries:
+            zip64_fields = []
+            size = entry.size
+            compressed_size = entry.compressed_size
+            offset = entry.offset
+            if entry.zip64 or size >= ZIP32_LIMIT:
+                zip64_fields.append(size)
+                size = ZIP32_LIMIT
+            if entry.zip64 or compressed_size >= ZIP32_LIMIT:
+                zip64_fields.append(compressed_size)
+                compressed_size = ZIP32_LIMIT
+            if offset >= ZIP32_LIMIT:
+                zip64_fields.append(offset)
+                offset = ZIP32_LIMIT
+
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+            version = VERSION_ZIP64 if zip64_fields else VERSION_DEFAULT
+
+            central_directory += struct.pack(
+                "<IHHHHHHIIIHHHHHII",
+                0x02014B50,
+                (3 << 8) | version,  # made by: Unix
+                version,
+                FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+                entry.method,
+                entry.dos_time,
+                entry.dos_date,
+                entry.crc,
+                compressed_size,
+                size,
+                len(entry.name),
+                len(extra),
+                0,
+                0,
+                0,
+                0o100644 << 16,  # regular file, rw-r--r--
+                offset
+            ) + entry.name + extra
+
+        cd_offset = self.offset
+        cd_size = len(central_directory)
+        count = len(self.entries)
+        tail = bytearray(central_directory)
+
+        if count > ZIP32_MAX_ENTRIES or cd_offset >= ZIP32_LIMIT or cd_size >= ZIP32_LIMIT:
+            zip64_eocd_offset = cd_offset + cd_size
+            tail += struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50,
+                44,
+                (3 << 8) | VERSION_ZIP64,
+                VERSION_ZIP64,
+                0,
+                0,
+                count,
+                count,
+                cd_size,
+                cd_offset
+            )
+            tail += struct.pack("<IIQI", 0x07064B50, 0, zip64_eocd_offset, 1)
+
+        tail += struct.pack(
+            "<IHHHHIIH",
+            0x06054B50,
+            0,
+            0,
+            min(count, ZIP32_MAX_ENTRIES),
+            min(count, ZIP32_MAX_ENTRIES),
+            min(cd_size, ZIP32_LIMIT),
+            min(cd_offset, ZIP32_LIMIT),
+            0
+        )
+
+        return self._emit(bytes(tail))
@@ -1,7 +1,19 @@
 from fastapi.testclient import TestClient
 from PIL import Image
+import asyncio
+import base64
+import hashlib
 import io
+import json
+import os
+import time
+import zipfile
+import zlib
+import image_kernels
+import main
 from main import app
+from result_cache import ResultCache
+from streaming_zip import ZipStream
 
 client = TestClient(app)
 
@@ -23,6 +35,7 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
     assert response.json()["service"] == "image-processing"
+    assert response.json()["workers"] >= 1
 
 def test_process_opacity():
     test_img = create_test_image()
@@ -73,7 +86,8 @@ def test_process_all_variants():
     test_img = create_test_image()
     response = client.post(
         "/process/all?opacity=0.5",
-        files={"file": ("test.png", test_img, "image/png")}
+        files={"file": ("test.png", test_img, "image/png")},
+        headers={"Accept": "application/json"}
     )
     assert response.status_code == 200
     data = response.json()
@@ -81,6 +95,34 @@ def test_process_all_variants():
     assert "opacity" in data["variants"]
     assert "grayscale" in data["variants"]
     assert "circular" in data["variants"]
+    assert len(data["variants"]["opacity"]["sha256"]) == 64
+
+def parse_multipart(response) -> dict:
+    boundary = response.headers["content-type"].split("boundary=")[1]
+    parts = {}
+    for chunk in response.content.split(f"--{boundary}".encode())[1:-1]:
+        head, _, body = chunk[2:-2].partition(b"\r\n\r\n")
+        headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n"))
+        name = headers["Content-Disposition"].split('name="')[1].split('"')[0]
+        parts[name] = (headers, body)
+    return parts
+
+def test_process_all_returns_variants_as_multipart():
+    response = client.post(
+        "/process/all?opacity=0.5",
+        files={"file": ("test.png", create_test_image(), "image/png")}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("multipart/mixed; boundary=")
+
+    parts = parse_multipart(response)
+    assert list(parts) == ["opacity", "grayscale", "circular"]
+    for headers, body in parts.values():
+        assert headers["Content-Type"] == "image/png"
+        assert int(headers["Content-Length"]) == len(body)
+        digest = base64.b64encode(hashlib.sha256(body).digest()).decode()
+        assert headers["Content-Digest"] == f"sha-256=:{digest}:"
+        Image.open(io.BytesIO(body)).verify()
 
 def test_invalid_file():
     response = client.post(
@@ -90,3 +132,333 @@ def test_invalid_file():
     assert response.status_code == 500
     assert "Image processing failed" in response.json()["detail"]
 
+
+def test_transforms_run_in_worker_processes():
+    worker_pid = asyncio.run(main.run_in_pool(os.getpid))
+    assert worker_pid != os.getpid()
+
+def test_batch_grayscale():
+    response = client.post(
+        "/process/batch/grayscale",
+        files=[
+            ("files", ("a.png", create_test_image(), "image/png")),
+            ("files", ("b.png", create_test_image(), "image/png"))
+        ]
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.namelist() == ["bw_a.png", "bw_b.png", "manifest.json"]
+
+def test_batch_all_reports_failures_in_manifest():
+    response = client.post(
+        "/process/batch/all",
+        files=[
+            ("files", ("a.png", create_test_image(), "image/png")),
+            ("files", ("broken.png", io.BytesIO(b"not an image"), "image/png")),
+            ("files", ("c.png", create_test_image(), "image/png"))
+        ]
+    )
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+        manifest = json.loads(archive.read("manifest.json"))
+
+    assert names[:3] == ["opacity_a.png", "grayscale_a.png", "circular_a.png"]
+    assert names[3:6] == ["opacity_c.png", "grayscale_c.png", "circular_c.png"]
+    assert manifest["succeeded"] == 2
+    assert manifest["failed"] == 1
+    assert [entry["filename"] for entry in manifest["files"]] == ["a.png", "broken.png", "c.png"]
+    assert manifest["files"][1]["status"] == "error"
+
+def test_batch_zip_stores_pngs_and_deflates_manifest():
+    response = client.post(
+        "/process/batch/opacity",
+        files=[("files", ("a.png", create_test_image(), "image/png"))]
+    )
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        assert archive.getinfo("opacity_a.png").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("manifest.json").compress_type == zipfile.ZIP_DEFLATED
+        Image.open(io.BytesIO(archive.read("opacity_a.png"))).verify()
+
+def test_streaming_zip_zip64_entries():
+    archive = ZipStream()
+    data = b"angel" * 1000
+    body = b"".join(archive.add_stream("big.bin", [data[:100], data[100:]], zip64=True))
+    body += b"".join(archive.add("small.txt", b"hello", compress=True))
+    body += archive.finish()
+
+    with zipfile.ZipFile(io.BytesIO(body)) as result:
+        assert result.testzip() is None
+        assert result.read("big.bin") == data
+        assert result.read("small.txt") == b"hello"
+
+def test_all_variants_match_single_transforms():
+    img = Image.open(create_test_image())
+    variants = main.all_variants(img, 0.5)
+
+    assert variants["opacity"].tobytes() == main.reduce_opacity(img, 0.5).tobytes()
+    assert variants["grayscale"].tobytes() == main.convert_to_grayscale(img).tobytes()
+    assert variants["circular"].size == (1000, 1000)
+    assert variants["circular"].getpixel((0, 0))[3] == 0
+
+def test_grayscale_preserves_alpha():
+    img = Image.new("RGBA", (4, 4), (200, 100, 50, 80))
+    result = main.convert_to_grayscale(img)
+    r, g, b, a = result.getpixel((1, 1))
+    assert r == g == b == img.convert("L").getpixel((1, 1))
+    assert a == 80
+
+def test_opacity_kernel_matches_point_lookup():
+    img = Image.new("RGBA", (16, 16))
+    img.putdata([(i, i, i, i) for i in range(256)])
+    expected = img.getchannel("A").point(lambda p: int(p * 0.3))
+    assert main.reduce_opacity(img, 0.3).getchannel("A").tobytes() == expected.tobytes()
+
+def test_circle_mask_is_cached_and_antialiased():
+    mask = image_kernels.circle_mask(64, 64)
+    assert image_kernels.circle_mask(64, 64) is mask
+    assert mask[32, 32] == 255
+    assert mask[0, 0] == 0
+    assert 0 < mask[32, 0] < 255 or 0 < mask[32, 1] < 255
+
+def test_repeated_requests_hit_result_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "result_cache", ResultCache(str(tmp_path), 10 * 1024 * 1024))
+
+    first = client.post("/process/grayscale", files={"file": ("a.png", create_test_image(), "image/png")})
+    second = client.post("/process/grayscale", files={"file": ("a.png", create_test_image(), "image/png")})
+    assert second.content == first.content
+
+    stats = client.get("/health").json()["cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+def test_all_variants_populate_single_variant_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "result_cache", ResultCache(str(tmp_path), 10 * 1024 * 1024))
+
+    client.post("/process/all?opacity=0.3", files={"file": ("a.png", create_test_image(), "image/png")})
+    response = client.post("/process/opacity?opacity=0.3", files={"file": ("a.png", create_test_image(), "image/png")})
+
+    assert response.status_code == 200
+    assert main.result_cache.hits == 1
+
+def test_zoom_factor_is_not_part_of_the_circular_cache_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "result_cache", ResultCache(str(tmp_path), 10 * 1024 * 1024))
+
+    client.post("/process/circular?zoom_factor=0.5", files={"file": ("a.png", create_test_image(), "image/png")})
+    response = client.post("/process/circular?zoom_factor=0.9", files={"file": ("a.png", create_test_image(), "image/png")})
+
+    assert response.status_code == 200
+    assert main.result_cache.hits == 1
+
+def test_downscaled_all_variants_keep_their_own_cache_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "result_cache", ResultCache(str(tmp_path), 10 * 1024 * 1024))
+
+    client.post("/process/all?opacity=0.3&rendition=thumbnail", files={"file": ("a.png", create_test_image(), "image/png")})
+    response = client.post("/process/opacity?opacity=0.3&rendition=thumbnail", files={"file": ("a.png", create_test_image(), "image/png")})
+
+    assert response.status_code == 200
+    assert main.result_cache.hits == 0
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), 25)
+    cache.put("a" * 64, b"x" * 10)
+    cache.put("b" * 64, b"x" * 10)
+    assert cache.get("a" * 64) == b"x" * 10
+    cache.put("c" * 64, b"x" * 10)
+
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) is not None
+    assert cache.total_bytes == 20
+
+    reloaded = ResultCache(str(tmp_path), 25)
+    assert reloaded.get("c" * 64) == b"x" * 10
+    assert reloaded.stats()["entries"] == 2
+
+def test_webp_thumbnail_profile():
+    img = Image.new("RGBA", (1200, 800), (10, 200, 30, 255))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    buffer.seek(0)
+
+    response = client.post(
+        "/process/opacity?profile=webp&rendition=thumbnail",
+        files={"file": ("big.png", buffer, "image/png")}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "opacity_big.webp" in response.headers["content-disposition"]
+    result = Image.open(io.BytesIO(response.content))
+    assert result.format == "WEBP"
+    assert result.size == (240, 160)
+
+def test_unknown_profile_rejected():
+    response = client.post(
+        "/process/grayscale?profile=gif",
+        files={"file": ("test.png", create_test_image(), "image/png")}
+    )
+    assert response.status_code == 400
+
+def png_with_declared_size(width: int, height: int) -> bytes:
+    # A tiny PNG whose header claims width x height
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, format="PNG")
+    data = bytearray(buffer.getvalue())
+    data[16:24] = width.to_bytes(4, "big") + height.to_bytes(4, "big")
+    data[29:33] = zlib.crc32(bytes(data[12:29])).to_bytes(4, "big")
+    return bytes(data)
+
+def test_decompression_bomb_rejected_from_header():
+    response = client.post(
+        "/process/grayscale",
+        files={"file": ("bomb.png", io.BytesIO(png_with_declared_size(8000, 8000)), "image/png")}
+    )
+    assert response.status_code == 413
+    assert "pixels" in response.json()["detail"]
+
+def test_oversized_upload_rejected(monkeypatch):
+    monkeypatch.setattr(main, "MAX_INPUT_BYTES", 100)
+    response = client.post(
+        "/process/grayscale",
+        files={"file": ("test.png", create_test_image(), "image/png")}
+    )
+    assert response.status_code == 413
+
+def test_downscale_uses_jpeg_draft_and_reduce():
+    buffer = io.BytesIO()
+    Image.new("RGB", (2400, 1600), "blue").save(buffer, format="JPEG")
+    img, scale = main.downscale(main.open_image(buffer.getvalue()), 10)
+    assert img.size == (300, 200)
+    assert scale == 8
+
+    buffer = io.BytesIO()
+    Image.new("RGBA", (2400, 1600), "blue").save(buffer, format="PNG")
+    img, scale = main.downscale(main.open_image(buffer.getvalue()), 10)
+    assert img.size == (240, 160)
+    assert scale == 10
+
+def test_circular_thumbnail_scales_crop_geometry():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (3000, 4000), "red").save(buffer, format="PNG")
+    result = Image.open(io.BytesIO(main.circular_job(buffer.getvalue(), 1000, 1000, -300, "png", "thumbnail")))
+    assert result.size == (240, 240)
+    assert result.getpixel((120, 120))[3] == 255
+    assert result.getpixel((0, 0))[3] == 0
+
+def wait_for_job(job_client, job_id: str) -> dict:
+    for _ in range(200):
+        job = job_client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_job_processes_uploads_in_background(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "JOBS_DIR", str(tmp_path))
+    with TestClient(app) as job_client:
+        response = job_client.post(
+            "/jobs?operation=grayscale",
+            files=[
+                ("files", ("a.png", create_test_image(), "image/png")),
+                ("files", ("bad.png", b"not an image", "image/png"))
+            ]
+        )
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        job = wait_for_job(job_client, job_id)
+        assert job["status"] == "done"
+        assert (job["total"], job["processed"], job["succeeded"], job["failed"]) == (2, 2, 1, 1)
+        assert [f["status"] for f in job["files"]] == ["ok", "error"]
+
+        archive = job_client.get(f"/jobs/{job_id}/archive")
+        assert archive.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(archive.content)) as zf:
+            assert "bw_a.png" in zf.namelist()
+
+def test_job_reads_paths_from_shared_directory(monkeypatch, tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    (shared / "angel.png").write_bytes(create_test_image().getvalue())
+    monkeypatch.setattr(main, "JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(main, "SHARED_INPUT_DIR", str(shared))
+    with TestClient(app) as job_client:
+        response = job_client.post("/jobs?operation=opacity", data={"paths": ["angel.png"]})
+        assert response.status_code == 202
+        job = wait_for_job(job_client, response.json()["id"])
+        assert job["succeeded"] == 1
+
+        response = job_client.post("/jobs", data={"paths": ["../jobs"]})
+        assert response.status_code == 400
+
+def test_missing_input_fails_only_its_job(monkeypatch, tmp_path):
+    # The shared file is gone by the time the runner opens it
+    monkeypatch.setattr(main, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "SHARED_INPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "resolve_shared_path", lambda path: str(tmp_path / "deleted.png"))
+    with TestClient(app) as job_client:
+        missing = job_client.post("/jobs", data={"paths": ["deleted.png"]}).json()["id"]
+        ok = job_client.post("/jobs", files={"files": ("a.png", create_test_image(), "image/png")}).json()["id"]
+
+        job = wait_for_job(job_client, missing)
+        assert job["status"] == "failed"
+        assert "deleted.png" in job["error"]
+        assert wait_for_job(job_client, ok)["status"] == "done"
+
+def test_job_queue_full_returns_503(monkeypatch, tmp_path):
+    # No runners, so the single queue slot is never drained
+    monkeypatch.setattr(main, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "JOB_QUEUE_SIZE", 1)
+    monkeypatch.setattr(main, "JOB_RUNNERS", 0)
+    with TestClient(app) as job_client:
+        responses = [
+            job_client.post("/jobs", files={"files": ("a.png", create_test_image(), "image/png")})
+            for _ in range(2)
+        ]
+        assert [r.status_code for r in responses] == [202, 503]
+        assert responses[1].headers["Retry-After"] == "30"
+        assert job_client.get(f"/jobs/{responses[0].json()['id']}").json()["status"] == "queued"
+
+def test_queue_slot_is_reserved_while_staging(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "JOB_QUEUE_SIZE", 1)
+    monkeypatch.setattr(main, "JOB_RUNNERS", 0)
+    stage_uploads = main.stage_uploads
+    concurrent = []
+
+    with TestClient(app) as job_client:
+        def stage_with_concurrent_submit(files, inputs_dir):
+            # Another submission arrives while this one is still staging
+            if not concurrent:
+                concurrent.append(job_client.post("/jobs", files={"files": ("b.png", create_test_image(), "image/png")}))
+            return stage_uploads(files, inputs_dir)
+
+        monkeypatch.setattr(main, "stage_uploads", stage_with_concurrent_submit)
+        response = job_client.post("/jobs", files={"files": ("a.png", create_test_image(), "image/png")})
+
+        assert response.status_code == 202
+        assert concurrent[0].status_code == 503
+        assert main.job_queue.qsize() == 1
+        assert main.reserved_slots == 0
+
+def test_staging_failure_returns_503_and_cleans_up(monkeypatch, tmp_path):
+    def fail(files, inputs_dir):
+        os.makedirs(inputs_dir)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(main, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "stage_uploads", fail)
+    with TestClient(app) as job_client:
+        jobs_before = len(main.jobs)
+        response = job_client.post("/jobs", files={"files": ("a.png", create_test_image(), "image/png")})
+        assert response.status_code == 503
+        assert len(main.jobs) == jobs_before
+        assert list(tmp_path.iterdir()) == []
+        assert main.reserved_slots == 0
+
+def test_unknown_job_returns_404():
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/archive").status_code == 404
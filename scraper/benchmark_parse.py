@@ -0,0 +1,118 @@
+"""
+Parse-time benchmark for product pages.
+
+    python benchmark_parse.py --series 40 --thumbs 12 --repeat 20
+    python benchmark_parse.py --file saved_products_page.html
+
+Times what one product page used to cost against gallery_parser:
+
+bs4 discover + scrape: BeautifulSoup with html.parser, parsed once to find
+the galleries (discover_galleries.py) and once more to read their fg-thumb
+items (scrape_images.py).
+
+bs4 single parse: the same lookups on one BeautifulSoup/html.parser tree.
+
+lxml single pass: gallery_parser.parse_galleries.
+
+Without --file, a synthetic page with --series galleries of --thumbs items
+each is generated, padded with markup the real page carries around them.
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from gallery_parser import parse_galleries
+
+
+def make_page(series: int, thumbs: int) -> bytes:
+    sections = []
+    for s in range(series):
+        items = "".join(
+            f'<div class="fg-item"><figure class="fg-item-inner">'
+            f'<a class="fg-thumb" href="https://example.com/img/{s}/{t}.png" data-caption-title="Angel {s}-{t}">'
+            f'<span class="fg-image-wrap"><img class="fg-image" src="https://example.com/img/{s}/{t}-150x150.png" '
+            f'width="150" height="150" alt="Angel {s}-{t}"></span></a>'
+            f'<figcaption class="fg-caption"><div class="fg-caption-inner">Angel {s}-{t}</div></figcaption>'
+            f"</figure></div>"
+            for t in range(thumbs)
+        )
+        sections.append(
+            f'<h2 class="tabtitle">Series {s} (~2019)</h2>'
+            f'<div class="tabcontent"><p>Released {2000 + s}.</p>'
+            f'<div class="foogallery fg-default fg-gutter-10" id="foogallery-gallery-{s}">{items}</div></div>'
+        )
+    nav = "".join(f'<li class="menu-item"><a href="/en/{i}/">Item {i}</a></li>' for i in range(200))
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Products</title></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header><main>{''.join(sections)}</main>"
+        f"<footer><ul>{nav}</ul></footer></body></html>"
+    ).encode()
+
+
+def bs4_galleries(soup: BeautifulSoup) -> dict:
+    # discover_galleries.py's lookup followed by scrape_images.py's
+    galleries = {}
+    for title_tag in soup.find_all("h2", class_="tabtitle"):
+        tabcontent = title_tag.find_next_sibling("div", class_="tabcontent")
+        gallery = tabcontent.find("div", class_="foogallery") if tabcontent else None
+        if gallery and gallery.get("id"):
+            galleries[gallery["id"]] = {"series_name": title_tag.get_text(strip=True), "items": []}
+    for gallery_id, gallery in galleries.items():
+        section = soup.find("div", id=gallery_id)
+        for item in section.find_all("a", class_="fg-thumb"):
+            if item.get("href") and item.get("data-caption-title"):
+                gallery["items"].append({"url": item["href"], "title": item["data-caption-title"]})
+    return galleries
+
+
+def bs4_discover_and_scrape(page: bytes) -> dict:
+    bs4_galleries(BeautifulSoup(page, "html.parser"))
+    return bs4_galleries(BeautifulSoup(page, "html.parser"))
+
+
+def bs4_single_parse(page: bytes) -> dict:
+    return bs4_galleries(BeautifulSoup(page, "html.parser"))
+
+
+def time_per_page(parse, page: bytes, repeat: int) -> float:
+    parse(page)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(page)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark product page parsing")
+    parser.add_argument("--file", help="saved product page to parse instead of a synthetic one")
+    parser.add_argument("--series", type=int, default=40)
+    parser.add_argument("--thumbs", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            page = f.read()
+    else:
+        page = make_page(args.series, args.thumbs)
+
+    galleries = parse_galleries(page)
+    items = sum(len(gallery["items"]) for gallery in galleries.values())
+    # The single pass has to find exactly what the old lookups found
+    assert galleries == bs4_single_parse(page), "parsers disagree"
+    print(f"Page: {len(page) / 1024:.0f} KB, {len(galleries)} galleries, {items} items")
+
+    baseline = None
+    for label, parse in (
+        ("bs4 discover + scrape", bs4_discover_and_scrape),
+        ("bs4 single parse", bs4_single_parse),
+        ("lxml single pass", parse_galleries),
+    ):
+        seconds = time_per_page(parse, page, args.repeat)
+        baseline = baseline or seconds
+        print(f"  {label:<22} {seconds * 1000:8.1f} ms/page  {baseline / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,16 @@ Sonny Angel Gallery Discovery Tool
 
 Discovers all series and gallery IDs from the official Sonny Angel website.
 Outputs a gallery_config.json file for use with scrape_images.py.
+(scrape_images.py --discover does both in one pass.)
 """
 
 import requests
-from bs4 import BeautifulSoup
 import json
 import time
 import sys
 
+from gallery_parser import parse_galleries
+
 PRODUCT_TYPE_URLS = {
     "regular": ("Mini Figure (Regular)", "https://www.sonnyangel.com/en/products/")
     # "gift": ("Mini Figure (Gift)", "https://www.sonnyangel.com/en/products/mini-figure-gift/"),
@@ -33,28 +35,13 @@ def discover_galleries_from_page(url: str) -> list[dict]:
         print(f"Failed to fetch {url}: {e}")
         return []
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    series_titles = soup.find_all("h2", class_="tabtitle")
     discovered_galleries = []
 
-    for title_tag in series_titles:
-        series_name = title_tag.get_text(strip=True)
-        tabcontent = title_tag.find_next_sibling("div", class_="tabcontent")
-
-        if not tabcontent:
-            print(f"  Warning: No tabcontent found for series '{series_name}'")
-            continue
-
-        gallery = tabcontent.find("div", class_="foogallery")
-
-        if not gallery:
-            print(f"  Warning: No gallery found for series '{series_name}'")
-            continue
-
-        gallery_id = gallery.get("id")
+    for gallery_id, gallery in parse_galleries(response.content).items():
+        series_name = gallery["series_name"]
 
-        if not gallery_id:
-            print(f"  Warning: Gallery has no ID for series '{series_name}'")
+        if not series_name:
+            print(f"  Warning: No series title found for gallery '{gallery_id}'")
             continue
 
         discovered_galleries.append({
@@ -0,0 +1,55 @@
+"""
+Single-pass gallery extraction for Sonny Angel product pages.
+
+A product page lists each series as an h2.tabtitle followed by a
+div.tabcontent holding a div.foogallery, whose a.fg-thumb links point at the
+angel images. parse_galleries() walks the lxml tree once and returns both the
+gallery IDs (what discover_galleries.py needs) and every gallery's items
+(what scrape_images.py needs), so a page is only ever parsed once.
+"""
+
+from lxml import etree, html
+
+
+def _classes(element) -> list[str]:
+    return element.get("class", "").split()
+
+
+def parse_galleries(page: bytes | str) -> dict:
+    """
+    Extract every gallery on a product page.
+
+    Returns {gallery_id: {"series_name": title or None, "items": [{"url", "title"}]}}
+    in page order. A gallery's series name is the nearest h2.tabtitle before it.
+    """
+    root = html.document_fromstring(page)
+    galleries = {}
+    open_galleries = []
+    title = None
+
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        if not isinstance(element.tag, str):
+            # Comments and processing instructions
+            continue
+        if event == "end":
+            if open_galleries and open_galleries[-1][0] is element:
+                open_galleries.pop()
+            continue
+
+        if element.tag == "h2" and "tabtitle" in _classes(element):
+            # Same text as BeautifulSoup's get_text(strip=True), so series
+            # folder names don't change
+            title = "".join(text.strip() for text in element.itertext())
+        elif element.tag == "div" and "foogallery" in _classes(element):
+            gallery = {"series_name": title, "items": []}
+            title = None
+            if element.get("id"):
+                galleries.setdefault(element.get("id"), gallery)
+            open_galleries.append((element, gallery))
+        elif element.tag == "a" and open_galleries and "fg-thumb" in _classes(element):
+            url = element.get("href")
+            caption = element.get("data-caption-title")
+            if url and caption:
+                open_galleries[-1][1]["items"].append({"url": url, "title": caption})
+
+    return galleries
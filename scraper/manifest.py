@@ -0,0 +1,77 @@
+"""
+Processing manifest for process_images.py
+
+Records, per source image, its size, mtime and content hash, the
+parameters it was processed with and the hash of every output written, in
+the `processed` table of asset_manifest.sqlite. The backend's upload script
+and asset pipeline keep their own tables in the same file.
+
+A row is written (and committed) only after all of an image's outputs are
+on disk, so an interrupted run redoes at most the images it was working on.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+    source_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    processed_at TEXT NOT NULL
+)
+"""
+
+
+class ProcessingManifest:
+    def __init__(self, path: str = "asset_manifest.sqlite"):
+        self.path = Path(path)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def _decode(self, row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        entry["params"] = json.loads(entry["params"])
+        entry["outputs"] = json.loads(entry["outputs"])
+        return entry
+
+    def all(self) -> dict:
+        """Every row, keyed by source path, with params and outputs decoded."""
+        return {row["source_path"]: self._decode(row) for row in self.db.execute("SELECT * FROM processed")}
+
+    def get(self, source_path: str) -> Optional[dict]:
+        row = self.db.execute("SELECT * FROM processed WHERE source_path = ?", (source_path,)).fetchone()
+        return self._decode(row) if row else None
+
+    def record(self, source_path: str, size: int, mtime_ns: int, content_hash: str, params: dict, outputs: dict):
+        """Store a finished image: its inputs and {output path: sha256}."""
+        self.db.execute(
+            """
+            INSERT OR REPLACE INTO processed
+                (source_path, size, mtime_ns, content_hash, params, outputs, processed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                source_path,
+                size,
+                mtime_ns,
+                content_hash,
+                json.dumps(params, sort_keys=True),
+                json.dumps(outputs, sort_keys=True),
+                datetime.utcnow().isoformat(),
+            ),
+        )
+        self.db.commit()
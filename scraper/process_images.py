@@ -7,58 +7,172 @@ Creates image variants for each angel:
 - Circular crop (for profile pictures)
 """
 
+import argparse
+import hashlib
+import io
 import os
-from PIL import Image, ImageDraw
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from PIL import Image
+
+from manifest import ProcessingManifest
+
+# The variant transforms are the image service's, so both produce the same
+# outputs
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "image-service"))
+from image_kernels import circle_mask, convert_to_circular, convert_to_grayscale, reduce_opacity
+
+# Bump when a transform changes so every image is reprocessed once
+PROCESSING_VERSION = 2
+
+
+# Encoding profiles: output format and size/speed trade-off (same names as
+# the image service)
+PROFILES = {
+    "png": ("PNG", "png", {"compress_level": 6}),
+    "png_fast": ("PNG", "png", {"compress_level": 1}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "webp_lossless": ("WEBP", "webp", {"lossless": True, "quality": 80, "method": 4}),
+}
+
+# Maximum width per size rendition. Renditions are written next to the
+# full-size folders with the rendition as a suffix, e.g.
+# images_bw_thumbnail/<series>/<name>.webp, which is the layout the backend
+# builds srcset URLs from.
+RENDITIONS = {
+    "thumbnail": 240,
+    "card": 480,
+}
+
+
+def resize_for_rendition(img: Image.Image, max_width: int) -> Image.Image:
+    """Downscale to max_width, keeping the aspect ratio."""
+    if img.width <= max_width:
+        return img
+    height = max(1, round(img.height * max_width / img.width))
+    return img.resize((max_width, height), Image.LANCZOS)
+
+
+def save_image(img: Image.Image, directory: Path, stem: str, profile: str) -> tuple:
+    """Save an image with an encoding profile. Returns (path, sha256 of the file)."""
+    image_format, extension, options = PROFILES[profile]
+    buffer = io.BytesIO()
+    img.save(buffer, image_format, **options)
+    data = buffer.getvalue()
+
+    # Write to a temporary name and rename, so an interrupted run never
+    # leaves a truncated file behind
+    path = directory / f"{stem}.{extension}"
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return path, hashlib.sha256(data).hexdigest()
+
+
+def processing_params(profile: str, renditions: tuple, rendition_profile: str) -> dict:
+    """Everything besides the source bytes that determines the outputs."""
+    return {
+        "version": PROCESSING_VERSION,
+        "profile": profile,
+        "renditions": {name: RENDITIONS[name] for name in renditions},
+        "rendition_profile": rendition_profile,
+    }
 
-def reduce_opacity(img: Image.Image, opacity: float = 0.5) -> Image.Image:
-    """Reduce image opacity."""
-    img = img.convert("RGBA")
-    r, g, b, a = img.split()
-    a = a.point(lambda p: int(p * opacity))
-    return Image.merge("RGBA", (r, g, b, a))
-
-
-def convert_to_grayscale(img: Image.Image) -> Image.Image:
-    """Convert image to grayscale while preserving alpha."""
-    return img.convert("L").convert("RGBA")
-
-
-def convert_to_circular(img: Image.Image, crop_width: int = 1000, crop_height: int = 1000, zoom_factor: float = 0.5, y_shift: int = -300) -> Image.Image:
-    img = img.convert("RGBA")
-    img_width, img_height = img.size
-
-    x_center = img_width // 2
-    y_center = img_height // 2 + y_shift
-
-    left = x_center - crop_width // 2
-    top = y_center - crop_height // 2
-    right = x_center + crop_width // 2
-    bottom = y_center + crop_height // 2
-
-    top = max(0, top)
-    bottom = min(img_height, bottom)
-
-    cropped_img = img.crop((left, top, right, bottom))
-
-    zoomed_width = int(crop_width * zoom_factor)
-    zoomed_height = int(crop_height * zoom_factor)
-    cropped_img = cropped_img.resize((zoomed_width, zoomed_height), Image.LANCZOS)
-
-    mask = Image.new("L", (zoomed_width, zoomed_height), 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, zoomed_width, zoomed_height), fill=255)
-
-    circular_img = Image.new("RGBA", (zoomed_width, zoomed_height), (0, 0, 0, 0))
-    circular_img.paste(cropped_img, (0, 0), mask)
-
-    circular_img = circular_img.resize((crop_width, crop_height), Image.LANCZOS)
-    return circular_img
 
+def outputs_current(entry: dict, params: dict) -> bool:
+    """Whether a manifest entry's outputs were made with these params and still exist."""
+    return entry["params"] == params and all(Path(output).exists() for output in entry["outputs"])
+
+
+def process_image(
+    img: Image.Image,
+    series_name: str,
+    stem: str,
+    output_dirs: dict,
+    rendition_dirs: dict,
+    profile: str,
+    rendition_profile: str,
+) -> dict:
+    """Write every variant and rendition of one image. Returns {output path: sha256}."""
+    variants = {
+        "bw": convert_to_grayscale(img),
+        "opacity": reduce_opacity(img, 0.5),
+        "profile_pic": convert_to_circular(img),
+    }
 
-def process_all_images(input_dir: str = "images"):
-    """Process all images and create variants."""
+    outputs = {}
+    for name, variant in variants.items():
+        path, digest = save_image(variant, output_dirs[name] / series_name, stem, profile)
+        outputs[str(path)] = digest
+
+    for (name, rendition), output_base in rendition_dirs.items():
+        source = img if name == "original" else variants[name]
+        path, digest = save_image(
+            resize_for_rendition(source, RENDITIONS[rendition]),
+            output_base / series_name,
+            stem,
+            rendition_profile,
+        )
+        outputs[str(path)] = digest
+    return outputs
+
+
+# Output layout and encodings for process_task, set once per worker process
+# by init_worker (and in the parent for --workers 1)
+_worker_config = {}
+
+
+def init_worker(output_dirs: dict, rendition_dirs: dict, profile: str, rendition_profile: str):
+    """Pool initializer: store the run's settings and build the circle mask once."""
+    _worker_config.update(
+        output_dirs=output_dirs,
+        rendition_dirs=rendition_dirs,
+        profile=profile,
+        rendition_profile=rendition_profile,
+    )
+    # Every default profile picture uses the same mask; lru_cache keeps it
+    # for the life of the worker
+    circle_mask(1000, 1000)
+
+
+def process_task(task: tuple) -> tuple:
+    """
+    Process one source image in a worker.
+
+    task is (source_path, image_file, series_name). Returns
+    (source_path, content_hash, outputs, size in bytes, error).
+    """
+    source_path, image_file, series_name = task
+    try:
+        data = Path(image_file).read_bytes()
+        img = Image.open(io.BytesIO(data)).convert("RGBA")
+        outputs = process_image(
+            img,
+            series_name,
+            Path(image_file).stem,
+            _worker_config["output_dirs"],
+            _worker_config["rendition_dirs"],
+            _worker_config["profile"],
+            _worker_config["rendition_profile"],
+        )
+        return source_path, hashlib.sha256(data).hexdigest(), outputs, len(data), None
+    except Exception as e:
+        return source_path, None, None, 0, str(e)
+
+
+def process_all_images(
+    input_dir: str = "images",
+    profile: str = "png",
+    renditions: tuple = ("thumbnail", "card"),
+    rendition_profile: str = "webp",
+    manifest_path: str = "asset_manifest.sqlite",
+    force: bool = False,
+    workers: int = 1,
+):
+    """Process all new or changed images and create variants."""
     input_path = Path(input_dir)
 
     if not input_path.exists():
@@ -72,47 +186,125 @@ def process_all_images(input_dir: str = "images"):
         "profile_pic": Path("images_profile_pic"),
     }
 
-    for dir_path in output_dirs.values():
+    # The original image gets renditions too; its full size is the source
+    rendition_dirs = {
+        (name, rendition): Path(f"{base}_{rendition}")
+        for name, base in {"original": input_path, **output_dirs}.items()
+        for rendition in renditions
+    }
+
+    for dir_path in [*output_dirs.values(), *rendition_dirs.values()]:
         dir_path.mkdir(exist_ok=True)
 
-    processed_count = 0
+    params = processing_params(profile, renditions, rendition_profile)
+    manifest = ProcessingManifest(manifest_path)
+    known = manifest.all()
 
-    for series_dir in input_path.iterdir():
-        if not series_dir.is_dir():
-            continue
+    # Decide what to do in the parent, which owns the manifest; workers only
+    # transform and write files
+    tasks = []
+    stats = {}
+    skipped_count = 0
 
+    for series_dir in sorted(p for p in input_path.iterdir() if p.is_dir()):
         series_name = series_dir.name
-        print(f"\nProcessing: {series_name}")
 
-        for output_type, output_base in output_dirs.items():
+        for output_base in [*output_dirs.values(), *rendition_dirs.values()]:
             (output_base / series_name).mkdir(exist_ok=True)
 
-        for image_file in series_dir.glob("*.png"):
-            try:
-                img = Image.open(image_file).convert("RGBA")
-                filename = image_file.name
-
-                bw_img = convert_to_grayscale(img.copy())
-                bw_img.save(output_dirs["bw"] / series_name / filename, "PNG")
-
-                opacity_img = reduce_opacity(img.copy(), 0.5)
-                opacity_img.save(output_dirs["opacity"] / series_name / filename, "PNG")
-
-                profile_img = convert_to_circular(img.copy())
-                profile_img.save(
-                    output_dirs["profile_pic"] / series_name / filename, "PNG"
-                )
-
-                print(f"  Processed: {filename}")
-                processed_count += 1
-
-            except Exception as e:
-                print(f"  Error processing {image_file}: {e}")
+        for image_file in sorted(series_dir.glob("*.png")):
+            source_path = f"{series_name}/{image_file.name}"
+            stat = image_file.stat()
+            entry = known.get(source_path)
+            current = not force and entry is not None and outputs_current(entry, params)
+            if current and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                skipped_count += 1
+                continue
+
+            if current:
+                content_hash = hashlib.sha256(image_file.read_bytes()).hexdigest()
+                if content_hash == entry["content_hash"]:
+                    # Touched but unchanged: remember the new mtime and skip
+                    manifest.record(source_path, stat.st_size, stat.st_mtime_ns, content_hash, params, entry["outputs"])
+                    skipped_count += 1
+                    continue
+
+            tasks.append((source_path, str(image_file), series_name))
+            stats[source_path] = stat
+
+    print(f"{len(tasks)} images to process, {skipped_count} unchanged, {workers} worker(s)")
+
+    init_args = (output_dirs, rendition_dirs, profile, rendition_profile)
+    processed_count = 0
+    failed_count = 0
+    total_bytes = 0
+    start = time.perf_counter()
+
+    if workers > 1 and len(tasks) > 1:
+        # A few chunks per worker: large enough to amortise IPC, small enough
+        # that a slow chunk doesn't leave the other workers idle at the end
+        chunksize = max(1, len(tasks) // (workers * 4))
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=init_args)
+        results = executor.map(process_task, tasks, chunksize=chunksize)
+    else:
+        executor = None
+        init_worker(*init_args)
+        results = map(process_task, tasks)
+
+    try:
+        # map() yields in submission order, so progress is reported in order
+        for index, (source_path, content_hash, outputs, size, error) in enumerate(results, 1):
+            if error:
+                print(f"  [{index}/{len(tasks)}] Error processing {source_path}: {error}")
+                failed_count += 1
+                continue
+            stat = stats[source_path]
+            manifest.record(source_path, stat.st_size, stat.st_mtime_ns, content_hash, params, outputs)
+            processed_count += 1
+            total_bytes += size
+            print(f"  [{index}/{len(tasks)}] Processed: {source_path}")
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        manifest.close()
+
+    elapsed = time.perf_counter() - start
 
     print(f"\n{'='*60}")
-    print(f"Processing complete! Created variants for {processed_count} images.")
+    print(f"Processing complete! Created variants for {processed_count} images, {skipped_count} unchanged, {failed_count} failed.")
+    if processed_count:
+        print(
+            f"{elapsed:.1f}s with {workers} worker(s): {processed_count / elapsed:.2f} images/s, "
+            f"{total_bytes / elapsed / 2**20:.2f} MB/s of source images"
+        )
     print(f"{'='*60}")
 
 
 if __name__ == "__main__":
-    process_all_images()
+    parser = argparse.ArgumentParser(description="Create image variants for each angel")
+    parser.add_argument("--input-dir", default="images")
+    parser.add_argument("--profile", choices=PROFILES, default="png",
+                        help="encoding for the full-size variants")
+    parser.add_argument("--renditions", default="thumbnail,card",
+                        help="comma-separated size renditions to write (empty for none)")
+    parser.add_argument("--rendition-profile", choices=PROFILES, default="webp",
+                        help="encoding for the size renditions")
+    parser.add_argument("--manifest", default="asset_manifest.sqlite",
+                        help="processing manifest; unchanged images are skipped")
+    parser.add_argument("--force", action="store_true",
+                        help="reprocess every image, even if unchanged")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes (default 1; use the number of cores for a full reprocess)")
+    args = parser.parse_args()
+
+    renditions = tuple(name for name in args.renditions.split(",") if name)
+    unknown = [name for name in renditions if name not in RENDITIONS]
+    if unknown:
+        parser.error(f"unknown rendition(s): {', '.join(unknown)}; expected {', '.join(RENDITIONS)}")
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    process_all_images(
+        args.input_dir, args.profile, renditions, args.rendition_profile, args.manifest, args.force, args.workers
+    )
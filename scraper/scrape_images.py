@@ -3,63 +3,336 @@ Sonny Angel Image Scraper
 
 Downloads angel images from the official Sonny Angel website
 based on the gallery_config.json generated by discover_galleries.py.
+
+Everything goes through one pooled async HTTP client. Requests to each host
+are paced by a token bucket (--rate requests/s, bursts of --burst) and capped
+at --concurrency in flight. A gallery page is fetched and parsed once, however
+many series it holds, and the parsed galleries are kept in page_cache.json
+under the page's ETag, so an unchanged page (304) is not parsed again.
+--discover finds the galleries on the product pages itself, in the same pass,
+instead of reading gallery_config.json. ETag/Last-Modified validators of downloaded images are
+kept in http_cache.json, so later runs send conditional GETs and skip images
+the server reports as unchanged (304).
+
+Images are streamed in chunks to <name>.png.part, verified (length, MD5 when
+the ETag is one, image header and chunk checksums) and renamed into place, so a crash never
+leaves a truncated image under its final name. An interrupted download is
+resumed with a Range request if the server still has the same version.
 """
 
-import os
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import asyncio
+import hashlib
 import json
-import time
+import os
 import re
-
-
-def download_series_images(series_url: str, series_name: str, section_id: str):
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from PIL import Image
+
+from gallery_parser import parse_galleries
+
+
+USER_AGENT = "angel-archive-scraper/1.0"
+CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Fetcher:
+    """Pooled client with per-host rate and concurrency limits and a page cache."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        rate: float = 2.0,
+        burst: int = 4,
+        concurrency: int = 4,
+        page_cache: "PageCache" = None,
+    ):
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.page_cache = page_cache
+        self.hosts = {}
+        self.pages = {}
+
+    def _host_limits(self, url: str) -> tuple:
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = (TokenBucket(self.rate, self.burst), asyncio.Semaphore(self.concurrency))
+        return self.hosts[host]
+
+    async def get(self, url: str, headers: dict = None) -> httpx.Response:
+        """GET a URL once a slot and a token for its host are free."""
+        bucket, semaphore = self._host_limits(url)
+        async with semaphore:
+            await bucket.acquire()
+            return await self.client.get(url, headers=headers)
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: dict = None):
+        """Streamed GET; the host's slot is held until the body is consumed."""
+        bucket, semaphore = self._host_limits(url)
+        async with semaphore:
+            await bucket.acquire()
+            async with self.client.stream("GET", url, headers=headers) as response:
+                yield response
+
+    async def _fetch_page(self, url: str) -> dict:
+        cached = self.page_cache.galleries(url) if self.page_cache else None
+        headers = self.page_cache.conditional_headers(url) if cached is not None else None
+        response = await self.get(url, headers=headers)
+        if response.status_code == 304:
+            return cached
+        response.raise_for_status()
+        # Bytes, so lxml picks up the page's declared encoding
+        galleries = parse_galleries(response.content)
+        if self.page_cache:
+            self.page_cache.update(url, response, galleries)
+        return galleries
+
+    def page(self, url: str) -> asyncio.Task:
+        """
+        Galleries on a page (see gallery_parser.parse_galleries); concurrent
+        and later callers share one fetch and parse.
+        """
+        if url not in self.pages:
+            self.pages[url] = asyncio.ensure_future(self._fetch_page(url))
+        return self.pages[url]
+
+
+class HttpCache:
+    """ETag/Last-Modified validators of downloaded images, keyed by URL."""
+
+    def __init__(self, path: str = "http_cache.json"):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.entries.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url: str, response: httpx.Response):
+        validators = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        }
+        if any(validators.values()):
+            self.entries[url] = validators
+        else:
+            self.entries.pop(url, None)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class PageCache(HttpCache):
+    """Parsed galleries of each page, stored with the validators they were parsed under."""
+
+    def galleries(self, url: str) -> Optional[dict]:
+        return self.entries.get(url, {}).get("galleries")
+
+    def update(self, url: str, response: httpx.Response, galleries: dict = None):
+        super().update(url, response)
+        # Without an ETag or Last-Modified there's nothing to revalidate with
+        if url in self.entries:
+            self.entries[url]["galleries"] = galleries
+
+
+def strong_md5(etag: Optional[str]) -> Optional[str]:
+    """The MD5 hex digest an ETag carries, if it is a strong ETag that looks like one."""
+    if etag and not etag.startswith("W/"):
+        value = etag.strip('"')
+        if re.fullmatch(r"[0-9a-f]{32}", value):
+            return value
+    return None
+
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_json(path: str, data: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def resume_headers(part_path: str, meta_path: str) -> dict:
+    """Range/If-Range headers to continue a partial download, if it can be resumed."""
+    if not os.path.exists(part_path):
+        return {}
+    offset = os.path.getsize(part_path)
+    meta = read_json(meta_path)
+    etag = meta.get("etag")
+    validator = etag if etag and not etag.startswith("W/") else meta.get("last_modified")
+    if not offset or not validator:
+        return {}
+    # If-Range: the server only sends the rest if the image hasn't changed,
+    # otherwise it sends the whole new version with a 200
+    return {"Range": f"bytes={offset}-", "If-Range": validator}
+
+
+def verify_image(path: str, md5: str, response: httpx.Response):
+    """Raise if a finished download doesn't match its ETag or isn't a valid image."""
+    expected = strong_md5(response.headers.get("etag"))
+    if expected and md5 != expected:
+        raise ValueError(f"checksum mismatch (MD5 {md5}, ETag {expected})")
+    with Image.open(path) as img:
+        # Checks the header (and a PNG's chunk CRCs) without decoding pixels
+        img.verify()
+
+
+async def download_image(fetcher: Fetcher, cache: HttpCache, image_url: str, image_path: str) -> str:
+    """Download one image. Returns "saved", "unchanged" or "skipped"."""
+    headers = {}
+    if os.path.exists(image_path):
+        headers = cache.conditional_headers(image_url)
+        if not headers:
+            # Saved before validators were recorded; nothing to revalidate with
+            return "skipped"
+
+    part_path = f"{image_path}.part"
+    meta_path = f"{part_path}.json"
+    headers.update(resume_headers(part_path, meta_path))
+
+    async with fetcher.stream(image_url, headers=headers) as response:
+        if response.status_code == 304:
+            return "unchanged"
+        if response.status_code == 416:
+            # The partial file is no prefix of the current image; start over next run
+            os.remove(part_path)
+            os.remove(meta_path)
+        response.raise_for_status()
+
+        offset = 0
+        if response.status_code == 206:
+            match = re.fullmatch(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("content-range", ""))
+            offset = os.path.getsize(part_path)
+            if not match or int(match.group(1)) != offset:
+                raise ValueError(f"unexpected Content-Range {response.headers.get('content-range')!r}")
+            expected_size = int(match.group(2)) if match.group(2) != "*" else None
+        else:
+            length = response.headers.get("content-length")
+            expected_size = int(length) if length and "content-encoding" not in response.headers else None
+
+        # Remember which version the partial file belongs to before writing it
+        write_json(meta_path, {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        })
+
+        digest = hashlib.md5()
+        if offset:
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+
+        with open(part_path, "ab" if offset else "wb") as f:
+            # Written as they arrive (no re-chunking), so an interrupted
+            # transfer keeps everything received so far
+            async for chunk in response.aiter_bytes():
+                f.write(chunk)
+                digest.update(chunk)
+
+    size = os.path.getsize(part_path)
+    try:
+        if expected_size is not None and size != expected_size:
+            raise ValueError(f"expected {expected_size} bytes, got {size}")
+        verify_image(part_path, digest.hexdigest(), response)
+    except Exception:
+        # A bad body can't be resumed; start over next time
+        os.remove(part_path)
+        os.remove(meta_path)
+        raise
+
+    os.replace(part_path, image_path)
+    os.remove(meta_path)
+    cache.update(image_url, response)
+    return "saved"
+
+
+async def download_series_images(
+    fetcher: Fetcher,
+    cache: HttpCache,
+    series_url: str,
+    series_name: str,
+    section_id: str,
+    output_dir: str = "images",
+) -> int:
     """Download all images for a series from a gallery page."""
-    save_directory = f"images/{series_name}_Series/"
+    save_directory = os.path.join(output_dir, f"{series_name}_Series")
     os.makedirs(save_directory, exist_ok=True)
 
-    response = requests.get(series_url, timeout=30)
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    series_section = soup.find("div", id=section_id)
+    galleries = await fetcher.page(series_url)
+    gallery = galleries.get(section_id)
 
-    if not series_section:
+    if not gallery:
         print(f"Could not find section with id {section_id} for {series_name}.")
         return 0
 
-    gallery_items = series_section.find_all("a", class_="fg-thumb")
-    downloaded_count = 0
-
-    for item in gallery_items:
-        image_url = item.get("href")
-        caption_title = item.get("data-caption-title")
-
-        if not image_url or not caption_title:
-            continue
-
-        safe_title = caption_title.replace(" ", "_").replace("/", "_")
-        image_filename = f"{safe_title}.png"
-        image_path = os.path.join(save_directory, image_filename)
-
-        if os.path.exists(image_path):
-            print(f"  Skipped (exists): {image_filename}")
-            continue
+    items = []
+    for item in gallery["items"]:
+        safe_title = item["title"].replace(" ", "_").replace("/", "_")
+        items.append((item["url"], f"{safe_title}.png"))
 
+    async def fetch(image_url: str, image_filename: str) -> bool:
         try:
-            image_response = requests.get(image_url, timeout=30)
-            image_response.raise_for_status()
-
-            with open(image_path, "wb") as f:
-                f.write(image_response.content)
-
-            print(f"  Saved: {image_filename}")
-            downloaded_count += 1
-            time.sleep(0.5)
-
+            status = await download_image(fetcher, cache, image_url, os.path.join(save_directory, image_filename))
         except Exception as e:
-            print(f"  Error downloading {caption_title}: {e}")
+            print(f"  Error downloading {image_filename}: {e}")
+            return False
+        if status == "saved":
+            print(f"  Saved: {series_name}/{image_filename}")
+        return status == "saved"
 
-    return downloaded_count
+    results = await asyncio.gather(*(fetch(image_url, filename) for image_url, filename in items))
+    downloaded = sum(results)
+    print(f"{series_name}: {len(items)} images, {downloaded} downloaded")
+    return downloaded
 
 
 def load_gallery_config(config_file: str = "gallery_config.json") -> dict:
@@ -87,43 +360,179 @@ def safe_series_folder_name(raw: str) -> str:
     return s
 
 
-def scrape_from_config():
-    """Main scraping function - processes all galleries from config."""
-    print("Loading gallery configuration...")
+def make_client(concurrency: int) -> httpx.AsyncClient:
+    """Async client with a keep-alive pool sized to the concurrency limit."""
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=httpx.Timeout(30.0),
+        follow_redirects=True,
+    )
 
-    try:
-        config = load_gallery_config()
-    except FileNotFoundError:
-        print("Error: gallery_config.json not found!")
-        print("Please run: python discover_galleries.py")
-        return
-
-    print(f"Found {len(config)} product types\n")
 
-    total_series = sum(len(galleries) for galleries in config.values())
-    print(f"Total series to scrape: {total_series}\n")
+async def discover_config(fetcher: Fetcher, product_urls: dict) -> dict:
+    """
+    Gallery config for {key: (product type, url)} pages, in the format
+    discover_galleries.py writes. The parsed pages stay in the fetcher, so
+    scraping them afterwards doesn't fetch or parse them again.
+    """
+    pages = await asyncio.gather(*(fetcher.page(url) for _, url in product_urls.values()))
+    config = {}
+    for (product_type, url), galleries in zip(product_urls.values(), pages):
+        config[product_type] = [
+            {"series_name": gallery["series_name"], "url": url, "gallery_id": gallery_id}
+            for gallery_id, gallery in galleries.items()
+            if gallery["series_name"]
+        ]
+        print(f"Discovered: {product_type} ({len(config[product_type])} series)")
+    return config
+
+
+async def scrape_galleries(
+    config: Optional[dict],
+    output_dir: str = "images",
+    cache_file: str = "http_cache.json",
+    rate: float = 2.0,
+    burst: int = 4,
+    concurrency: int = 4,
+    page_cache_file: str = None,
+    product_urls: dict = None,
+    config_file: str = None,
+) -> int:
+    """
+    Scrape every gallery in the config. Returns the number of images downloaded.
 
+    With config None, the galleries are discovered from product_urls first
+    (and written to config_file if given).
+    """
+    cache = HttpCache(cache_file)
+    page_cache = PageCache(page_cache_file) if page_cache_file else None
     total_downloaded = 0
 
-    for product_type, galleries in config.items():
-        print(f"\n{'='*60}")
-        print(f"Scraping: {product_type} ({len(galleries)} series)")
-        print(f"{'='*60}\n")
+    async with make_client(concurrency) as client:
+        fetcher = Fetcher(client, rate, burst, concurrency, page_cache)
+        try:
+            if config is None:
+                config = await discover_config(fetcher, product_urls)
+                if config_file:
+                    with open(config_file, "w") as f:
+                        json.dump(config, f, indent=2)
+
+            tasks = []
+            for product_type, galleries in config.items():
+                print(f"Scraping: {product_type} ({len(galleries)} series)")
+                for gallery in galleries:
+                    tasks.append(download_series_images(
+                        fetcher,
+                        cache,
+                        gallery["url"],
+                        safe_series_folder_name(gallery["series_name"]),
+                        gallery["gallery_id"],
+                        output_dir,
+                    ))
+
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, Exception):
+                    print(f"Error scraping series: {result}")
+                else:
+                    total_downloaded += result
+        finally:
+            cache.save()
+            if page_cache:
+                page_cache.save()
+
+    return total_downloaded
+
+
+def scrape_from_config(
+    config_file: str = "gallery_config.json",
+    output_dir: str = "images",
+    cache_file: str = "http_cache.json",
+    rate: float = 2.0,
+    burst: int = 4,
+    concurrency: int = 4,
+    page_cache_file: str = "page_cache.json",
+    discover_types: list[str] = None,
+):
+    """
+    Main scraping function - processes all galleries from config.
 
-        for gallery in galleries:
-            series_name = safe_series_folder_name(gallery["series_name"])
-            series_url = gallery["url"]
-            gallery_id = gallery["gallery_id"]
+    With discover_types, the galleries of those product types are discovered
+    and scraped in one pass, and config_file is rewritten with what was found.
+    """
+    product_urls = None
+    if discover_types is not None:
+        from discover_galleries import PRODUCT_TYPE_URLS
+
+        product_urls = {k: v for k, v in PRODUCT_TYPE_URLS.items() if not discover_types or k in discover_types}
+        if not product_urls:
+            print(f"Error: No valid product types selected! Available types: {', '.join(PRODUCT_TYPE_URLS)}")
+            return
+        config = None
+        print(f"Discovering and scraping: {', '.join(product_urls)}\n")
+    else:
+        print("Loading gallery configuration...")
 
-            print(f"Processing: {gallery['series_name']}")
-            downloaded = download_series_images(series_url, series_name, gallery_id)
-            total_downloaded += downloaded
-            print()
+        try:
+            config = load_gallery_config(config_file)
+        except FileNotFoundError:
+            print(f"Error: {config_file} not found!")
+            print("Please run: python discover_galleries.py")
+            return
+
+        print(f"Found {len(config)} product types\n")
+
+        total_series = sum(len(galleries) for galleries in config.values())
+        print(f"Total series to scrape: {total_series}\n")
+
+    start = time.perf_counter()
+    total_downloaded = asyncio.run(scrape_galleries(
+        config,
+        output_dir,
+        cache_file,
+        rate,
+        burst,
+        concurrency,
+        page_cache_file,
+        product_urls,
+        config_file,
+    ))
+    elapsed = time.perf_counter() - start
 
     print(f"\n{'='*60}")
-    print(f"Scraping complete! Downloaded {total_downloaded} images.")
+    print(f"Scraping complete! Downloaded {total_downloaded} images in {elapsed:.1f}s.")
     print(f"{'='*60}")
 
 
 if __name__ == "__main__":
-    scrape_from_config()
+    parser = argparse.ArgumentParser(description="Download angel images listed in gallery_config.json")
+    parser.add_argument("--config", default="gallery_config.json")
+    parser.add_argument("--output-dir", default="images")
+    parser.add_argument("--cache", default="http_cache.json", help="ETag/Last-Modified validators of downloaded images")
+    parser.add_argument("--page-cache", default="page_cache.json", help="parsed galleries of each page, keyed by URL and ETag")
+    parser.add_argument(
+        "--discover",
+        nargs="?",
+        const="",
+        metavar="TYPES",
+        help="discover galleries while scraping instead of reading --config (comma-separated product types, default all)",
+    )
+    parser.add_argument("--rate", type=float, default=2.0, help="requests per second per host")
+    parser.add_argument("--burst", type=int, default=4, help="requests allowed back to back before --rate applies")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight per host")
+    args = parser.parse_args()
+
+    discover_types = None
+    if args.discover is not None:
+        discover_types = [t for t in args.discover.split(",") if t]
+
+    scrape_from_config(
+        args.config,
+        args.output_dir,
+        args.cache,
+        args.rate,
+        args.burst,
+        args.concurrency,
+        args.page_cache,
+        discover_types,
+    )
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import gallery_parser
+import scrape_images
+
+
+def png_bytes(color: str, size: int = 8) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FixtureSite:
+    """Local stand-in for the product page and its image host."""
+
+    def __init__(self):
+        self.images = {"/img/apple.png": png_bytes("red"), "/img/peach.png": png_bytes("pink"), "/img/rabbit.png": png_bytes("white")}
+        self.requests = []
+        # Paths whose next response is cut off halfway through the body
+        self.truncate = set()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                site.requests.append((self.path, dict(self.headers)))
+                if self.path == "/products/":
+                    body = site.page().encode()
+                    etag = f'"{hashlib.md5(body).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    self._send(200, body, "text/html", {"ETag": etag})
+                    return
+                data = site.images.get(self.path)
+                if data is None:
+                    self._send(404, b"", "text/plain")
+                    return
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                range_header = self.headers.get("Range")
+                if range_header and self.headers.get("If-Range") == etag:
+                    start = int(range_header.removeprefix("bytes=").rstrip("-"))
+                    content_range = f"bytes {start}-{len(data) - 1}/{len(data)}"
+                    self._send(206, data[start:], "image/png", {"ETag": etag, "Content-Range": content_range})
+                    return
+                self._send(200, data, "image/png", {"ETag": etag})
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.path in site.truncate:
+                    site.truncate.discard(self.path)
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def page(self) -> str:
+        def thumb(path, title):
+            return f'<a class="fg-thumb" href="{self.url}{path}" data-caption-title="{title}"></a>'
+
+        return f"""
+        <html><body>
+          <h2 class="tabtitle">Fruit Series</h2>
+          <div class="tabcontent"><div class="foogallery" id="foogallery-gallery-1">
+            {thumb("/img/apple.png", "Apple")}{thumb("/img/peach.png", "Peach")}
+          </div></div>
+          <h2 class="tabtitle">Animal Series</h2>
+          <div class="tabcontent"><div class="foogallery" id="foogallery-gallery-2">
+            {thumb("/img/rabbit.png", "Rabbit")}
+          </div></div>
+        </body></html>
+        """
+
+    def config(self) -> dict:
+        return {"Mini Figure (Regular)": [
+            {"series_name": "Fruit Series", "url": f"{self.url}/products/", "gallery_id": "foogallery-gallery-1"},
+            {"series_name": "Animal Series", "url": f"{self.url}/products/", "gallery_id": "foogallery-gallery-2"},
+        ]}
+
+    def requested(self, path: str) -> list:
+        return [headers for request_path, headers in self.requests if request_path == path]
+
+
+@pytest.fixture
+def site():
+    site = FixtureSite()
+    yield site
+    site.server.shutdown()
+
+
+def scrape(site, tmp_path, config="default", **kwargs):
+    return asyncio.run(scrape_images.scrape_galleries(
+        site.config() if config == "default" else config,
+        str(tmp_path / "images"),
+        str(tmp_path / "http_cache.json"),
+        rate=100,
+        burst=10,
+        page_cache_file=str(tmp_path / "page_cache.json"),
+        **kwargs,
+    ))
+
+
+def test_parse_galleries_single_pass(site):
+    galleries = gallery_parser.parse_galleries(site.page())
+    assert list(galleries) == ["foogallery-gallery-1", "foogallery-gallery-2"]
+    assert galleries["foogallery-gallery-1"]["series_name"] == "Fruit Series"
+    assert [item["title"] for item in galleries["foogallery-gallery-1"]["items"]] == ["Apple", "Peach"]
+    assert galleries["foogallery-gallery-2"]["items"] == [{"url": f"{site.url}/img/rabbit.png", "title": "Rabbit"}]
+
+
+def test_unchanged_page_is_not_parsed_again(site, tmp_path, monkeypatch):
+    scrape(site, tmp_path)
+    site.requests.clear()
+
+    def fail(page):
+        raise AssertionError("page parsed again")
+
+    monkeypatch.setattr(scrape_images, "parse_galleries", fail)
+    assert scrape(site, tmp_path) == 0
+    assert "If-None-Match" in site.requested("/products/")[0]
+
+
+def test_discover_and_scrape_in_one_pass(site, tmp_path):
+    config_file = tmp_path / "gallery_config.json"
+    product_urls = {"regular": ("Mini Figure (Regular)", f"{site.url}/products/")}
+
+    assert scrape(site, tmp_path, config=None, product_urls=product_urls, config_file=str(config_file)) == 3
+    assert len(site.requested("/products/")) == 1
+    assert json.loads(config_file.read_text()) == site.config()
+    assert (tmp_path / "images" / "Animal_Series_Series" / "Rabbit.png").exists()
+
+
+def test_page_fetched_once_for_all_series(site, tmp_path):
+    assert scrape(site, tmp_path) == 3
+    assert len(site.requested("/products/")) == 1
+    assert (tmp_path / "images" / "Fruit_Series_Series" / "Apple.png").read_bytes() == site.images["/img/apple.png"]
+    assert (tmp_path / "images" / "Animal_Series_Series" / "Rabbit.png").exists()
+
+
+def test_rerun_sends_conditional_gets(site, tmp_path):
+    scrape(site, tmp_path)
+    site.requests.clear()
+
+    assert scrape(site, tmp_path) == 0
+    headers = site.requested("/img/apple.png")
+    assert len(headers) == 1
+    assert headers[0]["If-None-Match"] == f'"{hashlib.md5(site.images["/img/apple.png"]).hexdigest()}"'
+
+    # A changed image has a new ETag and is downloaded again
+    site.images["/img/apple.png"] = png_bytes("green")
+    assert scrape(site, tmp_path) == 1
+    saved = tmp_path / "images" / "Fruit_Series_Series" / "Apple.png"
+    assert saved.read_bytes() == site.images["/img/apple.png"]
+    assert json.loads((tmp_path / "http_cache.json").read_text())
+
+
+def test_interrupted_download_resumes_with_range(site, tmp_path):
+    site.images["/img/apple.png"] = png_bytes("red", size=256)
+    site.truncate.add("/img/apple.png")
+    saved = tmp_path / "images" / "Fruit_Series_Series" / "Apple.png"
+
+    # The cut-off body stays in a .part file, never under the final name
+    assert scrape(site, tmp_path) == 2
+    assert not saved.exists()
+    part = saved.with_name("Apple.png.part")
+    assert 0 < part.stat().st_size < len(site.images["/img/apple.png"])
+
+    received = part.stat().st_size
+    site.requests.clear()
+    assert scrape(site, tmp_path) == 1
+    assert site.requested("/img/apple.png")[0]["Range"] == f"bytes={received}-"
+    assert saved.read_bytes() == site.images["/img/apple.png"]
+    assert not part.exists()
+    assert list(saved.parent.glob("*.json")) == []
+
+
+def test_partial_file_of_an_old_version_is_replaced(site, tmp_path):
+    saved = tmp_path / "images" / "Fruit_Series_Series" / "Apple.png"
+    saved.parent.mkdir(parents=True)
+    saved.with_name("Apple.png.part").write_bytes(png_bytes("blue")[:20])
+    saved.with_name("Apple.png.part.json").write_text(json.dumps({"etag": '"stale"'}))
+
+    # If-Range doesn't match, so the server sends the whole current image
+    assert scrape(site, tmp_path) == 3
+    assert saved.read_bytes() == site.images["/img/apple.png"]
+
+
+def test_corrupt_image_is_discarded(site, tmp_path):
+    site.images["/img/apple.png"] = b"<html>not an image</html>"
+
+    assert scrape(site, tmp_path) == 2
+    folder = tmp_path / "images" / "Fruit_Series_Series"
+    assert sorted(path.name for path in folder.iterdir()) == ["Peach.png"]
+
+
+def test_token_bucket_paces_requests():
+    async def run():
+        bucket = scrape_images.TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # Two tokens up front, then four more at 20/s
+    assert 0.18 <= asyncio.run(run()) < 0.5